@@ -0,0 +1,68 @@
+"""
+adc_scheduler.py
+Time-slotted reads for analog probes that disturb each other (MicroPython)
+
+The pH and TDS probes sit in the same tank, so one must not be read while
+the other has just been excited. Each analog channel gets an exclusive
+slot that only opens settle_ms after the previous analog read; the gaps
+are filled with work that does not touch the probes (DHT, OneWire,
+ultrasonic) instead of sleeping.
+"""
+
+import utime
+import uasyncio as asyncio
+
+# quiet time after the other probe's read before a channel is sampled, same
+# for both sensor modules: the high impedance pH input is slow to recover
+# from the TDS excitation (the original collector slept 1 s before pH)
+TDS_SETTLE_MS = 250
+PH_SETTLE_MS = 1000
+
+
+class Slot:
+    def __init__(self, name, read, settle_ms):
+        self.name = name
+        self.read = read
+        self.settle_ms = settle_ms
+
+
+class SlotScheduler:
+    def __init__(self, slots):
+        self.slots = slots
+        self.last_analog = None      # ticks_ms of the last slot read
+
+    def _remaining(self, slot):
+        if self.last_analog is None:
+            return 0
+        elapsed = utime.ticks_diff(utime.ticks_ms(), self.last_analog)
+        return slot.settle_ms - elapsed
+
+    def _read(self, slot, results):
+        results[slot.name] = slot.read()
+        self.last_analog = utime.ticks_ms()
+
+    def run(self, fillers=()):
+        """One cycle: every slot in order, fillers (name, read) run while a
+        slot is settling. Returns {name: value} for slots and fillers."""
+        results = {}
+        pending = list(fillers)
+        for slot in self.slots:
+            while pending and self._remaining(slot) > 0:
+                name, read = pending.pop(0)
+                results[name] = read()
+            remaining = self._remaining(slot)
+            if remaining > 0:
+                utime.sleep_ms(remaining)
+            self._read(slot, results)
+        for name, read in pending:
+            results[name] = read()
+        return results
+
+    async def run_async(self, results):
+        """One cycle for the event loop: other tasks run during the settle
+        gaps, slot values are written into results"""
+        for slot in self.slots:
+            remaining = self._remaining(slot)
+            if remaining > 0:
+                await asyncio.sleep_ms(remaining)
+            self._read(slot, results)
@@ -0,0 +1,115 @@
+"""
+aggregator.py
+Per-sensor windowed rollups before readings reach the journal (MicroPython)
+
+Slow moving sensors do not need every 1 minute sample on flash. Each
+rolled up sensor keeps a running count/min/max/mean/variance (Welford) for
+the current window in constant memory; at the end of the window they are
+written as one codec.RollupBatch record. Sensors not listed are passed
+through so they can still be cached raw.
+"""
+
+import math
+from codec import RollupBatch
+
+
+class Stats:
+    """Running statistics of one sensor; None samples are only counted"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.missing = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        if value is None:
+            self.missing += 1
+            return
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def stddev(self):
+        """Population standard deviation of the window, None when empty"""
+        if not self.count:
+            return None
+        return math.sqrt(self.m2 / self.count)
+
+
+class WindowAggregator:
+    def __init__(self, rollup=()):
+        self.stats = {name: Stats() for name in rollup}
+        self.start = None   # timestamps of the first and last sample
+        self.end = None
+
+    def add(self, t, readings):
+        """Fold the rolled up sensors of a snapshot into the window and
+        return the remaining readings, to be cached raw"""
+        if self.start is None:
+            self.start = t
+        self.end = t
+        raw = {}
+        for name, value in readings.items():
+            stats = self.stats.get(name)
+            if stats is None:
+                raw[name] = value
+            else:
+                stats.add(value)
+        return raw
+
+    def flush(self, names):
+        """Close the window: a RollupBatch in register order (names is
+        Registry.names), or None when nothing was rolled up"""
+        if self.start is None:
+            return None
+        batch = RollupBatch(self.start)
+        for index, name in enumerate(names):
+            stats = self.stats.get(name)
+            if stats is not None and (stats.count or stats.missing):
+                batch.add(index, stats, self.start, self.end - self.start)
+        for stats in self.stats.values():
+            stats.reset()
+        self.start = self.end = None
+        return batch if len(batch) else None
+
+
+# ==============================
+# SELF CHECK (host or board)
+# ==============================
+if __name__ == "__main__":
+    import codec
+
+    names = ["water_temp", "humidity", "ph"]
+    sensors = [{"_id": "id%d" % i, "name": name} for i, name in enumerate(names)]
+    window = WindowAggregator(("water_temp", "humidity"))
+    temps = [21.3, 21.4, 21.2, 21.9, None, 21.5, 21.4, 21.6, 21.5, 21.7]
+    for tick, temp in enumerate(temps):
+        raw = window.add(1000 + tick * 60, {"water_temp": temp, "humidity": 60 + tick % 2, "ph": 6.1})
+        assert raw == {"ph": 6.1}, "only unlisted sensors are passed through"
+    payload = window.flush(names).payload()
+    rows = list(codec.iter_rollup_json(payload, sensors))
+    decoded = codec.decode_columnar({"columns": list(codec.iter_rollup_columns(payload, sensors))})
+
+    seen = [t for t in temps if t is not None]
+    mean = sum(seen) / len(seen)
+    std = math.sqrt(sum((t - mean) ** 2 for t in seen) / len(seen))
+    temp = rows[0]
+    assert temp["count"] == len(seen) and temp["span"] == 540, "window bounds"
+    assert (temp["min"], temp["max"]) == ("21.2", "21.9"), "min/max"
+    assert abs(float(temp["value"]) - mean) <= 0.05 and abs(float(temp["stddev"]) - std) <= 0.05, "mean/stddev"
+    for key in ("value", "min", "max", "stddev", "count", "span", "timestamp"):
+        assert [r[key] for r in rows] == [r[key] for r in decoded], "columnar mismatch on " + key
+    assert window.flush(names) is None, "window restarts empty"
+    print("rollup: %d bytes for %d samples of 2 sensors" % (len(payload), len(temps)))
+    print("aggregator OK")
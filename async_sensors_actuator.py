@@ -7,7 +7,15 @@ Includes console logging of all sensor data.
 import uasyncio as asyncio
 from machine import Pin, ADC, SoftI2C
 from ssd1306 import SSD1306_I2C
-import onewire, ds18x20, dht, utime
+from oversample import Oversampler
+from calibration import Calibration
+from ultrasonic import EchoRanger, OUT_OF_RANGE
+from adc_scheduler import Slot, SlotScheduler, TDS_SETTLE_MS, PH_SETTLE_MS
+from health import Health, OPEN, validity
+import onewire, ds18x20, dht, utime, time
+
+DS18_CONVERSION_MS = 750    # 12-bit DS18B20 conversion time
+OVERSAMPLE_COUNT = 16       # samples per burst, median filtered
 
 
 # ==============================
@@ -26,6 +34,9 @@ class OledDisplay:
             y += 12
         self.oled.show()
 
+    # same call as sensors_actuator.OledDisplay
+    show_text = show
+
 
 # ==============================
 # SENSOR MODULE (ASYNC)
@@ -39,13 +50,18 @@ class SensorModule:
         self.ds_pin = Pin(15)
         self.ds = ds18x20.DS18X20(onewire.OneWire(self.ds_pin))
         self.ds_roms = self.ds.scan()
+        self.water_temp_at = None    # ticks_ms the last value was collected
 
         self.tds_adc = ADC(Pin(26))
         self.ph_adc = ADC(Pin(27))
         self.ldr_adc = ADC(Pin(28))
+        self.tds_sampler = Oversampler(self.tds_adc, OVERSAMPLE_COUNT)
+        self.ph_sampler = Oversampler(self.ph_adc, OVERSAMPLE_COUNT)
+        self.ldr_sampler = Oversampler(self.ldr_adc, OVERSAMPLE_COUNT)
 
         self.trigger = Pin(8, Pin.OUT)
         self.echo = Pin(9, Pin.IN)
+        self.ranger = EchoRanger(self.trigger, self.echo)
 
         # Variables updated asynchronously
         self.data = {
@@ -58,12 +74,17 @@ class SensorModule:
             "ldr": None,
         }
 
-        # calibration
-        self.VREF = 3.3
-        self.KVALUE = 0.5
-        self.ph_v4 = 1.92
-        self.ph_v7 = 2.50
-        self.slope = (7 - 4) / (self.ph_v7 - self.ph_v4)
+        # calibration (calibration.json, shared with sensors_actuator)
+        self.calibration = Calibration()
+
+        # per-sensor error counts and circuit breakers (see health.py)
+        self.health = Health(("dht", "ds18b20", "ultrasonic", "tds", "ph"))
+
+        # pH and TDS take turns; the other tasks run in the settle gaps
+        self.analog = SlotScheduler([
+            Slot("tds", self.health.guard("tds", self.read_tds), TDS_SETTLE_MS),
+            Slot("ph", self.health.guard("ph", self.read_ph), PH_SETTLE_MS),
+        ])
 
         # display
         self.display = OledDisplay()
@@ -72,90 +93,102 @@ class SensorModule:
     # ASYNC SENSOR TASKS
     # -----------------------------
 
+    def sensor_failed(self, health, error, *fields):
+        # the last value stays on display until the breaker opens
+        health.failure(error)
+        if health.state == OPEN:
+            for field in fields:
+                self.data[field] = None
+
     async def task_dht(self):
+        health = self.health["dht"]
         while True:
-            try:
-                self.dht.measure()
-                self.data["ambient_temp"] = self.dht.temperature()
-                self.data["humidity"] = self.dht.humidity()
-            except:
-                pass
+            if health.allow():
+                try:
+                    self.dht.measure()
+                    self.data["ambient_temp"] = self.dht.temperature()
+                    self.data["humidity"] = self.dht.humidity()
+                    health.success(self.data["ambient_temp"])
+                except Exception as e:
+                    self.sensor_failed(health, e, "ambient_temp", "humidity")
             await asyncio.sleep(2)
 
     async def task_ds18(self):
+        # pipelined: the next conversion runs while the task sleeps, so each
+        # pass only collects the previous result and starts a new one
+        health = self.health["ds18b20"]
+        started = None
         while True:
-            try:
-                self.ds.convert_temp()
-                await asyncio.sleep_ms(750)
-                t = self.ds.read_temp(self.ds_roms[0])
-                self.data["water_temp"] = t
-            except:
-                pass
+            if health.allow():
+                try:
+                    if started is not None and utime.ticks_diff(utime.ticks_ms(), started) >= DS18_CONVERSION_MS:
+                        t = self.ds.read_temp(self.ds_roms[0])
+                        if t is None:
+                            raise OSError("no temperature")
+                        self.data["water_temp"] = t
+                        self.water_temp_at = utime.ticks_ms()
+                        health.success(t)
+                    self.ds.convert_temp()
+                    started = utime.ticks_ms()
+                except Exception as e:
+                    started = None
+                    self.sensor_failed(health, e, "water_temp")
             await asyncio.sleep(1)
 
+    def water_temp_age(self):
+        """Milliseconds since the water temperature was last collected"""
+        if self.water_temp_at is None:
+            return None
+        return utime.ticks_diff(utime.ticks_ms(), self.water_temp_at)
+
     async def task_ldr(self):
         while True:
-            raw = self.ldr_adc.read_u16()
+            raw = self.ldr_sampler.read()
             self.data["ldr"] = round(raw / 65535 * 100, 1)
             await asyncio.sleep(0.3)
 
-    async def task_ph(self):
-        while True:
-            raw = self.ph_adc.read_u16()
-            voltage = (raw / 65535) * self.VREF
-            ph = 7 + (voltage - self.ph_v7) * self.slope
-            self.data["ph"] = round(ph, 1)
-            await asyncio.sleep(0.4)
+    def read_ph(self):
+        raw = self.ph_sampler.read()
+        return round(self.calibration.ph_curve.ph1000(raw) / 1000, 1)
 
-    async def task_tds(self):
-        while True:
-            raw = self.tds_adc.read_u16()
-            voltage = (raw / 65535) * self.VREF
+    def read_tds(self):
+        raw = self.tds_sampler.read()
+        # None water temp → uncompensated (25 °C bucket)
+        tds = self.calibration.tds_table.ppm10(raw, self.data["water_temp"])
+        return round(tds / 10, 1)
 
-            if self.data["water_temp"] is not None:
-                comp = 1 + 0.02 * (self.data["water_temp"] - 25)
-            else:
-                comp = 1
+    # quick calibration (saved to calibration.json)
+    def calibrate_ph(self, buffer_ph):
+        return self.calibration.calibrate_ph(buffer_ph, self.ph_sampler.read())
 
-            comp_voltage = voltage / comp
+    def calibrate_tds(self, standard_ppm):
+        return self.calibration.calibrate_tds(self.tds_sampler.read(), standard_ppm, self.data["water_temp"])
 
-            tds = (
-                133.42 * comp_voltage**3
-                - 255.86 * comp_voltage**2
-                + 857.39 * comp_voltage
-            ) * self.KVALUE
+    async def calibrate_water_level(self, actual_cm):
+        return self.calibration.calibrate_ultrasonic(await self.ranger.measure_async(), actual_cm)
 
-            self.data["tds"] = round(tds, 1)
-            await asyncio.sleep(0.5)
+    async def task_analog(self):
+        # replaces independent pH/TDS tasks that could sample back to back
+        while True:
+            await self.analog.run_async(self.data)
 
     async def task_ultrasonic(self):
+        health = self.health["ultrasonic"]
         while True:
-            try:
-                self.trigger.low()
-                utime.sleep_us(3)
-                self.trigger.high()
-                utime.sleep_us(10)
-                self.trigger.low()
-
-                timeout = utime.ticks_us() + 30000
-                while self.echo.value() == 0:
-                    if utime.ticks_us() > timeout:
-                        raise Exception("Timeout1")
-
-                start = utime.ticks_us()
-                timeout = utime.ticks_us() + 30000
-                while self.echo.value() == 1:
-                    if utime.ticks_us() > timeout:
-                        raise Exception("Timeout2")
-
-                end = utime.ticks_us()
-                duration = end - start
-                distance = (duration * 0.0343) / 2
-
-                self.data["water_level"] = round(distance, 1)
-
-            except:
-                self.data["water_level"] = None
+            if health.allow():
+                try:
+                    # IRQ timed echoes, awaits instead of spinning on the echo pin
+                    distance = self.calibration.distance(await self.ranger.measure_async())
+                    if distance is None:
+                        raise OSError("no echo")
+                    if distance == OUT_OF_RANGE:
+                        # no level to report, not even the last one
+                        self.data["water_level"] = None
+                        raise OSError("out of range")
+                    self.data["water_level"] = round(distance, 1)
+                    health.success(distance)
+                except Exception as e:
+                    self.sensor_failed(health, e, "water_level")
 
             await asyncio.sleep(0.2)
 
@@ -183,17 +216,34 @@ class SensorModule:
             print("=======================\n")
             await asyncio.sleep(0.5)   # print every 1 second
 
+    # -----------------------------
+    # SNAPSHOT
+    # -----------------------------
+    def snapshot(self):
+        """Copy of the latest readings with one timestamp: (timestamp, readings).
+        readings["valid"] marks which fields hold a value, and
+        readings["water_temp_age"] is how old the water temperature is (ms)."""
+        readings = dict(self.data)
+        readings["valid"] = validity(self.data)
+        readings["water_temp_age"] = self.water_temp_age()
+        return time.time(), readings
+
     # -----------------------------
     # START ALL TASKS
     # -----------------------------
-    async def run(self):
-        await asyncio.gather(
+    def sensor_tasks(self):
+        """Sampling coroutines only, for runtimes that own the display"""
+        return [
             self.task_dht(),
             self.task_ds18(),
             self.task_ldr(),
-            self.task_ph(),
-            self.task_tds(),
+            self.task_analog(),
             self.task_ultrasonic(),
+        ]
+
+    async def run(self):
+        await asyncio.gather(
+            *self.sensor_tasks(),
             self.task_display(),
             self.task_console_logger(),   # <-- NEW
         )
@@ -206,4 +256,5 @@ async def main():
     sm = SensorModule()
     await sm.run()
 
-asyncio.run(main())
+if __name__ == "__main__":
+    asyncio.run(main())
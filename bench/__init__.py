@@ -0,0 +1,4 @@
+"""
+bench
+Host benchmarks of the firmware on the simulated board, see bench/run.py
+"""
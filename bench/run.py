@@ -0,0 +1,298 @@
+"""
+run.py
+Benchmarks of the sample → cache → upload path on the simulated board (CPython)
+
+    python -m bench.run --output bench_output.txt
+    python -m bench.run --compare bench_output.txt
+
+Latencies are reported twice:
+ - board_ms: virtual time on the simulated board (every sleep the firmware
+   does plus the modelled sensor, bus, flash and network latencies)
+ - host_us:  CPU time on the workstation, a proxy for interpreter work
+cache_readings only has host_us: it neither sleeps nor does any I/O, so
+there is no board time to model.
+Heap is CPython's (tracemalloc peak), so only its growth with the backlog
+is comparable to the board, not the absolute numbers. The sim server does
+not keep readings there and its socket drops /readings bodies unread, so
+the peak is the firmware's own.
+
+Results are JSON; --compare prints the change of every number against an
+earlier run so regressions show up between commits.
+"""
+
+import time as host_time
+import argparse, builtins, contextlib, io, json, os, subprocess, tempfile, tracemalloc
+
+import sim
+
+sim.install()
+
+import utime
+import uasyncio
+import world
+import sim.run as sim_run
+from server import SimServer
+
+BACKLOG_WINDOWS = (1, 6, 36, 144)       # 10 min, 1 h, 6 h, 1 day of DATA_BANK
+# upload variants: name → (payload encoding, Content-Encodings the server takes)
+VARIANTS = {
+    "rows": ("rows", ()),
+    "columnar": ("columnar", ()),
+    "rows_gzip": ("rows", ("gzip",)),
+    "columnar_gzip": ("columnar", ("gzip",)),
+}
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    n = len(samples)
+
+    def pick(p):
+        return samples[min(n - 1, int(p * n))]
+    return {
+        "n": n,
+        "mean": round(sum(samples) / n, 3),
+        "p50": round(pick(0.50), 3),
+        "p90": round(pick(0.90), 3),
+        "p99": round(pick(0.99), 3),
+        "max": round(samples[-1], 3),
+    }
+
+
+class Timer:
+    def __init__(self):
+        self.board_ms = []
+        self.host_us = []
+
+    def __call__(self, fn, *args):
+        W = world.WORLD
+        board = W.clock_us
+        host = host_time.perf_counter_ns()
+        result = fn(*args)
+        self.host_us.append((host_time.perf_counter_ns() - host) / 1000)
+        self.board_ms.append((W.clock_us - board) / 1000)
+        return result
+
+    def report(self, board=True):
+        if not board:
+            return {"host_us": percentiles(self.host_us)}
+        return {"board_ms": percentiles(self.board_ms), "host_us": percentiles(self.host_us)}
+
+
+class FlashCounter:
+    """Counts bytes written to files while active (journal data + index)
+    and spends the modelled flash time of each write on the board clock"""
+
+    def __init__(self):
+        self.bytes = 0
+        self.writes = 0
+
+    @contextlib.contextmanager
+    def active(self):
+        real_open = builtins.open
+        counter = self
+
+        class Counted:
+            def __init__(self, f):
+                self.f = f
+
+            def write(self, data):
+                counter.bytes += len(data)
+                counter.writes += 1
+                W = world.WORLD
+                W.advance_us(W.duration("flash_write") + len(data) * W.latency_us["flash_byte"])
+                return self.f.write(data)
+
+            def __enter__(self):
+                self.f.__enter__()
+                return self
+
+            def __exit__(self, *exc):
+                return self.f.__exit__(*exc)
+
+            def __getattr__(self, name):
+                return getattr(self.f, name)
+
+        def counting_open(file, mode="r", *args, **kwargs):
+            f = real_open(file, mode, *args, **kwargs)
+            return Counted(f) if any(c in mode for c in "wa+") else f
+        builtins.open = counting_open
+        try:
+            yield self
+        finally:
+            builtins.open = real_open
+
+
+def boot(seed, encoding, keep=True, content_encodings=()):
+    """Firmware loaded in a clean directory, registered with a sim server"""
+    W = world.reset(seed)
+    W.server = SimServer(encoding, keep, content_encodings=content_encodings)
+    W.wifi_connected = True
+    os.chdir(tempfile.mkdtemp(prefix="hydro-bench-"))
+    main = sim_run.load_firmware()
+    uasyncio.run(main.register_iot())
+    return main
+
+
+def bench_sample(cycles):
+    """sensors_actuator.read_all_sensors: the blocking sample cycle"""
+    import sensors_actuator
+    module = sensors_actuator.SensorModule()
+    module.read_all_sensors()           # first DS18B20 conversion
+    timer = Timer()
+    for _ in range(cycles):
+        timer(module.read_all_sensors)
+    return timer.report()
+
+
+def fill(main, windows, sampler):
+    """Run windows cache windows of CACHE_BATCH_TICKS snapshots through
+    cache_readings/flush_cache; returns (tick timer, flush timer, append
+    timer, samples), the append timer covering append_file alone"""
+    ticks, flushes, appends = Timer(), Timer(), Timer()
+    W = world.WORLD
+    deadband = main.Deadband(main.DEADBANDS, main.HEARTBEAT_SECONDS)
+    samples = 0
+    append_file = main.append_file
+    main.append_file = lambda *args: appends(append_file, *args)
+    try:
+        for _ in range(windows):
+            batch = main.ReadingBatch()
+            window = main.WindowAggregator(main.ROLLUP_SENSORS)
+            for _ in range(main.CACHE_BATCH_TICKS):
+                W.advance_us(main.DATA_CACHING_INTERVAL_SECONDS * 1000000)
+                snapshot = sampler.read_all_sensors()
+                t = utime.time()
+                samples += sum(1 for name in main.registry.names if snapshot.get(name) is not None)
+                ticks(main.cache_readings, batch, window, deadband, t, snapshot)
+            flushes(main.flush_cache, batch, window, deadband, t)
+    finally:
+        main.append_file = append_file
+    return ticks, flushes, appends, samples
+
+
+def bench_cache_and_upload(seed, encoding, content_encodings, windows):
+    main = boot(seed, encoding, content_encodings=content_encodings)
+    import sensors_actuator
+    sampler = sensors_actuator.SensorModule()
+    flash = FlashCounter()
+    with flash.active():
+        ticks, flushes, appends, samples = fill(main, windows, sampler)
+    journal = main.db.stats()
+
+    server = world.WORLD.server
+    sent = len(server.requests)
+    connections = server.connections
+    upload = Timer()
+    upload(uasyncio.run, main.send_sensor_data())
+    posts = server.requests[sent:]
+    body_bytes = sum(r[3] for r in posts)
+    inflated_bytes = sum(r[4] for r in posts)
+    entries = server.received
+    return {
+        "cache_readings": ticks.report(board=False),
+        "flush_cache": flushes.report(),
+        "append_file": appends.report(),
+        "send_sensor_data": upload.report(),
+        "flash": {
+            "bytes_written": flash.bytes,
+            "writes": flash.writes,
+            "journal_bytes": journal["bytes"],
+            "samples": samples,
+            "bytes_per_sample": round(flash.bytes / samples, 3),
+        },
+        "upload": {
+            "posts": len(posts),
+            "connections": server.connections - connections,
+            "body_bytes": body_bytes,
+            "inflated_bytes": inflated_bytes,
+            "entries": entries,
+            "bytes_per_sample": round(body_bytes / samples, 3),
+            "bytes_per_entry": round(body_bytes / entries, 3) if entries else None,
+        },
+    }
+
+
+def bench_heap(seed, encoding, content_encodings, sizes):
+    """Peak heap of one send_sensor_data against the backlog it drains"""
+    results = []
+    for windows in sizes:
+        main = boot(seed, encoding, keep=False, content_encodings=content_encodings)
+        import sensors_actuator
+        fill(main, windows, sensors_actuator.SensorModule())
+        backlog = main.db.stats()["bytes"]
+        tracemalloc.start()
+        uasyncio.run(main.send_sensor_data())
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results.append({"windows": windows, "backlog_bytes": backlog, "peak_heap_bytes": peak})
+    return results
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=sim.ROOT_DIR,
+                             capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(seed=0, cycles=200, windows=36, heap_sizes=BACKLOG_WINDOWS):
+    cwd = os.getcwd()
+    results = {"commit": git_commit(), "seed": seed}
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            world.reset(seed)
+            results["read_all_sensors"] = bench_sample(cycles)
+            for name, (encoding, content_encodings) in VARIANTS.items():
+                results[name] = bench_cache_and_upload(seed, encoding, content_encodings, windows)
+                results[name]["heap"] = bench_heap(seed, encoding, content_encodings, heap_sizes)
+    finally:
+        os.chdir(cwd)
+    return results
+
+
+def flatten(data, prefix=""):
+    if isinstance(data, dict):
+        for key, value in data.items():
+            yield from flatten(value, f"{prefix}{key}.")
+    elif isinstance(data, list):
+        for i, value in enumerate(data):
+            yield from flatten(value, f"{prefix}{i}.")
+    elif isinstance(data, (int, float)) and not isinstance(data, bool):
+        yield prefix[:-1], data
+
+
+def compare(old, new):
+    """Lines of "name old → new (change)" for every number in both runs"""
+    before = dict(flatten(old))
+    lines = []
+    for name, value in flatten(new):
+        if name not in before or name == "seed":
+            continue
+        was = before[name]
+        change = "" if was == value else (f" ({(value - was) / was * 100:+.1f}%)" if was else " (new)")
+        lines.append(f"{name}: {was} → {value}{change}")
+    return lines
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[1])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cycles", type=int, default=200, help="read_all_sensors cycles")
+    parser.add_argument("--windows", type=int, default=36, help="cache windows before the upload")
+    parser.add_argument("--output", help="write the JSON results to this file")
+    parser.add_argument("--compare", help="earlier JSON results to compare against")
+    args = parser.parse_args()
+
+    results = run(args.seed, args.cycles, args.windows)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    if args.compare:
+        with open(args.compare) as f:
+            print("\n".join(compare(json.load(f), results)))
+    elif not args.output:
+        print(text)
@@ -0,0 +1,115 @@
+"""
+calibration.py
+Calibration profiles kept in flash (MicroPython)
+
+calibration.json holds the multi-point pH buffers, the TDS K factor, the
+ADC reference voltage and the ultrasonic mounting offset. Coefficients are
+precomputed when the file is loaded (conversions.TdsTable / PhCurve), so a
+reading only costs a multiply-add. The calibrate_* routines update one
+profile from a live reading, rebuild its coefficients in place and save
+the file, so recalibrating never needs a reflash.
+"""
+
+import ujson
+from conversions import TdsTable, PhCurve, tds_formula, ADC_MAX
+
+CALIBRATION_FILE = "calibration.json"
+PH_BUFFER_MATCH = 1.0   # a new buffer point replaces one closer than this
+
+DEFAULTS = {
+    "vref": 3.3,
+    "ph": {"points": [[4.0, 1.92], [7.0, 2.50]]},     # [pH, voltage]
+    "tds": {"k_value": 0.5},
+    "ultrasonic": {"offset_cm": 0.0},
+}
+
+
+class Calibration:
+    def __init__(self, path=CALIBRATION_FILE):
+        self.path = path
+        self.data = None
+        self.vref = DEFAULTS["vref"]
+        self.tds_table = None
+        self.ph_curve = None
+        self.offset_cm = 0.0
+        self.reload()
+
+    def reload(self):
+        """Read the profiles (defaults for anything missing) and precompute"""
+        data = {}
+        try:
+            with open(self.path, "r") as f:
+                data = ujson.load(f)
+        except OSError:
+            pass                # never calibrated: defaults
+        except ValueError as e:
+            print("Error reading calibration:", e)
+        self.data = {}
+        for key, default in DEFAULTS.items():
+            value = data.get(key, default)
+            if isinstance(default, dict):
+                merged = dict(default)
+                merged.update(value)
+                value = merged
+            self.data[key] = value
+        self._build()
+
+    def _build(self):
+        self.vref = self.data["vref"]
+        self._build_tds()
+        self._build_ph()
+        self.offset_cm = self.data["ultrasonic"]["offset_cm"]
+
+    def _build_tds(self):
+        self.tds_table = TdsTable(self.data["tds"]["k_value"], self.vref)
+
+    def _build_ph(self):
+        self.ph_curve = PhCurve([tuple(p) for p in self.data["ph"]["points"]], self.vref)
+
+    def save(self):
+        with open(self.path, "w") as f:
+            ujson.dump(self.data, f)
+        print(f"Saved {self.path}")
+
+    def voltage(self, raw):
+        return raw * self.vref / ADC_MAX
+
+    def distance(self, measured):
+        """Mounting offset applied to a measured distance; None and
+        ultrasonic.OUT_OF_RANGE (negative) pass through"""
+        if measured is None or measured < 0:
+            return measured
+        return measured + self.offset_cm
+
+    # ------------------------------
+    # Quick calibration routines
+    # ------------------------------
+    def calibrate_ph(self, ph, raw):
+        """Probe sitting in a pH buffer: record its voltage as a point,
+        replacing the point of the nearest buffer"""
+        points = [p for p in self.data["ph"]["points"] if abs(p[0] - ph) >= PH_BUFFER_MATCH]
+        points.append([ph, round(self.voltage(raw), 4)])
+        points.sort()
+        self.data["ph"]["points"] = points
+        if len(points) >= 2:
+            self._build_ph()
+            self.save()
+        return points
+
+    def calibrate_tds(self, raw, standard_ppm, water_temp=25.0):
+        """Probe sitting in a standard solution: solve K from the reading"""
+        uncorrected = tds_formula(self.voltage(raw), 25.0 if water_temp is None else water_temp, 1.0)
+        if uncorrected <= 0:
+            raise ValueError("TDS probe reads zero, is it in the solution?")
+        self.data["tds"]["k_value"] = round(standard_ppm / uncorrected, 4)
+        self._build_tds()
+        self.save()
+        return self.data["tds"]["k_value"]
+
+    def calibrate_ultrasonic(self, measured, actual_cm):
+        """measured is a raw ranger distance (no offset) to a known target"""
+        if measured is None or measured < 0:
+            raise ValueError("no echo from the calibration target")
+        self.offset_cm = self.data["ultrasonic"]["offset_cm"] = round(actual_cm - measured, 2)
+        self.save()
+        return self.offset_cm
@@ -0,0 +1,581 @@
+"""
+codec.py
+Compact binary format for cached sensor readings (MicroPython)
+
+A batch payload is a 4 byte base timestamp followed by fixed 5 byte
+readings:
+ - 1 byte  sensor index (position of the sensor in register.json "sensors")
+ - 2 bytes seconds since the base timestamp
+ - 2 bytes value scaled by SCALE (signed), MISSING when the sensor gave None
+An index with the SUPPRESSED bit set is not a reading but the number of
+samples of that sensor a deadband held back (value, unscaled), so the
+server can tell an unchanged sensor from a missing one.
+
+A rollup payload (RollupBatch) has the same header followed by fixed 14
+byte window summaries:
+ - 1 byte  sensor index
+ - 2 bytes seconds from the base timestamp to the first sample
+ - 2 bytes seconds from the first to the last sample
+ - 2 bytes each mean, min, max and stddev, scaled like a reading
+ - 2 bytes number of samples
+
+A window payload (WindowBatch) is what one cache window journals as a
+single record: 2 bytes length of its batch payload, the batch payload,
+then the rollup payload (either may be empty).
+
+The decoder turns a batch back into the /readings JSON shape at upload time,
+either as rows (one object per reading) or as columns (one object per
+sensor and page with a base timestamp, a sample interval and a packed value
+array, see Columns).
+"""
+
+import struct, time
+from binascii import b2a_base64, a2b_base64
+
+HEADER_FORMAT = "<I"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+READING_FORMAT = "<BHh"
+READING_SIZE = struct.calcsize(READING_FORMAT)
+
+ROLLUP_FORMAT = "<BHHhhhhH"
+ROLLUP_SIZE = struct.calcsize(ROLLUP_FORMAT)
+
+WINDOW_FORMAT = "<H"
+WINDOW_SIZE = struct.calcsize(WINDOW_FORMAT)
+
+SCALE = 10              # one decimal place, same as read_all_sensors rounding
+OFFSET_MAX = 0xFFFF     # largest packed ("H") offset or delay_count in a column
+MISSING = -32768
+SUPPRESSED = 0x80       # index flag of a suppression counter
+VALUE_MIN = -32767
+VALUE_MAX = 32767
+
+
+def scale_value(value):
+    if value is None:
+        return MISSING
+    raw = int(round(value * SCALE))
+    return min(max(raw, VALUE_MIN), VALUE_MAX)
+
+
+def format_value(raw):
+    """Scaled int back to the string the server used to receive"""
+    if raw == MISSING:
+        return None
+    if raw % SCALE == 0:
+        return str(raw // SCALE)
+    return str(raw / SCALE)
+
+
+class ReadingBatch:
+    """Accumulates packed readings for one journal record"""
+
+    def __init__(self, base=None):
+        self.base = time.time() if base is None else base
+        self.buf = bytearray(struct.pack(HEADER_FORMAT, self.base))
+
+    def __len__(self):
+        return (len(self.buf) - HEADER_SIZE) // READING_SIZE
+
+    def add(self, index, value, t=None):
+        dt = 0 if t is None else min(max(t - self.base, 0), 0xFFFF)
+        self.buf.extend(struct.pack(READING_FORMAT, index, dt, scale_value(value)))
+
+    def add_snapshot(self, names, readings, t=None):
+        """Add a whole snapshot in one pass; names is the register order
+        (Registry.names) so each reading lands on its register index"""
+        for index, name in enumerate(names):
+            if name in readings:
+                self.add(index, readings[name], t)
+
+    def add_suppressed(self, names, counts, t=None):
+        """Suppression counters {name: samples held back} in register order"""
+        dt = 0 if t is None else min(max(t - self.base, 0), 0xFFFF)
+        for index, name in enumerate(names):
+            count = counts.get(name)
+            if count:
+                self.buf.extend(struct.pack(READING_FORMAT, index | SUPPRESSED, dt, min(count, VALUE_MAX)))
+
+    def payload(self):
+        return bytes(self.buf)
+
+
+def iter_readings(payload):
+    """Yield (sensor index, timestamp, scaled value) from a batch payload"""
+    base = struct.unpack_from(HEADER_FORMAT, payload, 0)[0]
+    for offset in range(HEADER_SIZE, len(payload) - READING_SIZE + 1, READING_SIZE):
+        index, dt, raw = struct.unpack_from(READING_FORMAT, payload, offset)
+        yield index, base + dt, raw
+
+
+def iter_json(payload, sensors, delay_count=0):
+    """Decode a batch into /readings entries, sensors is register["sensors"]"""
+    for index, t, raw in iter_readings(payload):
+        if index & SUPPRESSED and (index & ~SUPPRESSED) < len(sensors):
+            sensor = sensors[index & ~SUPPRESSED]
+            yield {
+                "sensor": sensor["_id"],
+                "name": sensor["name"],
+                "suppressed": raw,
+                "timestamp": t,
+                "delay_count": delay_count,
+            }
+            continue
+        if index >= len(sensors) or raw == MISSING:
+            continue
+        sensor = sensors[index]
+        yield {
+            "sensor": sensor["_id"],
+            "name": sensor["name"],
+            "value": format_value(raw),
+            "timestamp": t,
+            "delay_count": delay_count,
+        }
+
+
+def to_json(payload, sensors, delay_count=0):
+    return list(iter_json(payload, sensors, delay_count))
+
+
+def count_entries(payload):
+    """Entries iter_json yields for a batch (readings that are not MISSING
+    and suppression counters)"""
+    n = 0
+    for index, t, raw in iter_readings(payload):
+        if index & SUPPRESSED or raw != MISSING:
+            n += 1
+    return n
+
+
+def drop(payload, n):
+    """Remove the first n entries as iter_json counts them (readings that
+    are not MISSING and suppression counters)"""
+    if not n:
+        return payload
+    out = bytearray(payload[:HEADER_SIZE])
+    for offset in range(HEADER_SIZE, len(payload) - READING_SIZE + 1, READING_SIZE):
+        if n and (payload[offset] & SUPPRESSED or
+                  struct.unpack_from("<h", payload, offset + 3)[0] != MISSING):
+            n -= 1
+            continue
+        out.extend(payload[offset:offset + READING_SIZE])
+    return bytes(out)
+
+
+def thin(payload, every=2):
+    """Keep every Nth reading of each sensor (always the first one)"""
+    seen = {}
+    out = bytearray(payload[:HEADER_SIZE])
+    for offset in range(HEADER_SIZE, len(payload) - READING_SIZE + 1, READING_SIZE):
+        index = payload[offset]
+        n = seen.get(index, 0)
+        seen[index] = n + 1
+        if n % every == 0:
+            out.extend(payload[offset:offset + READING_SIZE])
+    return bytes(out)
+
+
+def aggregate(payload):
+    """Collapse a batch to one mean reading per sensor, stamped at the
+    first sample of that sensor"""
+    base = struct.unpack_from(HEADER_FORMAT, payload, 0)[0]
+    sums = {}
+    order = []
+    for index, t, raw in iter_readings(payload):
+        if index not in sums:
+            sums[index] = [0, 0, t]
+            order.append(index)
+        if raw != MISSING:
+            sums[index][0] += raw
+            sums[index][1] += 1
+    batch = ReadingBatch(base)
+    for index in order:
+        total, n, t = sums[index]
+        batch.add(index, total / n / SCALE if n else None, t)
+    return batch.payload()
+
+
+class RollupBatch:
+    """Accumulates window summaries (aggregator.Stats) for one journal record"""
+
+    def __init__(self, base=None):
+        self.base = time.time() if base is None else base
+        self.buf = bytearray(struct.pack(HEADER_FORMAT, self.base))
+
+    def __len__(self):
+        return (len(self.buf) - HEADER_SIZE) // ROLLUP_SIZE
+
+    def add(self, index, stats, t=None, span=0):
+        dt = 0 if t is None else min(max(t - self.base, 0), 0xFFFF)
+        self.buf.extend(struct.pack(
+            ROLLUP_FORMAT, index, dt, min(span, 0xFFFF),
+            scale_value(stats.mean if stats.count else None),
+            scale_value(stats.min), scale_value(stats.max),
+            scale_value(stats.stddev()), min(stats.count, 0xFFFF)))
+
+    def payload(self):
+        return bytes(self.buf)
+
+
+def iter_rollups(payload):
+    """Yield (sensor index, timestamp, span, mean, min, max, stddev, count)
+    from a rollup payload, values scaled"""
+    base = struct.unpack_from(HEADER_FORMAT, payload, 0)[0]
+    for offset in range(HEADER_SIZE, len(payload) - ROLLUP_SIZE + 1, ROLLUP_SIZE):
+        index, dt, span, mean, lo, hi, std, count = struct.unpack_from(ROLLUP_FORMAT, payload, offset)
+        yield index, base + dt, span, mean, lo, hi, std, count
+
+
+def iter_rollup_json(payload, sensors, delay_count=0):
+    """Decode a rollup batch into /readings entries: the mean as "value"
+    (what older servers read) plus the window statistics"""
+    for index, t, span, mean, lo, hi, std, count in iter_rollups(payload):
+        if index >= len(sensors) or not count:
+            continue
+        sensor = sensors[index]
+        yield {
+            "sensor": sensor["_id"],
+            "name": sensor["name"],
+            "value": format_value(mean),
+            "min": format_value(lo),
+            "max": format_value(hi),
+            "stddev": format_value(std),
+            "count": count,
+            "timestamp": t,
+            "span": span,
+            "delay_count": delay_count,
+        }
+
+
+def drop_rollups(payload, n):
+    """Remove the first n entries as iter_rollup_json counts them"""
+    if not n:
+        return payload
+    out = bytearray(payload[:HEADER_SIZE])
+    for offset in range(HEADER_SIZE, len(payload) - ROLLUP_SIZE + 1, ROLLUP_SIZE):
+        if n and struct.unpack_from("<H", payload, offset + ROLLUP_SIZE - 2)[0]:
+            n -= 1
+            continue
+        out.extend(payload[offset:offset + ROLLUP_SIZE])
+    return bytes(out)
+
+
+class WindowBatch:
+    """A cache window's ReadingBatch and RollupBatch (or None) as one
+    journal record, so a window counts once in delay_count"""
+
+    def __init__(self, readings=None, rollup=None):
+        self.readings = readings
+        self.rollup = rollup
+
+    def __len__(self):
+        return len(self.readings or ()) + len(self.rollup or ())
+
+    def payload(self):
+        readings = self.readings.payload() if self.readings is not None and len(self.readings) else b""
+        rollup = self.rollup.payload() if self.rollup is not None and len(self.rollup) else b""
+        return window_payload(readings, rollup)
+
+
+def window_payload(readings, rollup):
+    return struct.pack(WINDOW_FORMAT, len(readings)) + readings + rollup
+
+
+def split_window(payload):
+    """Window payload → (batch payload, rollup payload), None when empty"""
+    end = WINDOW_SIZE + struct.unpack_from(WINDOW_FORMAT, payload, 0)[0]
+    return payload[WINDOW_SIZE:end] or None, payload[end:] or None
+
+
+def iter_window_json(payload, sensors, delay_count=0):
+    """Decode a window: its readings then its rollups"""
+    readings, rollup = split_window(payload)
+    if readings:
+        yield from iter_json(readings, sensors, delay_count)
+    if rollup:
+        yield from iter_rollup_json(rollup, sensors, delay_count)
+
+
+# ------------------------------
+# Columnar /readings encoding
+# ------------------------------
+def pack_array(fmt, values):
+    """values → base64 of a little endian array ("h" or "H")"""
+    data = struct.pack("<%d%s" % (len(values), fmt), *values)
+    return b2a_base64(data).decode().strip()
+
+
+def unpack_array(fmt, text):
+    data = a2b_base64(text)
+    return struct.unpack("<%d%s" % (len(data) // struct.calcsize(fmt), fmt), data)
+
+
+def runs(times):
+    """Split a sensor's samples into (start, end) ranges one column can
+    hold: a new range starts when the clock went back before its t0 (an
+    RTC reset) or so far ahead that the offset does not fit OFFSET_MAX"""
+    start = 0
+    for i, t in enumerate(times):
+        t0 = times[start]
+        if t is not None and t0 is not None and not 0 <= t - t0 <= OFFSET_MAX:
+            yield start, i
+            start = i
+    yield start, len(times)
+
+
+def make_column(sensor_id, name, times, values, delays=0):
+    """One column: scaled values of a sensor and when they were taken.
+    Evenly spaced samples only need t0 and dt, otherwise offsets from t0
+    are packed as well; readings without a timestamp carry neither.
+    times must fit one column (see runs). delays is the delay_count of
+    every value, or a list with one per value (packed as "delays" when
+    they differ)."""
+    if not isinstance(delays, list):
+        delays = [delays]
+    delays = [min(max(d, 0), OFFSET_MAX) for d in delays]
+    column = {
+        "sensor": sensor_id,
+        "name": name,
+        "n": len(values),
+        "scale": SCALE,
+        "values": pack_array("h", values),
+        "delay_count": max(delays) if delays else 0,
+    }
+    if any(d != delays[0] for d in delays):
+        column["delays"] = pack_array("H", delays)
+    if times and times[0] is not None:
+        t0 = times[0]
+        column["t0"] = t0
+        steps = [b - a for a, b in zip(times, times[1:])]
+        if not steps or all(step == steps[0] for step in steps):
+            column["dt"] = steps[0] if steps else 0
+        else:
+            column["offsets"] = pack_array("H", [t - t0 for t in times])
+    return column
+
+
+class Columns:
+    """Columns of a whole /readings page: one per sensor for raw readings
+    and one per sensor for rollups, whichever batches the samples came
+    from (more when the clock jumped, see runs). The last column of a
+    sensor carries "suppressed"/"suppressed_at", the total and last of its
+    suppression counters; "suppressions" lists each as [count, timestamp,
+    delay_count] when that is not all there is to it."""
+
+    def __init__(self, sensors):
+        self.sensors = sensors      # register["sensors"]
+        self.readings = {}          # index → (times, values, delays)
+        self.suppressed = {}        # index → [[count, timestamp, delay_count]]
+        self.rollups = {}           # index → (times, means, lows, highs, stds, counts, spans, delays)
+        self.order = []
+        self.rollup_order = []
+        self.legacy = []            # ready made columns of untimed readings
+
+    def add_readings(self, payload, delay_count=0, skip=0):
+        """Add a batch, skipping the first skip entries iter_json would have
+        produced. Returns (entries added, skip left for what follows)."""
+        n = added = 0
+        for index, t, raw in iter_readings(payload):
+            counter = index & SUPPRESSED
+            index &= ~SUPPRESSED
+            if index >= len(self.sensors) or (raw == MISSING and not counter):
+                continue
+            n += 1
+            if n <= skip:
+                continue
+            added += 1
+            if index not in self.readings:
+                self.readings[index] = ([], [], [])
+                self.order.append(index)
+            if counter:
+                self.suppressed.setdefault(index, []).append([raw, t, delay_count])
+                continue
+            for values, value in zip(self.readings[index], (t, raw, delay_count)):
+                values.append(value)
+        return added, max(skip - n, 0)
+
+    def add_rollups(self, payload, delay_count=0, skip=0):
+        """Add a rollup batch, means as "values" and the window statistics
+        as extra packed arrays. Returns (entries added, skip left)."""
+        n = added = 0
+        for index, t, span, mean, lo, hi, std, count in iter_rollups(payload):
+            if index >= len(self.sensors) or not count:
+                continue
+            n += 1
+            if n <= skip:
+                continue
+            added += 1
+            if index not in self.rollups:
+                self.rollups[index] = ([], [], [], [], [], [], [], [])
+                self.rollup_order.append(index)
+            for values, value in zip(self.rollups[index], (t, mean, lo, hi, std, count, span, delay_count)):
+                values.append(value)
+        return added, max(skip - n, 0)
+
+    def add_window(self, payload, delay_count=0, skip=0):
+        """Add a window's readings and rollups. Returns (entries added, skip left)."""
+        readings, rollup = split_window(payload)
+        added = 0
+        if readings:
+            n, skip = self.add_readings(readings, delay_count, skip)
+            added += n
+        if rollup:
+            n, skip = self.add_rollups(rollup, delay_count, skip)
+            added += n
+        return added, skip
+
+    def add_column(self, column):
+        self.legacy.append(column)
+
+    def columns(self):
+        for index in self.order:
+            times, values, delays = self.readings[index]
+            sensor = self.sensors[index]
+            column = None
+            for start, end in runs(times):
+                if column is not None:
+                    yield column
+                column = make_column(sensor["_id"], sensor["name"], times[start:end], values[start:end],
+                                     delays[start:end])
+            counters = self.suppressed.get(index)
+            if counters:
+                column["suppressed"] = sum(c[0] for c in counters)
+                column["suppressed_at"] = counters[-1][1]
+                if len(counters) > 1 or counters[0][2] != column["delay_count"]:
+                    column["suppressions"] = counters
+            yield column
+        for index in self.rollup_order:
+            times, means, lows, highs, stds, counts, spans, delays = self.rollups[index]
+            sensor = self.sensors[index]
+            for start, end in runs(times):
+                column = make_column(sensor["_id"], sensor["name"], times[start:end], means[start:end],
+                                     delays[start:end])
+                column["min"] = pack_array("h", lows[start:end])
+                column["max"] = pack_array("h", highs[start:end])
+                column["stddev"] = pack_array("h", stds[start:end])
+                column["count"] = pack_array("H", counts[start:end])
+                column["span"] = pack_array("H", spans[start:end])
+                yield column
+        for column in self.legacy:
+            yield column
+
+
+def iter_columns(payload, sensors, delay_count=0, skip=0):
+    """Group one batch into one column per sensor (see Columns)"""
+    columns = Columns(sensors)
+    columns.add_readings(payload, delay_count, skip)
+    return columns.columns()
+
+
+def iter_rollup_columns(payload, sensors, delay_count=0, skip=0):
+    """Rollup batch → one column per sensor (see Columns)"""
+    columns = Columns(sensors)
+    columns.add_rollups(payload, delay_count, skip)
+    return columns.columns()
+
+
+def decode_columnar(body):
+    """Host side: expand a columnar /readings body back into rows, each with
+    the timestamp it was sampled at (None when unknown)"""
+    rows = []
+    for column in body.get("columns", []):
+        values = unpack_array("h", column["values"])
+        scale = column.get("scale", SCALE)
+        if "offsets" in column:
+            times = [column["t0"] + o for o in unpack_array("H", column["offsets"])]
+        elif "t0" in column:
+            times = [column["t0"] + i * column.get("dt", 0) for i in range(len(values))]
+        else:
+            times = [None] * len(values)
+        delays = unpack_array("H", column["delays"]) if "delays" in column else None
+        stats = {}
+        for key, fmt in (("min", "h"), ("max", "h"), ("stddev", "h"), ("count", "H"), ("span", "H")):
+            if key in column:
+                stats[key] = unpack_array(fmt, column[key])
+        for i, (t, raw) in enumerate(zip(times, values)):
+            row = {
+                "sensor": column["sensor"],
+                "name": column["name"],
+                "value": format_value(raw * SCALE // scale),
+                "delay_count": delays[i] if delays else column.get("delay_count", 0),
+                "timestamp": t,
+            }
+            for key, packed in stats.items():
+                if key in ("count", "span"):
+                    row[key] = packed[i]
+                else:
+                    row[key] = format_value(packed[i] * SCALE // scale)
+            rows.append(row)
+        if "suppressed" in column:
+            counters = column.get("suppressions") or \
+                [(column["suppressed"], column["suppressed_at"], column.get("delay_count", 0))]
+            for count, t, delay_count in counters:
+                rows.append({
+                    "sensor": column["sensor"],
+                    "name": column["name"],
+                    "suppressed": count,
+                    "timestamp": t,
+                    "delay_count": delay_count,
+                })
+    return rows
+
+
+# ==============================
+# ROUND TRIP CHECK (host or board)
+# ==============================
+if __name__ == "__main__":
+    sensors = [{"_id": "id%d" % i, "name": "sensor%d" % i} for i in range(7)]
+    for jitter in (0, 1):
+        batch = ReadingBatch(1000)
+        for tick in range(10):
+            t = 1000 + tick * 60 + (tick % 3 if jitter else 0)
+            for index in range(7):
+                value = None if (tick, index) == (4, 2) else tick * 1.5 - index * 10.3
+                batch.add(index, value, t)
+        batch.add_suppressed([s["name"] for s in sensors], {"sensor1": 4, "sensor5": 2}, 1600)
+        payload = batch.payload()
+        rows = to_json(payload, sensors, 3)
+        columns = list(iter_columns(payload, sensors, 3))
+        decoded = decode_columnar({"columns": columns})
+
+        def key(row):
+            return (row["sensor"], row["name"], row.get("value", ""), row.get("suppressed", 0), row["delay_count"],
+                    row["timestamp"])
+        assert sorted(map(key, rows)) == sorted(map(key, decoded)), "round trip mismatch"
+        sampled = sorted((sensors[i]["_id"], format_value(raw), t)
+                         for i, t, raw in iter_readings(payload) if raw != MISSING and not i & SUPPRESSED)
+        assert sampled == sorted((r["sensor"], r["value"], r["timestamp"]) for r in decoded if "value" in r), \
+            "timestamp mismatch"
+        print("jitter=%d rows:%d columns:%d" % (jitter, len(rows), len(columns)))
+
+    # sparse batches (one sample per sensor after the deadband) share columns
+    page = Columns(sensors)
+    rows = []
+    for window in range(6):
+        batch = ReadingBatch(2000 + window * 600)
+        for index in range(7):
+            batch.add(index, window + index / 10, 2000 + window * 600 + index)
+        batch.add_suppressed([s["name"] for s in sensors], {"sensor3": window + 1}, 2000 + window * 600 + 540)
+        rows += to_json(batch.payload(), sensors, 5 - window)
+        page.add_readings(batch.payload(), 5 - window)
+    columns = list(page.columns())
+    decoded = decode_columnar({"columns": columns})
+    assert len(columns) == 7 and sorted(map(key, rows)) == sorted(map(key, decoded)), "merged round trip mismatch"
+    print("merged rows:%d columns:%d" % (len(rows), len(columns)))
+
+    # a page across an RTC reset (clock back to its build date) and a gap
+    # longer than a packed offset: the sensors' columns split instead
+    page = Columns(sensors)
+    rows = []
+    for window, base in enumerate((5000, 5600, 1000, 1600, 90000, 90600)):
+        batch = ReadingBatch(base)
+        for tick in range(3):
+            for index in range(7):
+                batch.add(index, window + tick / 10 - index, base + tick * (60 + index))
+        rows += to_json(batch.payload(), sensors, 5 - window)
+        page.add_readings(batch.payload(), 5 - window)
+    columns = list(page.columns())
+    decoded = decode_columnar({"columns": columns})
+    assert len(columns) == 21 and sorted(map(key, rows)) == sorted(map(key, decoded)), "split round trip mismatch"
+    print("clock jumps rows:%d columns:%d" % (len(rows), len(columns)))
+    print("columnar round trip OK")
@@ -0,0 +1,107 @@
+"""
+compression.py
+Streaming deflate of upload bodies (MicroPython)
+
+Wraps the chunks of a request body in deflate.DeflateIO, so a page is
+compressed while it is being sent and never held whole in memory. The
+compressor only keeps a 2**wbits byte window (1 KB by default): rows
+repeat the same sensor ids, key names and similar values every ~150
+bytes, so a small window already catches nearly all of it.
+
+The Content-Encoding is negotiated at registration: the node offers
+CONTENT_ENCODINGS and the server answers with the one it accepts (or none,
+and bodies stay plain). Stock rp2 firmware may ship deflate without
+MICROPY_PY_DEFLATE_COMPRESS, so nothing is offered unless a trial
+compression at import works, and a compressor failing mid-upload raises
+CompressionError instead of something that looks like a link error.
+"""
+
+import io
+
+try:
+    import deflate
+except ImportError:
+    deflate = None      # firmware built without the deflate module
+
+GZIP = "gzip"
+DEFLATE = "deflate"     # zlib stream, as HTTP's "deflate" means
+
+WBITS = 10              # 1 KB window
+CHUNK_BYTES = 512       # compressed bytes handed to the socket per write
+
+
+class CompressionError(Exception):
+    """The compressor failed; the body can still be sent plain"""
+
+
+def _deflate(fn, *args):
+    try:
+        return fn(*args)
+    except Exception as e:
+        raise CompressionError(repr(e))
+
+
+class Sink(io.IOBase):
+    """Stream DeflateIO writes into; drained by Compressed"""
+
+    def __init__(self):
+        self.buf = bytearray()
+
+    def write(self, data):
+        self.buf.extend(data)
+        return len(data)
+
+    def take(self):
+        data = bytes(self.buf)
+        self.buf = bytearray()
+        return data
+
+
+def _compresses():
+    """Trial compression: a decompress-only build fails here"""
+    if deflate is None:
+        return False
+    try:
+        stream = deflate.DeflateIO(Sink(), deflate.GZIP, WBITS)
+        stream.write(b"{}")
+        stream.close()
+        return True
+    except Exception as e:
+        print("deflate cannot compress:", e)
+        return False
+
+
+CONTENT_ENCODINGS = [GZIP, DEFLATE] if _compresses() else []
+
+
+class Compressed:
+    """Iterable body: the chunks of another body, compressed on the fly.
+    raw_bytes/sent_bytes count both sides once it has been iterated."""
+
+    def __init__(self, chunks, content_encoding=GZIP, wbits=WBITS):
+        self.chunks = chunks
+        self.format = deflate.GZIP if content_encoding == GZIP else deflate.ZLIB
+        self.wbits = wbits
+        self.raw_bytes = 0
+        self.sent_bytes = 0
+
+    def __iter__(self):
+        sink = Sink()
+        stream = _deflate(deflate.DeflateIO, sink, self.format, self.wbits)
+        for chunk in self.chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            _deflate(stream.write, chunk)
+            self.raw_bytes += len(chunk)
+            if len(sink.buf) >= CHUNK_BYTES:
+                data = sink.take()
+                self.sent_bytes += len(data)
+                yield data
+        _deflate(stream.close)      # final block and the gzip/zlib trailer
+        data = sink.take()
+        self.sent_bytes += len(data)
+        yield data
+
+
+def supported(content_encoding):
+    return content_encoding in CONTENT_ENCODINGS
@@ -0,0 +1,186 @@
+"""
+connectivity.py
+Operating mode state machine (MicroPython)
+
+The mode only changes through event(): every (mode, event) pair that moves
+the node is listed in TRANSITIONS, anything else leaves the mode as it is.
+Targets ONLINE and OFFLINE are resolved from the registration state:
+ - ONLINE:  RELAY when registered, else RESET (old cached readings) or
+            REGISTRATION; DATA_LOGGING without wifi
+ - OFFLINE: DATA_BANK when registered, else DATA_LOGGING
+
+The server probe result is cached: a success for ok_ttl_ms, a failure for
+fail_ttl_ms (the retry interval), and the cache is dropped with the wifi
+link. Requests made for other reasons count as probes too: a request that
+went through refreshes the cache, and loss_failures transport failures in
+a row mark the server unreachable right away, so RELAY → DATA_BANK takes
+no probe round trip.
+"""
+
+import utime
+
+REGISTRATION = "REGISTRATION"
+RESET = "RESET"
+RELAY = "RELAY"
+DATA_BANK = "DATA_BANK"
+DATA_LOGGING = "DATA_LOGGING"
+
+# events
+WIFI_LOST = "wifi_lost"
+WIFI_JOINED = "wifi_joined"
+SERVER_UP = "server_up"         # probe or request went through
+SERVER_DOWN = "server_down"     # probe failed or link loss seen on requests
+CLEARED = "cleared"             # old readings dropped (RESET done)
+REGISTERED = "registered"
+
+# resolved targets
+ONLINE = "online"
+OFFLINE = "offline"
+
+TRANSITIONS = {
+    (DATA_LOGGING, SERVER_UP): ONLINE,
+    (DATA_LOGGING, SERVER_DOWN): OFFLINE,
+    (DATA_BANK, SERVER_UP): ONLINE,
+    (DATA_BANK, WIFI_LOST): DATA_LOGGING,
+    (RELAY, SERVER_DOWN): OFFLINE,
+    (RELAY, WIFI_LOST): DATA_LOGGING,
+    (RESET, CLEARED): REGISTRATION,
+    (RESET, SERVER_DOWN): DATA_LOGGING,
+    (RESET, WIFI_LOST): DATA_LOGGING,
+    (REGISTRATION, REGISTERED): RELAY,
+    (REGISTRATION, SERVER_DOWN): DATA_LOGGING,
+    (REGISTRATION, WIFI_LOST): DATA_LOGGING,
+}
+
+OK_TTL_MS = 5 * 60 * 1000
+FAIL_TTL_MS = 60 * 1000
+LOSS_FAILURES = 2
+
+
+class Connectivity:
+    def __init__(self, registered, backlog, ok_ttl_ms=OK_TTL_MS, fail_ttl_ms=FAIL_TTL_MS,
+                 loss_failures=LOSS_FAILURES, on_change=None):
+        self.registered = registered    # () → node has a register
+        self.backlog = backlog          # () → readings are cached
+        self.ok_ttl_ms = ok_ttl_ms
+        self.fail_ttl_ms = fail_ttl_ms
+        self.loss_failures = loss_failures
+        self.on_change = on_change      # (old mode, new mode, event)
+        self.mode = DATA_LOGGING
+        self.wifi = False
+        self.online = False
+        self.probed_at = None           # ticks_ms of the cached result
+        self.failures = 0               # transport failures in a row
+        self.probes = 0
+        self.transitions = 0
+
+    def resolve(self, target):
+        if target == ONLINE:
+            if not self.wifi:
+                return DATA_LOGGING
+            if self.registered():
+                return RELAY
+            return RESET if self.backlog() else REGISTRATION
+        if target == OFFLINE:
+            return DATA_BANK if self.registered() and self.wifi else DATA_LOGGING
+        return target
+
+    def event(self, name):
+        target = TRANSITIONS.get((self.mode, name))
+        if target is not None:
+            mode = self.resolve(target)
+            if mode != self.mode:
+                old, self.mode = self.mode, mode
+                self.transitions += 1
+                if self.on_change is not None:
+                    self.on_change(old, mode, name)
+        return self.mode
+
+    # --- wifi ---
+    def wifi_joined(self):
+        if not self.wifi:
+            self.wifi = True
+            self.probed_at = None       # new link: nothing known about the server
+            self.event(WIFI_JOINED)
+
+    def wifi_lost(self):
+        if self.wifi:
+            self.wifi = self.online = False
+            self.probed_at = None
+            self.failures = 0
+            self.event(WIFI_LOST)
+
+    # --- server ---
+    def probe_age_ms(self):
+        if self.probed_at is None:
+            return None
+        return utime.ticks_diff(utime.ticks_ms(), self.probed_at)
+
+    def probe_in_ms(self):
+        """Time until the cached probe result expires (0: probe now)"""
+        age = self.probe_age_ms()
+        if age is None:
+            return 0
+        return max(0, (self.ok_ttl_ms if self.online else self.fail_ttl_ms) - age)
+
+    def probe_due(self):
+        return self.wifi and self.probe_in_ms() == 0
+
+    def server(self, up):
+        self.online = up
+        self.probed_at = utime.ticks_ms()
+        if up:
+            self.failures = 0
+        return self.event(SERVER_UP if up else SERVER_DOWN)
+
+    def probed(self, up):
+        """Result of a /hello probe"""
+        self.probes += 1
+        return self.server(up)
+
+    def request_ok(self):
+        """Any request that reached the server: as good as a probe"""
+        return self.server(True)
+
+    def request_failed(self):
+        """A request failed in transport; True once the link counts as lost"""
+        self.failures += 1
+        if self.failures < self.loss_failures:
+            return False
+        self.server(False)
+        return True
+
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "wifi": self.wifi,
+            "online": self.online,
+            "probe_age_ms": self.probe_age_ms(),
+            "probes": self.probes,
+            "failures": self.failures,
+            "transitions": self.transitions,
+        }
+
+
+if __name__ == "__main__":
+    registered = [False]
+    backlog = [True]
+    changes = []
+    link = Connectivity(lambda: registered[0], lambda: backlog[0],
+                        on_change=lambda old, new, event: changes.append((old, new, event)))
+    assert link.event(SERVER_UP) == DATA_LOGGING and not link.probe_due()  # no wifi yet
+    link.wifi_joined()
+    assert link.probe_due()
+    assert link.probed(True) == RESET and not link.probe_due()
+    backlog[0] = False
+    assert link.event(CLEARED) == REGISTRATION
+    registered[0] = True
+    assert link.event(REGISTERED) == RELAY
+    assert not link.request_failed() and link.mode == RELAY
+    assert link.request_failed() and link.mode == DATA_BANK
+    assert link.probe_in_ms() == FAIL_TTL_MS
+    assert link.probed(True) == RELAY and link.probe_in_ms() == OK_TTL_MS
+    link.wifi_lost()
+    assert link.mode == DATA_LOGGING and link.probe_in_ms() == 0 and not link.probe_due()
+    assert [c[1] for c in changes] == [RESET, REGISTRATION, RELAY, DATA_BANK, RELAY, DATA_LOGGING]
+    print("connectivity ok", link.stats())
@@ -0,0 +1,152 @@
+"""
+conversions.py
+Integer ADC → TDS / pH conversion shared by both sensor modules (MicroPython)
+
+TDS: the cubic is evaluated once at load time into a table over the
+temperature compensated raw value (ppm x10, K applied). Compensation is a
+fixed-point multiply by 1/comp, precomputed per 0.1 °C bucket, so a
+reading is a multiply, a shift and a table interpolation.
+
+pH: each calibration line is folded into one fixed-point multiply-add
+from the raw value; a multi-point curve (PhCurve) picks the line of the
+segment the raw value falls in.
+"""
+
+from array import array
+
+ADC_MAX = 65535
+# fixed-point fraction bits, small enough that raw * coefficient stays a
+# small int (< 2**30) on the RP2040 and never allocates
+Q_COMP = 12
+Q_PH = 14
+TABLE_SHIFT = 7         # raw values per table step = 128
+COMP_RANGE = 2          # compensated raw can reach 2x full scale (cold water)
+
+TEMP_MIN = 0.0          # °C covered by the compensation buckets
+TEMP_MAX = 50.0
+TEMP_STEP = 0.1
+
+
+def tds_formula(voltage, water_temp=25.0, k_value=0.5):
+    """Reference float formula, as the sensor modules used to compute it"""
+    comp_voltage = voltage / (1.0 + 0.02 * (water_temp - 25.0))
+    return (
+        133.42 * comp_voltage**3
+        - 255.86 * comp_voltage**2
+        + 857.39 * comp_voltage
+    ) * k_value
+
+
+class TdsTable:
+    def __init__(self, k_value=0.5, vref=3.3):
+        self.k_value = k_value
+        self.vref = vref
+        steps = (COMP_RANGE * (ADC_MAX + 1)) >> TABLE_SHIFT
+        self.table = array("I", [0] * (steps + 1))
+        for i in range(steps + 1):
+            voltage = (i << TABLE_SHIFT) * vref / ADC_MAX
+            self.table[i] = max(int(tds_formula(voltage, 25.0, k_value) * 10 + 0.5), 0)
+        buckets = int((TEMP_MAX - TEMP_MIN) / TEMP_STEP + 0.5) + 1
+        self.inv_comp = array("I", [0] * buckets)
+        for b in range(buckets):
+            temp = TEMP_MIN + b * TEMP_STEP
+            self.inv_comp[b] = int((1 << Q_COMP) / (1.0 + 0.02 * (temp - 25.0)) + 0.5)
+
+    def bucket(self, water_temp):
+        if water_temp is None:
+            water_temp = 25.0
+        b = int((water_temp - TEMP_MIN) / TEMP_STEP + 0.5)
+        return min(max(b, 0), len(self.inv_comp) - 1)
+
+    def ppm10(self, raw, water_temp=25.0):
+        """TDS in tenths of ppm from a raw u16 reading"""
+        comp_raw = (raw * self.inv_comp[self.bucket(water_temp)]) >> Q_COMP
+        i = comp_raw >> TABLE_SHIFT
+        table = self.table
+        if i >= len(table) - 1:
+            return table[-1]
+        frac = comp_raw & ((1 << TABLE_SHIFT) - 1)
+        lo = table[i]
+        return lo + (((table[i + 1] - lo) * frac) >> TABLE_SHIFT)
+
+
+class PhLine:
+    """pH = 7 + (voltage - v7) * slope, as (a + raw * b) >> Q_PH in 1/1000 pH.
+    ph_low/ph_high are the buffers the two voltages were measured in."""
+
+    def __init__(self, voltage_at_ph4=1.92, voltage_at_ph7=2.50, vref=3.3, ph_low=4.0, ph_high=7.0):
+        self.vref = vref
+        self.slope = (ph_high - ph_low) / (voltage_at_ph7 - voltage_at_ph4)
+        # + half an lsb so the shift rounds instead of flooring
+        self.a = round((ph_high - voltage_at_ph7 * self.slope) * 1000 * (1 << Q_PH)) + (1 << (Q_PH - 1))
+        self.b = round(vref * self.slope / ADC_MAX * 1000 * (1 << Q_PH))
+
+    def ph1000(self, raw):
+        return (self.a + raw * self.b) >> Q_PH
+
+
+class PhCurve:
+    """Piecewise PhLine through (pH, voltage) calibration points; the end
+    segments are extended past the outer buffers"""
+
+    def __init__(self, points, vref=3.3):
+        points = sorted(points, key=lambda p: p[1])
+        if len(points) < 2:
+            raise ValueError("pH calibration needs at least two points")
+        self.points = points
+        self.lines = [PhLine(v_lo, v_hi, vref, ph_lo, ph_hi)
+                      for (ph_lo, v_lo), (ph_hi, v_hi) in zip(points, points[1:])]
+        # raw value where each inner point hands over to the next line
+        self.breaks = array("I", [min(int(v / vref * ADC_MAX + 0.5), ADC_MAX) for _, v in points[1:-1]])
+
+    def ph1000(self, raw):
+        i = 0
+        breaks = self.breaks
+        while i < len(breaks) and raw >= breaks[i]:
+            i += 1
+        return self.lines[i].ph1000(raw)
+
+
+def millivolts(raw, vref=3.3):
+    return (raw * int(vref * 1000)) // ADC_MAX
+
+
+# ==============================
+# ERROR BOUND CHECK (host or board)
+# ==============================
+if __name__ == "__main__":
+    # table/fixed-point error stays under TDS_ABS ppm; a temperature between
+    # two 0.1 °C buckets adds up to ~0.15% of the value on top
+    TDS_ABS = 0.5
+    TDS_REL = 0.002
+    PH_BOUND = 0.002
+
+    tds = TdsTable()
+    worst = 0.0
+    for temp in (5.0, 12.3, 18.0, 25.0, 27.4, 31.05, 40.0):
+        for raw in range(0, ADC_MAX + 1, 97):
+            expected = tds_formula(raw / ADC_MAX * 3.3, temp)
+            error = abs(tds.ppm10(raw, temp) / 10 - expected)
+            assert error <= TDS_ABS + TDS_REL * expected, "TDS error above bound at %d, %.2f C" % (raw, temp)
+            worst = max(worst, error)
+    print("TDS max abs error: %.3f ppm" % worst)
+
+    ph = PhLine()
+    worst = 0.0
+    for raw in range(0, ADC_MAX + 1, 13):
+        expected = 7.0 + (raw / ADC_MAX * 3.3 - 2.50) * ph.slope
+        worst = max(worst, abs(ph.ph1000(raw) / 1000 - expected))
+    print("pH max abs error: %.4f" % worst)
+    assert worst <= PH_BOUND, "pH line error above bound"
+
+    points = [(4.0, 1.92), (7.0, 2.50), (10.0, 2.98)]
+    curve = PhCurve(points)
+    worst = 0.0
+    for raw in range(0, ADC_MAX + 1, 13):
+        voltage = raw / ADC_MAX * 3.3
+        (ph_lo, v_lo), (ph_hi, v_hi) = points[:2] if voltage < 2.50 else points[1:]
+        expected = ph_lo + (voltage - v_lo) * (ph_hi - ph_lo) / (v_hi - v_lo)
+        worst = max(worst, abs(curve.ph1000(raw) / 1000 - expected))
+    print("pH curve max abs error: %.4f" % worst)
+    assert worst <= PH_BOUND, "pH curve error above bound"
+    print("conversion error bounds OK")
@@ -0,0 +1,74 @@
+"""
+deadband.py
+Report-by-exception filter for the reading cache (MicroPython)
+
+A reading of a sensor with a band is only kept when it moved past the
+absolute or percent band since the last kept value, or when the heartbeat
+interval expired. Held back samples are counted per sensor; the counts go
+into the journal with each batch (codec.ReadingBatch.add_suppressed) so
+"unchanged" stays distinguishable from "missing".
+"""
+
+
+class Deadband:
+    def __init__(self, bands, heartbeat_seconds=1800):
+        self.bands = bands          # name → (absolute, percent), 0 disables one
+        self.heartbeat = heartbeat_seconds
+        self.last = {}              # name → (timestamp, value) last kept
+        self.suppressed = {}        # name → samples held back since take_counts
+        self.total_suppressed = 0
+        self.total_kept = 0
+
+    def moved(self, name, value, last):
+        absolute, percent = self.bands[name]
+        change = abs(value - last)
+        if absolute and change >= absolute:
+            return True
+        return bool(percent) and change >= abs(last) * percent / 100
+
+    def keep(self, name, value, t):
+        if name not in self.bands:
+            return True
+        last = self.last.get(name)
+        # None (sensor fault) and the first value after it are always kept
+        if (value is None or last is None or last[1] is None
+                or t - last[0] >= self.heartbeat or self.moved(name, value, last[1])):
+            self.last[name] = (t, value)
+            self.total_kept += 1
+            return True
+        self.suppressed[name] = self.suppressed.get(name, 0) + 1
+        self.total_suppressed += 1
+        return False
+
+    def filter(self, t, readings):
+        """Readings of a snapshot that should be cached"""
+        return {name: value for name, value in readings.items() if self.keep(name, value, t)}
+
+    def take_counts(self):
+        """Suppression counts since the last call, then start over"""
+        counts = self.suppressed
+        self.suppressed = {}
+        return counts
+
+    def stats(self):
+        return {"kept": self.total_kept, "suppressed": self.total_suppressed}
+
+
+# ==============================
+# SELF CHECK (host or board)
+# ==============================
+if __name__ == "__main__":
+    band = Deadband({"ph": (0.1, 0), "tds": (0, 2)}, heartbeat_seconds=300)
+    kept = []
+    phs = [6.10, 6.12, 6.15, 6.25, 6.26, 6.24, 6.20, 6.21, 6.22, 6.23]
+    for tick, ph in enumerate(phs):
+        readings = band.filter(tick * 60, {"ph": ph, "tds": 400 + tick, "humidity": 60})
+        assert readings["humidity"] == 60, "sensors without a band always pass"
+        kept.append(("ph" in readings, "tds" in readings))
+    # ph moves 0.1 at tick 3, heartbeat at tick 8; tds only hits 2% on heartbeat
+    assert [k[0] for k in kept] == [1, 0, 0, 1, 0, 0, 0, 0, 1, 0], kept
+    assert [k[1] for k in kept] == [1, 0, 0, 0, 0, 1, 0, 0, 0, 0], kept
+    assert band.take_counts() == {"ph": 7, "tds": 8} and band.take_counts() == {}
+    assert "ph" in band.filter(600, {"ph": None}) and "ph" in band.filter(660, {"ph": 6.23})
+    print("deadband:", band.stats())
+    print("deadband OK")
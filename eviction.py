@@ -0,0 +1,210 @@
+"""
+eviction.py
+Eviction policies for a bounded journal (DATA_BANK mode)
+
+When a new batch does not fit in the journal capacity the oldest records
+are handed to policy.shrink(kind, payload, skip) in turn, skip being how
+many of a record's entries the server already acknowledged. Returning a
+smaller payload keeps it in place of the old one, returning the payload
+(or anything not smaller) keeps the record as it is, returning None drops
+it. Once no record can be made smaller the oldest ones are dropped.
+"""
+
+import codec
+from journal import KIND_READINGS, KIND_WINDOW
+
+
+def kept(payload):
+    """None once a shrunk batch has no readings left"""
+    return payload if len(payload) > codec.HEADER_SIZE else None
+
+
+def shrink_readings(kind, payload, skip, shrink):
+    """Drop the skip acknowledged entries of a record, then apply shrink to
+    its batch of readings; a window's rollups are kept as they are, and
+    its readings are dropped when shrink cannot make them any smaller"""
+    if kind == KIND_READINGS:
+        return kept(shrink(codec.drop(payload, skip)))
+    if kind != KIND_WINDOW:
+        return None
+    readings, rollup = codec.split_window(payload)
+    if readings:
+        left = max(skip - codec.count_entries(readings), 0)
+        shrunk = shrink(codec.drop(readings, skip))
+        # nothing left to thin (about one sample per sensor): the raw
+        # readings go, the rollups stay
+        readings = None if rollup and len(shrunk) >= len(readings) else kept(shrunk)
+        skip = left
+    if rollup:
+        rollup = kept(codec.drop_rollups(rollup, skip))
+    if readings is None and rollup is None:
+        return None
+    return codec.window_payload(readings or b"", rollup or b"")
+
+
+class DropOldest:
+    name = "drop_oldest"
+
+    def shrink(self, kind, payload, skip=0):
+        return None
+
+
+class Thin:
+    """Keep every Nth sample of each sensor in the oldest batch"""
+    name = "thin"
+
+    def __init__(self, every=2):
+        self.every = every
+
+    def shrink(self, kind, payload, skip=0):
+        return shrink_readings(kind, payload, skip, lambda readings: codec.thin(readings, self.every))
+
+
+class Aggregate:
+    """Replace the oldest batch with one mean reading per sensor"""
+    name = "aggregate"
+
+    def shrink(self, kind, payload, skip=0):
+        return shrink_readings(kind, payload, skip, codec.aggregate)
+
+
+POLICIES = {
+    DropOldest.name: DropOldest,
+    Thin.name: Thin,
+    Aggregate.name: Aggregate,
+}
+
+
+def make_policy(name, **kwargs):
+    try:
+        return POLICIES[name](**kwargs)
+    except KeyError:
+        raise ValueError(f"unknown eviction policy: {name}")
+
+
+# ==============================
+# SELF CHECK (host or board)
+# ==============================
+if __name__ == "__main__":
+    import os
+    from journal import Journal
+    from aggregator import WindowAggregator
+    from deadband import Deadband
+
+    # a day of cache windows as main.py writes them: rolled up sensors,
+    # pH drifting past its band now and then, the rest mostly held back
+    names = ["water_level", "water_temp", "ambient_temp", "humidity", "ldr", "ph", "tds"]
+    windows = []
+    window = WindowAggregator(("ambient_temp", "humidity", "water_temp", "ldr"))
+    band = Deadband({"ph": (0.1, 0), "tds": (0, 2), "water_level": (0.5, 0)}, 1800)
+    for w in range(144):
+        batch = codec.ReadingBatch(1000 + w * 600)
+        for tick in range(10):
+            t = 1000 + w * 600 + tick * 60
+            snapshot = {"water_level": 12.0 + (w // 40) * 0.5, "water_temp": 21.5, "ambient_temp": 27.0,
+                        "humidity": 60, "ldr": 40.0, "ph": 6.0 + ((w * 10 + tick) % 7) * 0.05 * (w % 3 == 0),
+                        "tds": 800 + (w % 5)}
+            batch.add_snapshot(names, band.filter(t, window.add(t, snapshot)), t)
+        batch.add_suppressed(names, band.take_counts(), t)
+        windows.append(codec.WindowBatch(batch, window.flush(names)).payload())
+
+    evicted = {}
+    windows_kept = {}
+    for name in POLICIES:
+        path = "eviction_check.jnl"
+        for f in (path, path + ".idx"):
+            if f in os.listdir():
+                os.remove(f)
+        journal = Journal(path, capacity=4096, policy=make_policy(name))
+        for payload in windows:
+            journal.append(payload, KIND_WINDOW)
+        evicted[name] = journal.stats()["evicted_bytes"]
+        windows_kept[name] = len(journal)
+        rollups = 0
+        for offset, kind, payload in journal.records():
+            rollups += codec.split_window(payload)[1] is not None
+        assert rollups == len(journal), "every window kept its rollups"
+        print(name, journal.stats())
+        os.remove(path)
+        os.remove(path + ".idx")
+    assert windows_kept["thin"] > windows_kept["drop_oldest"] and \
+        windows_kept["aggregate"] > windows_kept["drop_oldest"], "shrinking keeps more windows than dropping them"
+    assert len(set(evicted.values())) == len(evicted), "every policy evicts its own amount"
+
+    # a power cut part way through a shrink: the journal reopens on a
+    # readable backlog, oldest first, whichever frames got rewritten
+    import journal as journal_module
+
+    class PowerCut(Exception):
+        pass
+
+    class TornFile:
+        """The data file, losing power halfway through a write"""
+        writes = 0
+
+        def __init__(self, f):
+            self.f = f
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            self.f.close()
+
+        def seek(self, offset):
+            return self.f.seek(offset)
+
+        def read(self, size):
+            return self.f.read(size)
+
+        def write(self, data):
+            if not TornFile.writes:
+                self.f.write(data[:len(data) // 2])
+                raise PowerCut()
+            TornFile.writes -= 1
+            return self.f.write(data)
+
+    sensors = [{"_id": "id%d" % i, "name": name} for i, name in enumerate(names)]
+    path = "eviction_check.jnl"
+
+    def fill(windows):
+        for f in (path, path + ".idx"):
+            if f in os.listdir():
+                os.remove(f)
+        journal = Journal(path, capacity=4096, policy=make_policy("thin"))
+        for payload in windows:
+            journal.append(payload, KIND_WINDOW)
+        return journal
+
+    # the first append that rewrites the head
+    journal = fill(())
+    for cut, payload in enumerate(windows):
+        shrunk = journal.shrunk
+        journal.append(payload, KIND_WINDOW)
+        if journal.shrunk > shrunk:
+            break
+    torn = 0
+    while True:
+        fill(windows[:cut])
+        TornFile.writes = torn
+        journal_module.open = lambda name, mode="r": TornFile(open(name, mode)) if name == path else open(name, mode)
+        try:
+            Journal(path, capacity=4096, policy=make_policy("thin")).append(windows[cut], KIND_WINDOW)
+            done = True
+        except PowerCut:
+            done = False
+        del journal_module.open
+        journal = Journal(path, capacity=4096, policy=make_policy("thin"))
+        stamps = [min(entry["timestamp"] for entry in codec.iter_window_json(payload, sensors))
+                  for _, _, payload in journal.records()]
+        assert stamps == sorted(set(stamps)), "a torn shrink reads back oldest first, once"
+        assert stamps[-1] >= 1000 + (cut - 1) * 600, "the newest windows survive a torn shrink"
+        if done:
+            break
+        journal.append(windows[cut], KIND_WINDOW)
+        assert len(list(journal.records())) == len(stamps) + 1, "appends go on after a torn shrink"
+        torn += 1
+    os.remove(path)
+    os.remove(path + ".idx")
+    print("torn shrinks:", torn)
+    print("eviction policies OK")
@@ -0,0 +1,155 @@
+"""
+health.py
+Per-sensor health tracking with a circuit breaker (MicroPython)
+
+Every guarded sensor keeps error counters, its last good value and when it
+was taken. After FAILURE_THRESHOLD consecutive failures the breaker opens
+and the sensor is skipped (no bus timeouts) until its backoff expires; the
+next read is a single half-open trial that closes the breaker on success
+or reopens it with twice the backoff, up to MAX_BACKOFF_MS.
+"""
+
+import utime
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+FAILURE_THRESHOLD = 3
+BASE_BACKOFF_MS = 2000
+MAX_BACKOFF_MS = 5 * 60 * 1000
+
+
+def failed(value):
+    """A read gave nothing usable: None, or a tuple starting with None"""
+    if isinstance(value, tuple):
+        return not value or value[0] is None
+    return value is None
+
+
+class SensorHealth:
+    def __init__(self, name, threshold=FAILURE_THRESHOLD, base_backoff_ms=BASE_BACKOFF_MS,
+                 max_backoff_ms=MAX_BACKOFF_MS):
+        self.name = name
+        self.threshold = threshold
+        self.base_backoff_ms = base_backoff_ms
+        self.max_backoff_ms = max_backoff_ms
+        self.state = CLOSED
+        self.errors = 0             # consecutive
+        self.total_errors = 0
+        self.total_reads = 0
+        self.skipped = 0            # reads not attempted while open
+        self.last_error = None
+        self.last_good = None
+        self.last_good_at = None    # ticks_ms
+        self.opened_at = None
+        self.backoff_ms = base_backoff_ms
+
+    def allow(self):
+        """Should the sensor be read now? Moves open → half-open once the
+        backoff expired"""
+        if self.state == OPEN:
+            if utime.ticks_diff(utime.ticks_ms(), self.opened_at) < self.backoff_ms:
+                self.skipped += 1
+                return False
+            self.state = HALF_OPEN
+        return True
+
+    def success(self, value):
+        self.total_reads += 1
+        self.errors = 0
+        self.state = CLOSED
+        self.backoff_ms = self.base_backoff_ms
+        self.last_good = value
+        self.last_good_at = utime.ticks_ms()
+
+    def failure(self, error=None):
+        self.total_reads += 1
+        self.total_errors += 1
+        self.errors += 1
+        self.last_error = error
+        if self.state == HALF_OPEN:
+            self.backoff_ms = min(self.backoff_ms * 2, self.max_backoff_ms)
+        elif self.errors < self.threshold:
+            return
+        if self.state != OPEN:
+            print(f"{self.name}: circuit open for {self.backoff_ms} ms ({error})")
+        self.state = OPEN
+        self.opened_at = utime.ticks_ms()
+
+    def age_ms(self):
+        """Milliseconds since the last good value, None if there never was one"""
+        if self.last_good_at is None:
+            return None
+        return utime.ticks_diff(utime.ticks_ms(), self.last_good_at)
+
+    def read(self, read, fallback=None):
+        """Call read() through the breaker; fallback when skipped or failed"""
+        if not self.allow():
+            return fallback
+        try:
+            value = read()
+        except Exception as e:
+            self.failure(e)
+            return fallback
+        if failed(value):
+            self.failure("no value")
+            return fallback
+        self.success(value)
+        return value
+
+    def status(self):
+        return {
+            "state": self.state,
+            "errors": self.errors,
+            "total_errors": self.total_errors,
+            "total_reads": self.total_reads,
+            "skipped": self.skipped,
+            "age_ms": self.age_ms(),
+        }
+
+
+class Health:
+    def __init__(self, names, **kwargs):
+        self.sensors = {name: SensorHealth(name, **kwargs) for name in names}
+
+    def __getitem__(self, name):
+        return self.sensors[name]
+
+    def guard(self, name, read, fallback=None):
+        """read wrapped in the breaker of sensor name, for schedulers"""
+        sensor = self.sensors[name]
+        return lambda: sensor.read(read, fallback)
+
+    def report(self):
+        return {name: sensor.status() for name, sensor in self.sensors.items()}
+
+
+def validity(readings):
+    """Per-field validity of a (possibly partial) snapshot"""
+    return {name: value is not None for name, value in readings.items()}
+
+
+# ==============================
+# SELF CHECK (host or board)
+# ==============================
+if __name__ == "__main__":
+    calls = []
+
+    def dead_bus():
+        calls.append(utime.ticks_ms())
+        raise OSError("no presence pulse")
+
+    probe = SensorHealth("ds18", threshold=2, base_backoff_ms=50, max_backoff_ms=120)
+    for _ in range(5):
+        assert probe.read(dead_bus) is None
+    assert probe.state == OPEN and len(calls) == 2 and probe.skipped == 3, "open breaker skips the bus"
+    utime.sleep_ms(60)
+    probe.read(dead_bus)
+    assert probe.state == OPEN and probe.backoff_ms == 100, "failed half-open trial doubles the backoff"
+    utime.sleep_ms(110)
+    assert probe.read(lambda: 21.5) == 21.5 and probe.state == CLOSED, "good trial closes the breaker"
+    assert probe.backoff_ms == 50 and probe.last_good == 21.5
+    assert probe.read(lambda: (None, None), (None, None)) == (None, None) and probe.errors == 1
+    print("health:", probe.status())
+    print("circuit breaker OK")
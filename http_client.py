@@ -0,0 +1,309 @@
+"""
+http_client.py
+Small asyncio HTTP/1.1 client with keep-alive connections (MicroPython)
+
+urequests opens a new socket (and for https a new TLS handshake, seconds of
+radio time and several KB of heap on a Pico W) for every request and
+blocks the whole event loop until the server answers. A Session keeps one
+uasyncio stream per scheme/host/port open between requests, so a request
+sent within idle_seconds of the previous one (registration after its
+/hello probe, every /readings page of an upload after the first one) only
+costs a request round trip, and sampling, caching and the display keep
+running while a request waits on the network.
+
+Requests minutes apart, which is most of them (each upload, and a /hello
+probe when no upload went through for a while), still pay a handshake:
+the server's keep-alive closes an idle connection long before the next
+one. Response.connect_ms says how much of a request's time that was.
+
+Every request runs under asyncio.wait_for with its own timeout; a request
+that times out or whose task is cancelled closes its connection, so a
+stalled server costs at most one timeout and never a half-read stream.
+
+A pooled connection is dropped and reopened when:
+ - it was idle for longer than idle_seconds, which should stay below the
+   server's keep-alive timeout so the server never closes it first
+ - the server closed it meanwhile (seen as EOF before the request is sent)
+ - the server answered with "Connection: close" or a body without length
+ - any socket error happened while it was in use
+
+A request that fails on a reused connection before any response byte
+arrived is sent once more on a fresh one, when its body can be replayed
+(bytes/str, not a generator).
+
+Responses are read completely before request() returns, so the connection
+is free for the next request and close() on them is optional.
+"""
+
+import ujson
+import utime
+import uasyncio as asyncio
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+IDLE_SECONDS = 4        # below the server's keep-alive (Node's default is 5 s)
+TIMEOUT_SECONDS = 10
+
+
+class Response:
+    def __init__(self, status_code, reason, headers, content, reused=False, connect_ms=0):
+        self.status_code = status_code
+        self.reason = reason
+        self.headers = headers
+        self.content = content
+        self.reused = reused            # sent on an open connection
+        self.connect_ms = connect_ms    # handshake time included in the request's
+
+    @property
+    def text(self):
+        return self.content.decode()
+
+    def json(self):
+        return ujson.loads(self.content)
+
+    def close(self):
+        pass
+
+
+def split_url(url):
+    """URL → (scheme, host, port, path)"""
+    scheme, _, rest = url.partition("://")
+    host, slash, path = rest.partition("/")
+    if ":" in host:
+        host, port = host.split(":", 1)
+        port = int(port)
+    else:
+        port = DEFAULT_PORTS[scheme]
+    return scheme, host, port, slash + path if slash else "/"
+
+
+class Connection:
+    """One open stream to a host, plus when it was last used"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.requests = 0
+        self.used_ms = utime.ticks_ms()
+        self.connect_ms = 0     # how long opening it took (TCP + TLS handshakes)
+
+    @classmethod
+    async def open(cls, scheme, host, port):
+        started = utime.ticks_ms()
+        reader, writer = await asyncio.open_connection(host, port, ssl=scheme == "https" or None)
+        conn = cls(reader, writer)
+        conn.connect_ms = utime.ticks_diff(conn.used_ms, started)
+        return conn
+
+    def idle_ms(self):
+        return utime.ticks_diff(utime.ticks_ms(), self.used_ms)
+
+    def dropped(self):
+        """The server closed the connection while it sat in the pool"""
+        try:
+            # uasyncio sockets are non-blocking: None while nothing arrived
+            data = self.reader.s.read(1)
+        except OSError:
+            return True
+        # b"": EOF; anything else is a stray byte we cannot put back
+        return data is not None
+
+    def close(self):
+        # uasyncio's Stream.close() leaves the socket to wait_closed(),
+        # which cannot be awaited while a request is being cancelled
+        try:
+            self.writer.close()
+            self.writer.s.close()
+        except OSError:
+            pass
+
+
+async def write_body(writer, data):
+    """Body as given: bytes/str in one go, anything iterable chunked
+    (also flushes the request head written before it)"""
+    if data is None:
+        await writer.drain()
+        return
+    if isinstance(data, (bytes, bytearray)):
+        writer.write(data)
+        await writer.drain()
+        return
+    if isinstance(data, str):
+        writer.write(data.encode())
+        await writer.drain()
+        return
+    for chunk in data:
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        if chunk:
+            writer.write(("%x\r\n" % len(chunk)).encode())
+            writer.write(chunk)
+            writer.write(b"\r\n")
+            await writer.drain()
+    writer.write(b"0\r\n\r\n")
+    await writer.drain()
+
+
+async def read_response(reader):
+    """(status, reason, headers, body, keep_alive) of one response"""
+    line = await reader.readline()
+    if not line:
+        raise EOFError("connection closed by server")
+    parts = line.split(None, 2)
+    if len(parts) < 2:
+        raise ValueError("bad status line: %r" % line)
+    version, status = parts[0], int(parts[1])
+    reason = parts[2].strip() if len(parts) > 2 else b""
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if not line or line == b"\r\n":
+            break
+        name, _, value = line.decode().partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    keep_alive = version == b"HTTP/1.1"
+    connection = headers.get("connection", "").lower()
+    if connection == "close":
+        keep_alive = False
+    elif connection == "keep-alive":
+        keep_alive = True
+
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        body = bytearray()
+        while True:
+            size = int((await reader.readline()).split(b";")[0].strip(), 16)
+            if not size:
+                # trailers up to the empty line
+                while (await reader.readline()) not in (b"\r\n", b""):
+                    pass
+                break
+            body.extend(await reader.readexactly(size))
+            await reader.readline()
+        body = bytes(body)
+    elif "content-length" in headers:
+        body = await reader.readexactly(int(headers["content-length"]))
+    elif status in (204, 304) or 100 <= status < 200:
+        body = b""
+    else:
+        # length unknown: body runs to the end of the connection
+        chunks = []
+        while True:
+            data = await reader.read(512)
+            if not data:
+                break
+            chunks.append(data)
+        body = b"".join(chunks)
+        keep_alive = False
+    return status, reason, headers, body, keep_alive
+
+
+class Session:
+    """Keep-alive connections shared by every request made through it"""
+
+    def __init__(self, idle_seconds=IDLE_SECONDS, timeout=TIMEOUT_SECONDS):
+        self.max_idle_ms = idle_seconds * 1000
+        self.timeout = timeout
+        self.pool = {}          # (scheme, host, port) → Connection
+        self.connects = 0       # new connections (TCP + TLS handshakes)
+        self.reuses = 0         # requests sent on an already open connection
+        self.reconnects = 0     # pooled connections found stale or broken
+        self.expired = 0        # pooled connections closed after idle_seconds
+        self.requests = 0
+        self.timeouts = 0       # requests given up after their timeout
+
+    async def connection(self, key):
+        """Pooled connection for key, or a new one; (connection, reused)"""
+        conn = self.pool.pop(key, None)
+        if conn is not None:
+            if conn.idle_ms() >= self.max_idle_ms:
+                self.expired += 1
+            elif not conn.dropped():
+                return conn, True
+            else:
+                self.reconnects += 1
+            conn.close()
+        conn = await Connection.open(key[0], key[1], key[2])
+        self.connects += 1
+        return conn, False
+
+    async def request(self, method, url, data=None, json=None, headers=None, timeout=None):
+        """Send one request; raises asyncio.TimeoutError after timeout
+        seconds (the Session's by default)"""
+        if json is not None:
+            data = ujson.dumps(json)
+        try:
+            return await asyncio.wait_for(self.exchange(method, url, data, headers),
+                                          timeout or self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+
+    async def exchange(self, method, url, data, headers):
+        scheme, host, port, path = split_url(url)
+        key = (scheme, host, port)
+        replayable = data is None or isinstance(data, (bytes, bytearray, str))
+
+        authority = host if port == DEFAULT_PORTS[scheme] else "%s:%d" % (host, port)
+        head = ["%s %s HTTP/1.1" % (method, path), "Host: %s" % authority]
+        for name, value in (headers or {}).items():
+            head.append("%s: %s" % (name, value))
+        if data is None:
+            pass
+        elif replayable:
+            head.append("Content-Length: %d" % len(data.encode() if isinstance(data, str) else data))
+        else:
+            head.append("Transfer-Encoding: chunked")
+        head = ("\r\n".join(head) + "\r\n\r\n").encode()
+
+        while True:
+            conn, reused = await self.connection(key)
+            answered = False
+            try:
+                conn.writer.write(head)
+                await write_body(conn.writer, data)
+                status, reason, response_headers, body, keep_alive = await read_response(conn.reader)
+                answered = True
+            except (OSError, EOFError):
+                if reused and replayable:
+                    # closed by the server as we reused it: once more, fresh
+                    self.reconnects += 1
+                    continue
+                raise
+            finally:
+                # failed, timed out or cancelled: the stream is in an unknown state
+                if not answered:
+                    conn.close()
+            break
+
+        self.requests += 1
+        conn.requests += 1
+        if reused:
+            self.reuses += 1
+        conn.used_ms = utime.ticks_ms()
+        if keep_alive:
+            self.pool[key] = conn
+        else:
+            conn.close()
+        return Response(status, reason, response_headers, body, reused, 0 if reused else conn.connect_ms)
+
+    async def get(self, url, **kw):
+        return await self.request("GET", url, **kw)
+
+    async def post(self, url, **kw):
+        return await self.request("POST", url, **kw)
+
+    def close(self):
+        for conn in self.pool.values():
+            conn.close()
+        self.pool = {}
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "connects": self.connects,
+            "reuses": self.reuses,
+            "reconnects": self.reconnects,
+            "expired": self.expired,
+            "timeouts": self.timeouts,
+            "open": len(self.pool),
+        }
@@ -0,0 +1,501 @@
+"""
+journal.py
+Append-only journal used as the on-flash reading cache (MicroPython)
+
+Batches are written to the end of a data file as framed records:
+ - 1 byte  magic (0xA5)
+ - 1 byte  record kind
+ - 2 bytes payload length
+ - 4 bytes crc32 of the payload
+ - payload
+
+A small index file (<path>.idx) keeps the read offset (plus how many
+entries of the head record a consumer already acknowledged), the write
+offset and the number of live records, so appending a batch never has to read or
+rewrite the backlog that is already on flash.
+
+With a capacity the data file becomes a fixed size ring: offsets keep
+growing but map onto capacity bytes of flash, a frame never straddles the
+end of the file (the gap is marked with a KIND_PAD frame) and the oldest
+records are handed to an eviction policy when a new one does not fit.
+"""
+
+import os, struct
+from binascii import crc32
+
+FRAME_FORMAT = "<BBHI"
+FRAME_SIZE = struct.calcsize(FRAME_FORMAT)
+FRAME_MAGIC = 0xA5
+MAX_PAYLOAD = 0xFFFF    # largest payload a frame's length field holds
+SHRINK_SLACK = 16       # shrinking frees capacity // SHRINK_SLACK more than asked
+RESYNC_BLOCK = 256      # bytes read at a time while looking for a good frame
+
+# magic, version, read offset, head skip, write offset, records, capacity,
+# dropped, shrunk, evicted bytes
+INDEX_FORMAT = "<2sBxIIIIIIII"
+INDEX_MAGIC = b"JN"
+INDEX_VERSION = 3
+
+# record kinds
+KIND_JSON = 0           # ujson encoded {"sensors", "actuators"} batch
+KIND_READINGS = 1       # codec.ReadingBatch payload
+KIND_ROLLUP = 2         # codec.RollupBatch payload
+KIND_WINDOW = 3         # codec.WindowBatch payload: one cache window
+KIND_PAD = 0xFF         # unused space up to the end of a ring
+
+PAD_HEADER = struct.pack(FRAME_FORMAT, FRAME_MAGIC, KIND_PAD, 0, 0)
+
+
+def file_size(path):
+    try:
+        return os.stat(path)[6]
+    except OSError:
+        return None
+
+
+class Journal:
+    def __init__(self, path, index_path=None, capacity=0, policy=None):
+        self.path = path
+        self.index_path = index_path or path + ".idx"
+        self.read_off = 0
+        self.head_skip = 0      # entries of the head record already acknowledged
+        self.write_off = 0
+        self.count = 0
+        # a ring keeps the capacity it was created with until it is reset
+        self.capacity = capacity
+        self.next_capacity = capacity
+        self.policy = policy
+        # eviction counters
+        self.dropped = 0
+        self.shrunk = 0
+        self.evicted_bytes = 0
+        # bumped whenever the head moves other than by advance(): a
+        # cursor taken before that no longer points into the backlog
+        self.evictions = 0
+        # unreadable spans found so far: start → first good frame after it.
+        # How many records one held is unknown, so count stays as it is
+        # until the head reaches write_off
+        self.lost = {}
+        self._load_index()
+
+    def __len__(self):
+        """Number of records not yet consumed"""
+        return self.count
+
+    def pending_bytes(self):
+        return self.write_off - self.read_off
+
+    def stats(self):
+        return {
+            "records": self.count,
+            "bytes": self.pending_bytes(),
+            "capacity": self.capacity,
+            "dropped": self.dropped,
+            "shrunk": self.shrunk,
+            "evicted_bytes": self.evicted_bytes,
+        }
+
+    def _phys(self, offset):
+        return offset % self.capacity if self.capacity else offset
+
+    def _room(self, offset):
+        """Bytes left before the end of the ring"""
+        return self.capacity - offset % self.capacity
+
+    # ------------------------------
+    # Index handling
+    # ------------------------------
+    def _load_index(self):
+        try:
+            with open(self.index_path, "rb") as f:
+                raw = f.read(struct.calcsize(INDEX_FORMAT))
+            if len(raw) < struct.calcsize(INDEX_FORMAT):
+                raise ValueError("short index")
+            (magic, version, self.read_off, self.head_skip, self.write_off, self.count, self.capacity,
+             self.dropped, self.shrunk, self.evicted_bytes) = struct.unpack(INDEX_FORMAT, raw)
+            if magic != INDEX_MAGIC or version != INDEX_VERSION:
+                raise ValueError("bad index header")
+        except OSError:
+            # no index yet: rebuild from a data file left without one, if any
+            if file_size(self.path):
+                self._rebuild_index()
+        except ValueError as e:
+            print("Journal index error:", e)
+            self._rebuild_index()
+        if not self.count and self.capacity != self.next_capacity:
+            self.reset()
+
+    def _save_index(self):
+        with open(self.index_path, "wb") as f:
+            f.write(struct.pack(INDEX_FORMAT, INDEX_MAGIC, INDEX_VERSION,
+                                self.read_off, self.head_skip, self.write_off, self.count, self.capacity,
+                                self.dropped, self.shrunk, self.evicted_bytes))
+
+    def _rebuild_index(self):
+        """Walk the data file and keep every record up to the first bad frame.
+        A ring that already wrapped cannot be ordered again, so only its
+        first pass is recovered."""
+        self.read_off = self.write_off = self.count = self.head_skip = 0
+        self.dropped = self.shrunk = self.evicted_bytes = 0
+        self.lost = {}
+        self.capacity = self.next_capacity
+        size = file_size(self.path) or 0
+        self.write_off = min(size, self.capacity) if self.capacity else size
+        for _ in self.records():
+            self.count += 1
+        self.write_off = self._valid_end
+        print(f"Journal index rebuilt: {self.count} records, {self.write_off} bytes")
+        self._save_index()
+
+    # ------------------------------
+    # Records
+    # ------------------------------
+    def append(self, payload, kind=KIND_JSON):
+        """Append one framed record; cost does not depend on the backlog size"""
+        if isinstance(payload, str):
+            payload = payload.encode()
+        if len(payload) > MAX_PAYLOAD:
+            raise ValueError("record too large")
+        size = FRAME_SIZE + len(payload)
+        if self.capacity:
+            if size > self.capacity:
+                raise ValueError("record larger than journal capacity")
+            self._make_room(size)
+        self._write(kind, payload)
+        self._save_index()
+        return self.write_off - size
+
+    def _placement(self, size):
+        """Offset a frame of size bytes would start at, past any ring gap"""
+        if self.capacity and self._room(self.write_off) < size:
+            return self.write_off + self._room(self.write_off)
+        return self.write_off
+
+    def _fits(self, size):
+        return self._placement(size) + size - self.read_off <= self.capacity
+
+    def _write(self, kind, payload):
+        header = struct.pack(FRAME_FORMAT, FRAME_MAGIC, kind, len(payload), crc32(payload))
+        start = self._placement(FRAME_SIZE + len(payload))
+
+        # "r+b" so a torn write past write_off is overwritten, not appended after
+        mode = "r+b" if file_size(self.path) is not None else "wb"
+        with open(self.path, mode) as f:
+            if start != self.write_off and self._room(self.write_off) >= FRAME_SIZE:
+                f.seek(self._phys(self.write_off))
+                f.write(PAD_HEADER)
+            f.seek(self._phys(start))
+            f.write(header)
+            f.write(payload)
+
+        self.write_off = start + FRAME_SIZE + len(payload)
+        self.count += 1
+
+    def _make_room(self, size):
+        """Evict from the head until a frame of size bytes fits in the ring:
+        shrink the oldest records through the policy when that frees enough
+        (see _shrink_head), else drop them oldest first."""
+        if self._fits(size):
+            return
+        self.evictions += 1
+        if self.policy is not None:
+            self._shrink_head(size)
+        while not self._fits(size) and self.count:
+            offset, kind, payload = self._pop()
+            if offset is not None:
+                self._drop(payload)
+        if not self._fits(size):
+            # only gaps left: start the ring over
+            self.read_off = self.write_off = self._placement(size)
+            self.lost = {}
+
+    def _shrink_head(self, size):
+        """Hand the records from the head up to the first ring gap to the
+        policy until they free room for size bytes plus capacity //
+        SHRINK_SLACK, then put each back where it ends: shrunk (thinned or
+        aggregated, without the entries already acknowledged), unchanged
+        when the policy could do no more, or not at all when it gave back
+        None. The backlog stays oldest first, old windows degrade one step
+        at a time instead of going as a whole, and the slack keeps the head
+        from being rewritten on every append. Nothing is written when the
+        records cannot free enough."""
+        needed = self._placement(size) + size - self.read_off - self.capacity
+        target = needed + self.capacity // SHRINK_SLACK
+        plan = []       # (offset, payload bytes, bytes put back or None), oldest first
+        saved = 0
+        head, skip = self.read_off, self.head_skip
+        with open(self.path, "r+b") as f:
+            offset = head
+            # no slack while only dropping: there is nothing to rewrite
+            while saved < (target if any(kept is not None for _, _, kept in plan) else needed):
+                frame = self._read_frame(f, offset)
+                if frame is None or (plan and (frame[0] != offset or not self._phys(offset))):
+                    break   # end of the backlog or of the ring
+                start, kind, payload, offset = frame
+                if not plan:
+                    # a ring pad or unreadable span before it is freed as well
+                    saved += start - head
+                kept = self._shrunk(kind, payload, skip if start == head else 0)
+                plan.append((start, len(payload), None if kept is None else len(kept)))
+                saved += FRAME_SIZE + len(payload) - (0 if kept is None else FRAME_SIZE + len(kept))
+            if saved < needed:
+                return
+
+            end = offset
+            for start, length, kept in plan:
+                if kept is None:
+                    self.dropped += 1
+                    self.evicted_bytes += FRAME_SIZE + length
+                    self.count -= 1
+                else:
+                    end -= FRAME_SIZE + kept
+                    if kept < length:
+                        self.shrunk += 1
+                        self.evicted_bytes += length - kept
+            # acknowledged entries stay so only while the head record is
+            # put back unchanged
+            start, length, kept = plan[0]
+            self.head_skip = skip if start == head and kept == length else 0
+            self._release_lost(end)
+            self.read_off = end if self.count else self.write_off
+            # the new head is on flash before any frame moves: a power cut
+            # part way through leaves it on frames not rewritten yet, which
+            # the reader resyncs past (see _read_frame), instead of an old
+            # head pointing into moved frames
+            self._save_index()
+
+            # moved towards the end, so written from the newest back: every
+            # record is read before anything is written over it
+            end = offset
+            for start, length, kept in reversed(plan):
+                if kept is None:
+                    continue
+                end -= FRAME_SIZE + kept
+                if end == start and kept == length:
+                    continue    # neither changed nor moved
+                _, kind, payload, _ = self._read_frame(f, start)
+                payload = self._shrunk(kind, payload, skip if start == head else 0)
+                if end != start:
+                    # the old copy goes first: a power cut before the new
+                    # one is written loses the record, it is never read twice
+                    f.seek(self._phys(start))
+                    f.write(b"\0")
+                f.seek(self._phys(end))
+                f.write(struct.pack(FRAME_FORMAT, FRAME_MAGIC, kind, kept, crc32(payload)))
+                f.write(payload)
+
+    def _shrunk(self, kind, payload, skip):
+        """Payload the policy leaves of a record, without its first skip
+        entries: None to drop it, the payload itself when it cannot be made
+        smaller"""
+        kept = self.policy.shrink(kind, payload, skip)
+        if kept is not None and len(kept) >= len(payload):
+            return payload
+        return kept
+
+    def _drop(self, payload):
+        self.dropped += 1
+        self.evicted_bytes += FRAME_SIZE + len(payload)
+
+    def _pop(self):
+        """Remove and return the oldest record, or (None, None, b"") after
+        dropping an unreadable span at the head"""
+        with open(self.path, "rb") as f:
+            frame = self._read_frame(f, self.read_off)
+        if frame is None:
+            # nothing readable left
+            self._release_lost(self.write_off)
+            self.read_off = self.write_off
+            self.count = self.head_skip = 0
+            return None, None, b""
+        offset, kind, payload, end = frame
+        if any(start < offset for start in self.lost):
+            # an unreadable span before it goes on its own: the record
+            # after it may still fit
+            self._release_lost(offset)
+            self.read_off = offset
+            self.head_skip = 0
+            return None, None, b""
+        self.read_off = end
+        self.head_skip = 0
+        self.count = max(self.count - 1, 0)
+        if not self.count or self.read_off >= self.write_off:
+            self.count = 0
+            self.read_off = self.write_off
+        return offset, kind, payload
+
+    def _read_frame(self, f, offset):
+        """Read the first record at or after offset, skipping ring gaps and
+        unreadable spans (see _resync). Returns (offset, kind, payload,
+        end offset) or None."""
+        while offset + FRAME_SIZE <= self.write_off:
+            if self.capacity and self._room(offset) < FRAME_SIZE:
+                offset += self._room(offset)
+                continue
+            f.seek(self._phys(offset))
+            header = f.read(FRAME_SIZE)
+            if len(header) < FRAME_SIZE:
+                return None
+            magic, kind, length, crc = struct.unpack(FRAME_FORMAT, header)
+            if magic == FRAME_MAGIC and kind == KIND_PAD and self.capacity:
+                offset += self._room(offset)
+                continue
+            if magic == FRAME_MAGIC and self._fits_frame(offset, length):
+                payload = f.read(length)
+                if len(payload) == length and crc32(payload) == crc:
+                    return offset, kind, payload, offset + FRAME_SIZE + length
+            if self.capacity and sum(a != b for a, b in zip(header, PAD_HEADER)) <= 1:
+                # a pad with a flipped byte: up to the ring end is stale
+                # data of the previous pass, not something to resync into
+                self._lose(offset, offset + self._room(offset))
+                offset += self._room(offset)
+                continue
+            good = self._resync(f, offset)
+            self._lose(offset, self.write_off if good is None else good)
+            if good is None:
+                return None
+            offset = good
+        return None
+
+    def _fits_frame(self, offset, length):
+        """A frame of length payload bytes at offset would be inside the
+        backlog and not straddle the ring end"""
+        if offset + FRAME_SIZE + length > self.write_off:
+            return False
+        return not self.capacity or FRAME_SIZE + length <= self._room(offset)
+
+    def _resync(self, f, offset):
+        """Offset of the first good frame (magic, then a payload whose CRC
+        checks out, or a ring pad) after a bad one at offset; None if there
+        is none before write_off"""
+        magic = bytes((FRAME_MAGIC,))
+        p = offset + 1
+        while p + FRAME_SIZE <= self.write_off:
+            room = self._room(p) if self.capacity else RESYNC_BLOCK
+            if room < FRAME_SIZE:
+                p += room
+                continue
+            f.seek(self._phys(p))
+            block = f.read(min(RESYNC_BLOCK, room, self.write_off - p))
+            i = block.find(magic)
+            if i < 0:
+                if not block:
+                    return None
+                p += len(block)
+                continue
+            p += i
+            f.seek(self._phys(p))
+            header = f.read(FRAME_SIZE)
+            if len(header) == FRAME_SIZE:
+                _, kind, length, crc = struct.unpack(FRAME_FORMAT, header)
+                if kind == KIND_PAD and self.capacity:
+                    if not length and not crc:
+                        return p
+                elif length and self._fits_frame(p, length) and crc32(f.read(length)) == crc:
+                    return p
+            p += 1
+        return None
+
+    def _lose(self, start, end):
+        if start not in self.lost:
+            print("Journal: unreadable bytes", start, "to", end)
+            self.lost[start] = end
+
+    def _release_lost(self, offset):
+        """The head moved to offset: unreadable spans before it are evicted"""
+        for start in [start for start in self.lost if start < offset]:
+            end = self.lost.pop(start)
+            self.dropped += 1
+            self.evicted_bytes += end - start
+
+    def records(self, end=None):
+        """Yield (offset, kind, payload) for each live record, one at a time;
+        with end, only the records that start before it"""
+        self._valid_end = self.read_off
+        if self.read_off >= self.write_off:
+            return
+        with open(self.path, "rb") as f:
+            offset = self.read_off
+            while True:
+                frame = self._read_frame(f, offset)
+                if frame is None or (end is not None and frame[0] >= end):
+                    break
+                start, kind, payload, offset = frame
+                self._valid_end = offset
+                yield start, kind, payload
+
+    def advance(self, offset, skip=0, records=0):
+        """Move the read cursor once a consumer acknowledged everything
+        before offset (plus skip entries of the record there); records is
+        how many whole records that released"""
+        self._release_lost(offset)
+        self.read_off = offset
+        self.head_skip = skip
+        self.count = max(self.count - records, 0)
+        if offset >= self.write_off:
+            # records lost in unreadable spans were never handed out
+            self.count = 0
+        if not self.count:
+            if not self.capacity:
+                # fully drained: give the flash back
+                self.reset()
+                return
+            self.read_off = self.write_off
+            self.head_skip = 0
+        self._save_index()
+
+    def reset(self):
+        """Drop every record and truncate the data file"""
+        with open(self.path, "wb"):
+            pass
+        self.read_off = self.write_off = self.count = self.head_skip = 0
+        self.capacity = self.next_capacity
+        self.lost = {}
+        self.evictions += 1
+        self._save_index()
+
+
+# ==============================
+# SELF CHECK (host or board)
+# ==============================
+if __name__ == "__main__":
+    PATH = "journal_check.jnl"
+
+    def fresh(capacity=0):
+        for name in (PATH, PATH + ".idx"):
+            if file_size(name) is not None:
+                os.remove(name)
+        return Journal(PATH, capacity=capacity)
+
+    def flip(offset):
+        with open(PATH, "r+b") as f:
+            f.seek(offset)
+            byte = f.read(1)[0]
+            f.seek(offset)
+            f.write(bytes((byte ^ 0xFF,)))
+
+    # a flipped payload byte in the head record: the records after it are
+    # still read, and acknowledging them drains the journal
+    journal = fresh()
+    offsets = [journal.append(b"window %d" % i, KIND_READINGS) for i in range(5)]
+    flip(offsets[0] + FRAME_SIZE + 2)
+    for i in range(5, 10):
+        journal.append(b"window %d" % i, KIND_READINGS)
+    read = [payload for _, _, payload in journal.records()]
+    assert read == [b"window %d" % i for i in range(1, 10)], "resync past a bad head frame"
+    journal.advance(journal.write_off, 0, len(read))
+    assert not len(journal) and journal.dropped == 1, "unreadable span evicted with the rest"
+
+    # a bad magic mid-ring: eviction drops the unreadable span, not the
+    # good records after it
+    journal = fresh(capacity=200)
+    offsets = [journal.append(b"x" * 20 + b"%02d" % i, KIND_READINGS) for i in range(6)]
+    flip(offsets[1] % 200)
+    journal.append(b"y" * 30, KIND_READINGS)
+    read = [payload[-2:] for _, _, payload in journal.records()]
+    assert read == [b"02", b"03", b"04", b"05", b"yy"], read
+    assert journal.dropped == 2 and journal.evicted_bytes == 2 * (FRAME_SIZE + 22), journal.stats()
+    print("journal:", journal.stats())
+    os.remove(PATH)
+    os.remove(PATH + ".idx")
+    print("journal resync OK")
@@ -1,12 +1,25 @@
 import network
-import time
 import ujson
 import os
-import urequests
-from sensors_actuator import OledDisplay, SensorModule
+import utime
+import uasyncio as asyncio
+from async_sensors_actuator import SensorModule
+from journal import Journal, KIND_WINDOW, MAX_PAYLOAD
+from codec import ReadingBatch, WindowBatch
+from aggregator import WindowAggregator
+from deadband import Deadband
+from eviction import make_policy
+from registry import Registry
+from upload_policy import UploadPolicy
+from connectivity import Connectivity
+import connectivity
+import uploader
+import http_client
+import compression
 
 REGISTER_FILE = "register.json"
-DB_FILE = "db.json"
+DB_FILE = "db.jnl"
+LEGACY_DB_FILE = "db.json"  # pre-journal cache, imported once on boot
 MODE = "cloud" #or cloud
 
 SETTINGS ={
@@ -32,8 +45,28 @@ if MODE == "local":
 
 DATA_CACHING_INTERVAL_SECONDS = 60
 SEND_INTERVAL_SECONDS = 5  # can be 60 for 1 min
-DEBUB_TIME_INTERVAL = 30
-MAX_RETRIES = 5  # stop loop after 5 consecutive failures
+
+# reading cache bounds for long DATA_BANK outages
+DB_CAPACITY_BYTES = 256 * 1024  # ~5 days of 1 min readings
+EVICTION_POLICY = "thin"  # drop_oldest | thin | aggregate
+UPLOAD_PAGE_SIZE = 70  # readings per POST to /readings until the link is measured
+CACHE_BATCH_TICKS = 10  # snapshots per journal record (one cache window)
+# cached as one min/max/mean/stddev per window instead of every sample
+ROLLUP_SENSORS = ("ambient_temp", "humidity", "water_temp", "ldr")
+# report by exception for raw sensors: name → (absolute, percent) band
+DEADBANDS = {"ph": (0.1, 0), "tds": (0, 2), "water_level": (0.5, 0)}
+HEARTBEAT_SECONDS = 30 * 60  # cache a banded sensor at least this often
+WIFI_RETRY_SECONDS = 30
+WIFI_CHECK_SECONDS = 5  # wlan.isconnected() is local, so it is polled often
+PROBE_OK_SECONDS = 5 * 60  # a /hello that went through holds this long
+INTERNET_PROBE_SECONDS = 60  # a failed one this long
+LINK_LOSS_FAILURES = 2  # failed uploads in a row that count as the server gone
+# keep-alive connection to SERVER_BASE_URL, reused while idle for less than
+# this: below the server's keep-alive timeout (5 s, Node's default)
+HTTP_IDLE_SECONDS = 4
+HTTP_TIMEOUT_SECONDS = 10
+COMPRESS_UPLOADS = True  # offer deflate'd /readings bodies at registration
+DISPLAY_INTERVAL_SECONDS = 1
 
 # algorithm
 # 1. check if connected to wifi
@@ -53,79 +86,216 @@ MAX_RETRIES = 5  # stop loop after 5 consecutive failures
 # 5. OTA_UPDATE mode - 
 
 
-def mode_selector(*args, **kwargs):
-    try:
-        # load_file(REGISTER_FILE)
-        connect_wifi(WIFI_SSID, WIFI_PASSWORD)
-        check_internet()
-        if(not load_file(REGISTER_FILE) and not load_file(DB_FILE) ):
-            # REGISTRATION MODE
-            oled_display.show_text(["HYDROPONICS", "REGISTRATION MODE"])
-            print("Registration mode")
-            time.sleep(2)
-            register_iot()
-            
-        if(not load_file(REGISTER_FILE) and load_file(DB_FILE) ):
-            # RESET MODE
-            print("Reset mode")
-            time.sleep(2)
-        
-        if(load_file(REGISTER_FILE)):
-            # RELAY (normal) MODE
-            oled_display.show_text(["HYDROPONICS", "RELAY MODE"])
-            print("Relay mode")
-            time.sleep(2)
-            send_sensor_data_periodically()
+MODE_REGISTRATION = connectivity.REGISTRATION
+MODE_RESET = connectivity.RESET
+MODE_RELAY = connectivity.RELAY
+MODE_DATA_BANK = connectivity.DATA_BANK
+MODE_DATA_LOGGING = connectivity.DATA_LOGGING
 
-    except OSError as e:
-        pass
-        # switch to 
-    except NoInternetException as e:
-        if(load_file(REGISTER_FILE) ):
-            # DATA_BANK MODE
-            oled_display.show_text(["HYDROPONICS", "DATA_BANK MODE"])
-            print("DATA_BANK mode")
-            time.sleep(2)
-
-            t1 = time.time()
-            while True:
-                t2 = time.time()
-                # append_file(DB_FILE, sensor_data.read_all_sensors())
-                cache_readings()
-                if(t2-t1 > DEBUB_TIME_INTERVAL):
-                    break
-            mode_selector()
-        elif( not load_file(REGISTER_FILE)):
-            # DATA_LOGGING MODE
-            oled_display.show_text(["HYDROPONICS", "DATA_LOGGING2 MODE"])
-            print("DATA_LOGGING mode2")
-
-            t1 = time.time()
-            while True:
-                t2 = time.time()
-                sensor_data.read_all_sensors()
-                if(t2-t1 > DEBUB_TIME_INTERVAL):
-                    break
-            mode_selector()
-    except NotConnectedWifi as e:
-        # DATA_LOGGING MODE
-        # this mode latches, does not auto switch to another mode except turn off 
-        oled_display.show_text(["HYDROPONICS", "DATA_LOGGING MODE"])
-        print("DATA_LOGGING mode")
-
-        t1 = time.time()
-        while True:
-            t2 = time.time()
-            sensor_data.read_all_sensors()
-        #     if(t2-t1 > DEBUB_TIME_INTERVAL):
-        #         break
-        # mode_selector()
+# shared runtime state: written by the connectivity/upload tasks, read by the rest
+state = {
+    "mode": MODE_DATA_LOGGING,  # mirror of link.mode for the display
+    "status": "booting",
+    "retries": 0,
+    "compress": True,   # cleared when the server refuses a compressed body
+}
+
+
+def mode_changed(old, mode, event):
+    """Connectivity.on_change: every mode change goes through here"""
+    print(f"{old} → {mode} mode ({event})")
+    state["mode"] = mode
+    if mode != MODE_RELAY and uploading is not None:
+        # link gone: stop the upload, it resumes after the last acknowledged page
+        uploading.cancel()
+    if mode == MODE_RELAY and len(db):
+        # backlog from a DATA_BANK window
+        upload_due.set()
+
+
+# ==============================
+# RUNTIME TASKS
+# ==============================
+async def task_connectivity():
+    """Watch wifi, probe the server when the cached result runs out and do
+    the RESET and REGISTRATION work; the mode itself follows link events"""
+    wlan = network.WLAN(network.STA_IF)
+    wlan.active(True)
+    while True:
+        if not wlan.isconnected():
+            link.wifi_lost()
+            http.close()    # pooled connections died with the link
+            try:
+                await connect_wifi(wlan, WIFI_SSID, WIFI_PASSWORD)
+            except NotConnectedWifi:
+                pass
+        if wlan.isconnected():
+            link.wifi_joined()
+
+        if link.probe_due():
+            try:
+                await check_internet()
+                link.probed(True)
+            except NoInternetException:
+                link.probed(False)
+
+        if link.mode == MODE_RESET:
+            # cached readings point at the old register
+            print("Reset mode")
+            db.reset()
+            link.event(connectivity.CLEARED)
+
+        if link.mode == MODE_REGISTRATION:
+            try:
+                if await register_iot():
+                    link.event(connectivity.REGISTERED)
+            except NoInternetException:
+                link.probed(False)
+
+        if not link.wifi:
+            interval = WIFI_RETRY_SECONDS
+        else:
+            interval = min(WIFI_CHECK_SECONDS, link.probe_in_ms() / 1000)
+        if link.mode == MODE_REGISTRATION:
+            # server refused the registration: try again a probe interval later
+            interval = INTERNET_PROBE_SECONDS
+        try:
+            await asyncio.wait_for(probe_due.wait(), interval)
+        except asyncio.TimeoutError:
+            pass
+        probe_due.clear()
+
+
+async def task_cache():
+    """Pack one snapshot per interval, write journal records every CACHE_BATCH_TICKS"""
+    batch = None
+    window = WindowAggregator(ROLLUP_SENSORS)
+    deadband = Deadband(DEADBANDS, HEARTBEAT_SECONDS)
+    ticks = 0
+    while True:
+        await asyncio.sleep(DATA_CACHING_INTERVAL_SECONDS)
+        if state["mode"] not in (MODE_RELAY, MODE_DATA_BANK):
+            continue
+        if batch is None:
+            batch = ReadingBatch()
+        # --- sensors: one snapshot per tick, mapped to register ids in one pass ---
+        t, snapshot = sensor_data.snapshot()
+        cache_readings(batch, window, deadband, t, snapshot)
+        ticks += 1
+        print("caching data to payload, counter: ", ticks)
+
+        # --- actuators (optional) ---
+        # actuator_states = {"Pump": 1, "Fan": 0}
+        # for actuator in registry.get("actuators", []):
+        #     ...
+
+        if ticks >= CACHE_BATCH_TICKS:
+            flush_cache(batch, window, deadband, t)
+            print(f'saved payload to db after {ticks} iteration')
+            batch = None
+            ticks = 0
+            upload_due.set()
+
+
+def cache_readings(batch, window, deadband, t, snapshot):
+    """One cache tick: ROLLUP_SENSORS go into the window, the other
+    readings into the batch when they left their DEADBANDS"""
+    batch.add_snapshot(registry.names, deadband.filter(t, window.add(t, snapshot)), t)
+
+
+def flush_cache(batch, window, deadband, t):
+    """End of a cache window: raw batch with its suppression counts and
+    the rollups, as one journal record (one delay_count step per window)"""
+    batch.add_suppressed(registry.names, deadband.take_counts(), t)
+    print('deadband:', deadband.stats())
+    record = WindowBatch(batch, window.flush(registry.names))
+    if len(record):
+        append_file(DB_FILE, record)
+
+
+async def task_upload():
+    """Send the backlog after each saved batch while in RELAY mode; the
+    upload runs as its own task so a mode change can cancel it"""
+    global uploading
+    while True:
+        await upload_due.wait()
+        upload_due.clear()
+        # after a failure nothing is sent before the backoff is over
+        await asyncio.sleep_ms(uploads.wait_ms())
+        if state["mode"] != MODE_RELAY or not len(db):
+            continue
+        try:
+            state["status"] = "sending.."
+            uploading = asyncio.create_task(send_sensor_data())
+            await uploading
+            state["status"] = "sent..."
+            state["retries"] = 0
+            link.request_ok()
+        except asyncio.CancelledError:
+            print("upload cancelled")
+            state["status"] = "cancelled"
+        except compression.CompressionError:
+            # neither the link nor the server failed: again, plain, no backoff
+            upload_due.set()
+        except Exception as e:
+            delay_ms = uploads.failed()
+            state["retries"] = uploads.failures
+            state["status"] = f"retries:{state['retries']}"
+            print(f"Error sending data (attempt {state['retries']}, next in {delay_ms // 1000} s): {e!r}")
+            if isinstance(e, UploadRejected):
+                # the server answered: the link is fine
+                link.request_ok()
+            elif link.request_failed():
+                # server gone: DATA_BANK until the next probe says otherwise
+                probe_due.set()
+            # never give up: try again once the backoff is over
+            upload_due.set()
+        finally:
+            uploading = None
+        # let sampling run before the next send
+        await asyncio.sleep(SEND_INTERVAL_SECONDS)
+
+
+async def task_display():
+    while True:
+        if state["status"] == "wifi failure":
+            oled_display.show_text(["HYDROPONICS", "wifi failure", "create new hotspot", f"N={WIFI_SSID}",f"P={WIFI_PASSWORD}"])
+            await asyncio.sleep(DISPLAY_INTERVAL_SECONDS)
+            continue
+        _, d = sensor_data.snapshot()
+        oled_display.show_text([
+            f"{state['mode']}",
+            f"AT:{d['ambient_temp']} H:{d['humidity']}",
+            f"WT:{d['water_temp']} L:{d['ldr']}",
+            f"TDS:{d['tds']} pH:{d['ph']}",
+            f"WL:{d['water_level']} {state['status']}",
+        ])
+        await asyncio.sleep(DISPLAY_INTERVAL_SECONDS)
+
+
+async def main():
+    migrate_legacy_db()
+    await asyncio.gather(
+        *sensor_data.sensor_tasks(),
+        task_connectivity(),
+        task_cache(),
+        task_upload(),
+        task_display(),
+    )
 
 
 # commented because hardware not available
-oled_display = OledDisplay()
 sensor_data = SensorModule()
-readings = sensor_data.read_all_sensors()
+oled_display = sensor_data.display
+probe_due = asyncio.Event()     # wake task_connectivity early
+upload_due = asyncio.Event()    # a batch is waiting for task_upload
+uploading = None                # send_sensor_data task while one runs
+uploads = UploadPolicy(default_page=UPLOAD_PAGE_SIZE)
+registry = Registry(REGISTER_FILE)
+http = http_client.Session(HTTP_IDLE_SECONDS, HTTP_TIMEOUT_SECONDS)
+db = Journal(DB_FILE, capacity=DB_CAPACITY_BYTES, policy=make_policy(EVICTION_POLICY))
+link = Connectivity(registry.registered, lambda: len(db) > 0, PROBE_OK_SECONDS * 1000,
+                    INTERNET_PROBE_SECONDS * 1000, LINK_LOSS_FAILURES, on_change=mode_changed)
 
 
 # custom exceptions
@@ -139,103 +309,95 @@ class NotConnectedWifi(Exception):
         self.message  = "not connected to wifi"
         super().__init__(*args)
 
-def connect_wifi(ssid, password):
-    wlan = network.WLAN(network.STA_IF)
-    wlan.active(True)
+class UploadRejected(Exception):
+    def __init__(self, *args: object) -> None:
+        self.message  = "server did not accept the readings"
+        super().__init__(*args)
+
+async def connect_wifi(wlan, ssid, password):
     if not wlan.isconnected():
         print("Connecting to network...")
         wlan.connect(ssid, password)
         retries = 0
         while not wlan.isconnected() and retries < 20:
             print("Waiting for connection...")
-            oled_display.show_text(["HYDROPONICS", "wifi failure", "create new hotspot", f"N={WIFI_SSID}",f"P={WIFI_PASSWORD}"])
-            time.sleep(1)
+            state["status"] = "wifi failure"
+            await asyncio.sleep(1)
             retries += 1
 
     if wlan.isconnected():
         print("Connected to WiFi:", wlan.ifconfig())
+        state["status"] = "wifi ok"
         return True
     else:
         print("Failed to connect")
+        state["status"] = "no wifi"
         raise NotConnectedWifi
         # return False
 
-def check_internet():
+async def check_internet():
     print('checking internet access')
     try:
-        res = urequests.get(f"{SERVER_BASE_URL}/hello")
+        started = utime.ticks_ms()
+        res = await http.get(f"{SERVER_BASE_URL}/hello")
+        # without the handshake when it opened a connection
+        uploads.round_trip(utime.ticks_diff(utime.ticks_ms(), started) - res.connect_ms)
         if res.status_code ==200:
             return 1
     except Exception as e:
         print('check internet error: ',e)
         raise NoInternetException
 
-def append_file(filename, data, datatype='sensor'):
+def append_file(filename, data):
     try:
-        # File does NOT exist → create new file
-        if filename not in os.listdir():
-            with open(filename, "w") as f:
-                ujson.dump(data, f)
-            print(f"Saved {filename}")
-            return 1
-
-        # File exists → read + append + rewrite
-        else:
-            # Read old content
-            with open(filename, "r") as f:
-                try:
-                    n_data = ujson.load(f)
-                except ValueError:
-                    n_data = {"sensors": [], "actuators": []}   # file is empty or corrupted
-
-            # Append new items
-            if datatype == "sensor":
-                print(f'existing sensor file:{len(n_data["sensors"])}')
-
-                # Safely increase delay_count for each sensor
-                if len(n_data["sensors"]) > 0:
-                    print(f"Updating delay_count for {len(n_data['sensors'])} sensors")
-                    for sensor in n_data["sensors"]:
-                        current = sensor.get("delay_count", 0)
-                        sensor["delay_count"] = current + 1
-                
-                n_data["sensors"].extend(data["sensors"])
-                print(f'new sensor file:{len(n_data["sensors"])}')
-            elif datatype == "actuator":
-                print(f'existing actuator file:{len(n_data["actuators"])}')
-                n_data["sensors"].extend(data.actuators)
-
-            # Rewrite the file (truncate not needed)
-            with open(filename, "w") as f:
-                ujson.dump(n_data, f)
-
-            return 1
+        # cache window → one framed record at the end of the journal,
+        # delay_count is derived from the record position on load
+        db.append(data.payload(), KIND_WINDOW)
+        print('journal:', db.stats())
+        return 1
 
     except OSError as e:
         print("Error saving file:", e)
         raise
 
 
-def overwrite_file(filename, data):
+def legacy_records(data, limit=MAX_PAYLOAD):
+    """Split a db.json backlog into ujson batches of at most limit bytes,
+    one journal record each"""
+    records = []
+    for key in ("sensors", "actuators"):
+        chunk, size = [], 0
+        for entry in data.get(key, []):
+            n = len(ujson.dumps(entry).encode()) + 2
+            # 32 bytes for the {"key": [...]} around the entries
+            if chunk and size + n > limit - 32:
+                records.append(ujson.dumps({key: chunk}))
+                chunk, size = [], 0
+            chunk.append(entry)
+            size += n
+        if chunk:
+            records.append(ujson.dumps({key: chunk}))
+    return records
+
+
+def migrate_legacy_db():
+    """Move a pre-journal db.json backlog into the journal; the file is
+    only removed once every record of it was appended"""
+    if LEGACY_DB_FILE not in os.listdir():
+        return
     try:
-        with open(filename, "w") as f:
-            ujson.dump(data, f)
-        print(f"Saved {filename}")
-        return 1
-    except OSError as e:
-        print("Error saving file:", e)
-        raise #this will raise the current exception
-
-def load_file(filename):
-    if filename in os.listdir():
-        try:
-            with open(filename, "r") as f:
-                return ujson.load(f)
-        except OSError as e:
-            print("Error reading file:", e)
-    return None
-
-def register_iot():
+        with open(LEGACY_DB_FILE, "r") as f:
+            records = legacy_records(ujson.load(f))
+        for record in records:
+            db.append(record)
+    except (OSError, ValueError) as e:
+        # kept for the next boot
+        print("Error importing legacy db:", e)
+        return
+    print(f"Imported {LEGACY_DB_FILE} into journal: {len(records)} records")
+    os.remove(LEGACY_DB_FILE)
+
+async def register_iot():
     oled_display.show_text(["HYDROPONICS", "REGISTRATION MODE"])
     # connect_wifi(WIFI_SSID, WIFI_PASSWORD)
     url = f"{SERVER_BASE_URL}/iot/register"
@@ -255,19 +417,23 @@ def register_iot():
         "actuators": [
             {"name": "water pump"},
             {"name": "fan relay"}
-        ]
+        ],
+        # /readings payload shapes this node can send, server answers with "encoding"
+        "encodings": uploader.ENCODINGS,
+        # /readings Content-Encodings this node can send, server answers with "content_encoding"
+        "content_encodings": compression.CONTENT_ENCODINGS if COMPRESS_UPLOADS else []
     }
 
     try:
         oled_display.show_text(["HYDROPONICS", "wifi connected"])
         print("📡 Sending registration payload...")
-        res = urequests.post(url, headers=headers, data=ujson.dumps(payload))
+        res = await http.post(url, headers=headers, data=ujson.dumps(payload))
         print("HTTP Status:", res.status_code)
 
         if res.status_code == 201:
             response_data = res.json()
             res.close()
-            overwrite_file(REGISTER_FILE, response_data)
+            registry.save(response_data)
             print("🎉 Registration successful, register saved.")
             oled_display.show_text(["HYDROPONICS", "REGISTRATION SUCCESSFUL"])
             return 1
@@ -284,121 +450,68 @@ def register_iot():
         print("Network related error: ", e)
         raise NoInternetException
 
-def cache_readings():
-    register = load_file(REGISTER_FILE)
-
-    # ensure device is registered b4 caching data
-    if not register:
-        register_iot()
-    # Construct payload using IDs from register
-    payload = {"sensors": [], "actuators": []}
-
-    # try to use time sentinel
-    t1 = time.time()
-    counter = 1
-    interval = DATA_CACHING_INTERVAL_SECONDS
-    while True:
-        t2 = time.time()
-        if t2-t1 >= interval:
-            print("caching data to payload, counter: ",counter)
-            # append data to payload
-            # --- sensors ---
-            for sensor in register.get("sensors", []):
-                name = sensor["name"]
-                if name in readings:
-                    payload["sensors"].append({
-                        "sensor": sensor["_id"],
-                        "name":name,
-                        "value": str(sensor_data.read_all_sensors()[name]),
-                    })
-
-            # --- actuators (optional) ---
-            # actuator_states = {"Pump": 1, "Fan": 0}
-            # for actuator in register.get("actuators", []):
-            #     name = actuator["name"]
-            #     if name in actuator_states:
-            #         payload["actuators"].append({
-            #             "actuator": actuator["_id"],
-            #             "name":name,
-            #             "value": str(actuator_states[name]),
-            #         })
-            # update timer to ensure next list append happens after said interval
-            t1=time.time()
-            # save payload to db.json()
-            # only save to db.json() after 10 iteration of appending readings to payload
-            if (counter%10 ==0):
-                append_file(DB_FILE, payload)
-                print(f'saved payload to db after {counter} iteration')
-                # exit after saving a batch so operations like send() can work
-                t1=time.time()
-                return 1
-
-            counter +=1
-        
-
-def send_sensor_data():
+async def send_sensor_data():
     url = f"{SERVER_BASE_URL}/readings"
     headers = {"Content-Type": "application/json"}
 
-    # get readings from store db.json
-    payload = load_file(DB_FILE)
+    # stream readings from the journal, one page per POST, resuming after
+    # the last page the server acknowledged
+    backlog = uploader.Backlog(db, registry.sensors)
+    # payload shape the server picked at registration
+    encoding = registry.get("encoding", uploader.ENCODING_ROWS)
+    # and the Content-Encoding, unless it refused a compressed body since
+    content_encoding = registry.get("content_encoding") if state["compress"] else None
+    if not compression.supported(content_encoding):
+        content_encoding = None
+    else:
+        headers["Content-Encoding"] = content_encoding
+    raw_bytes = sent_bytes = 0
 
     try:
-        print("Sending sensor data:", payload)
-        res = urequests.post(url, headers=headers, data=ujson.dumps(payload))
-        print("HTTP Status:", res.status_code)
-        print("Server Response:", res.text)
-        res.close()
-        # clear up db for next data caching
-        overwrite_file(DB_FILE, {"sensors": [], "actuators": []})
+        print(f"Sending sensor data: {len(db)} batches, {db.pending_bytes()} bytes, {encoding}")
+        # page sizes follow the link as measured so far
+        for page in uploader.pages(backlog, uploads.page_size, encoding):
+            # a generator body is sent with chunked transfer encoding
+            body = page.body()
+            if content_encoding:
+                body = compression.Compressed(body, content_encoding)
+            started = utime.ticks_ms()
+            res = await http.post(url, headers=headers, data=body)
+            elapsed_ms = utime.ticks_diff(utime.ticks_ms(), started)
+            status = res.status_code
+            print(f"HTTP Status: {status} ({page.count} readings)")
+            res.close()
+            if status == 415 and content_encoding:
+                # plain bodies from the next attempt on
+                state["compress"] = False
+            if not 200 <= status < 300:
+                raise UploadRejected(status)
+            if not page.commit():
+                # the ring evicted under the upload: its cursor is stale, the
+                # next upload starts over from the new head (duplicates at most)
+                print("Journal evicted during the upload, restarting from its head")
+                upload_due.set()
+                break
+            if content_encoding:
+                raw_bytes += body.raw_bytes
+                sent_bytes += body.sent_bytes
+            # a new connection's handshake says nothing about throughput
+            uploads.sent(body.sent_bytes if content_encoding else page.bytes, page.count,
+                         elapsed_ms - res.connect_ms)
+        if sent_bytes:
+            print(f"{content_encoding}: {raw_bytes} → {sent_bytes} bytes ({raw_bytes / sent_bytes:.1f}x)")
+        print('http:', http.stats())
+        print('upload:', uploads.stats())
         return 1
 
+    except compression.CompressionError as e:
+        # the board cannot compress after all: plain bodies from now on
+        print("Compression failed:", e)
+        state["compress"] = False
+        raise
     except Exception as e:
         print("Error sending data:", e)
-
-        # # Safely increase delay_count for each sensor
-        # if "sensors" in payload:
-        #     for sensor in payload["sensors"]:
-        #         current = sensor.get("delay_count", 0)
-        #         sensor["delay_count"] = current + 1
-        #         print("Updated delay_count:", sensor["delay_count"])
-
-            # overwrite back updated payload to file: caching can't be happening while trying to send
-            # overwrite_file(DB_FILE, payload)
         raise
 
-def send_sensor_data_periodically():
-    retry_count = 0
-    while True:
-        try:
-            oled_display.show_text(["HYDROPONICS", "Data MODE", "sending.."])
-            cache_readings()
-            send_sensor_data()
-            oled_display.show_text(["HYDROPONICS", "Data MODE", "sent..."])
-            retry_count =0  # reset retry counter on success
-            print(f'retries is: {retry_count}')
-        except Exception as e:
-            oled_display.show_text(["HYDROPONICS", "wifi failure", f"retries:{retry_count}"])
-        
-            retry_count += 1
-            print(f"Error sending data (attempt {retry_count}/{MAX_RETRIES}): {e}")
-            if retry_count >= MAX_RETRIES:
-                print("⚠️ Max retries reached, stopping periodic sending.")
-                oled_display.show_text(["HYDROPONICS", "wifi failure", "max retries ", "restart d system"])
-        
-                break
-        print(f"Waiting for {SEND_INTERVAL_SECONDS} seconds before next send...\n")
-        # time.sleep(SEND_INTERVAL_SECONDS)
-
-mode_selector()
-# def boot():
-#     if "register.json" in os.listdir():
-#         print("Config found → Running in NORMAL MODE")
-#         send_sensor_data_periodically()
-#     else:
-#         print("No register found → Running in REGISTRATION MODE")
-#         register_iot()
-#         send_sensor_data_periodically()  # start sending after registration
-
-# boot()
-
+if __name__ == "__main__":
+    asyncio.run(main())
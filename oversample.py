@@ -0,0 +1,97 @@
+"""
+oversample.py
+Burst oversampling for the analog channels (MicroPython)
+
+Each channel gets a preallocated array('H') buffer that is filled with a
+back-to-back burst of read_u16() samples (no sleeps) and reduced with a
+median or a trimmed mean, which rejects the spikes a plain average lets
+through.
+"""
+
+from array import array
+import utime
+
+MEDIAN = "median"
+TRIMMED_MEAN = "trimmed_mean"
+
+
+def _sort(buf, n):
+    """In place insertion sort of the first n samples (no allocation)"""
+    for i in range(1, n):
+        v = buf[i]
+        j = i - 1
+        while j >= 0 and buf[j] > v:
+            buf[j + 1] = buf[j]
+            j -= 1
+        buf[j + 1] = v
+
+
+class Oversampler:
+    def __init__(self, adc, count=16, method=MEDIAN, trim=0.25):
+        self.adc = adc
+        self.count = count
+        self.method = method
+        self.trim = trim
+        self.buf = array("H", bytes(2 * count))
+
+    def burst(self):
+        read = self.adc.read_u16
+        buf = self.buf
+        for i in range(self.count):
+            buf[i] = read()
+        return buf
+
+    def read(self):
+        """Raw u16 value of one filtered burst"""
+        buf = self.burst()
+        n = self.count
+        _sort(buf, n)
+        if self.method == MEDIAN:
+            mid = n // 2
+            return buf[mid] if n % 2 else (buf[mid - 1] + buf[mid]) // 2
+        # trimmed mean: drop trim of the samples at each end
+        k = int(n * self.trim)
+        total = 0
+        for i in range(k, n - k):
+            total += buf[i]
+        return total // (n - 2 * k)
+
+
+# ==============================
+# BENCHMARK against the sleep based loops (on the board)
+# ==============================
+def _sleep_average(adc, samples=10, gap_ms=20):
+    total = 0
+    for _ in range(samples):
+        total += adc.read_u16()
+        utime.sleep_ms(gap_ms)
+    return total // samples
+
+
+def compare(adc, rounds=50, count=16):
+    """Time and spread of the old 10 x 20 ms average vs burst median and
+    trimmed mean on one channel; prints and returns the results"""
+    results = {}
+    readers = [
+        ("sleep_average", lambda: _sleep_average(adc)),
+        (MEDIAN, Oversampler(adc, count, MEDIAN).read),
+        (TRIMMED_MEAN, Oversampler(adc, count, TRIMMED_MEAN).read),
+    ]
+    for name, read in readers:
+        values = []
+        start = utime.ticks_us()
+        for _ in range(rounds):
+            values.append(read())
+        elapsed = utime.ticks_diff(utime.ticks_us(), start)
+        mean = sum(values) / rounds
+        std = (sum((v - mean) ** 2 for v in values) / rounds) ** 0.5
+        results[name] = {"us_per_read": elapsed // rounds, "mean": mean, "std": std}
+        print(f"{name}: {elapsed // rounds} us/read, mean {mean:.1f}, std {std:.1f}")
+    return results
+
+
+if __name__ == "__main__":
+    from machine import ADC, Pin
+    for label, pin in (("tds", 26), ("ph", 27), ("ldr", 28)):
+        print("---", label)
+        compare(ADC(Pin(pin)))
@@ -0,0 +1,49 @@
+"""
+registry.py
+In-memory copy of register.json (MicroPython)
+
+The registration response is parsed once and kept with the sensor names
+in register order, so hot paths never touch flash. It is only reloaded after
+registration rewrites the file.
+"""
+
+import ujson
+
+
+class Registry:
+    def __init__(self, path):
+        self.path = path
+        self.data = None
+        self.sensors = []
+        self.names = []         # index → sensor name
+        self.reload()
+
+    def reload(self):
+        """Parse the register file and rebuild the sensor names"""
+        data = None
+        try:
+            with open(self.path, "r") as f:
+                data = ujson.load(f)
+        except OSError:
+            pass                # not registered yet
+        except ValueError as e:
+            print("Error reading register:", e)
+        self._build(data)
+
+    def _build(self, data):
+        self.data = data
+        self.sensors = (data or {}).get("sensors", [])
+        self.names = [sensor["name"] for sensor in self.sensors]
+
+    def registered(self):
+        return bool(self.data)
+
+    def save(self, data):
+        """Write a registration response and switch to it"""
+        with open(self.path, "w") as f:
+            ujson.dump(data, f)
+        print(f"Saved {self.path}")
+        self._build(data)
+
+    def get(self, key, default=None):
+        return (self.data or {}).get(key, default)
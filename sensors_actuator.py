@@ -11,8 +11,24 @@ Supports:
 
 from machine import Pin, ADC, SoftI2C
 from ssd1306 import SSD1306_I2C
+from oversample import Oversampler, MEDIAN, TRIMMED_MEAN
+from conversions import millivolts
+from calibration import Calibration
+from ultrasonic import EchoRanger, OUT_OF_RANGE
+from adc_scheduler import Slot, SlotScheduler, TDS_SETTLE_MS, PH_SETTLE_MS
+from health import Health, validity
 import onewire, ds18x20, dht, utime, time
 
+DS18_CONVERSION_MS = 750    # 12-bit DS18B20 conversion time
+OVERSAMPLE_COUNT = 16       # samples per burst for regular reads
+ISOLATED_COUNT = 64         # samples per burst for *_isolated reads
+
+
+def _round(value, digits=0):
+    if value is None:
+        return None
+    return round(value, digits) if digits else round(value)
+
 
 # ==============================
 # OLED DISPLAY CLASS
@@ -46,24 +62,47 @@ class SensorModule:
         self.dht_pin = Pin(17, Pin.IN)       # DHT11
         self.trigger = Pin(8, Pin.OUT)       # Ultrasonic trigger
         self.echo = Pin(9, Pin.IN)           # Ultrasonic echo
+        self.ranger = EchoRanger(self.trigger, self.echo)
         self.ph_sensor = ADC(Pin(27))
         self.ldr_sensor = ADC(Pin(28))
+
+        # --- Oversampling (preallocated burst buffers) ---
+        self.tds_sampler = Oversampler(self.tds_adc, OVERSAMPLE_COUNT, MEDIAN)
+        self.ph_sampler = Oversampler(self.ph_sensor, OVERSAMPLE_COUNT, MEDIAN)
+        self.ldr_sampler = Oversampler(self.ldr_sensor, OVERSAMPLE_COUNT, MEDIAN)
+        self.tds_isolated = Oversampler(self.tds_adc, ISOLATED_COUNT, TRIMMED_MEAN)
+        self.ph_isolated = Oversampler(self.ph_sensor, ISOLATED_COUNT, TRIMMED_MEAN)
         
         
-        # --- Calibration values ---
-        self.VREF = 3.3
-        self.K_VALUE = 0.5
+        # --- Calibration (calibration.json, precomputed conversions) ---
+        self.calibration = Calibration()
         self.water_temp = 25.0  # Default, updated by DS18B20
         self.ADC_RESOLUTION = 65535
-        self.voltage_at_pH4 = 1.92   # volts (example, measure in your setup)
-        self.voltage_at_pH7 = 2.50
-        self.slope = (7.0 - 4.0) / (self.voltage_at_pH7 - self.voltage_at_pH4)
 
         # --- Sensor setup ---
         self.dht_sensor = dht.DHT11(self.dht_pin)
         self.ds_sensor = ds18x20.DS18X20(onewire.OneWire(self.ds_pin))
         self.roms = self.ds_sensor.scan()
         print("✅ Found DS18B20 devices:", self.roms)
+        self.ds_started = None       # ticks_ms of the conversion in flight
+        self.water_temp_at = None    # ticks_ms the last value was collected
+
+        # --- Health: a dead probe is skipped with backoff instead of
+        # costing its bus timeout every cycle ---
+        self.health = Health(("dht", "ds18b20", "ultrasonic", "tds", "ph"))
+        guard = self.health.guard
+
+        # --- Analog slots: pH and TDS never read back to back ---
+        self.analog = SlotScheduler([
+            Slot("tds", guard("tds", self.read_tds, (None, None)), TDS_SETTLE_MS),
+            Slot("ph", guard("ph", self.read_ph, (None, None)), PH_SETTLE_MS),
+        ])
+        # digital sensors fill the pH/TDS settle gaps instead of a sleep
+        self.fillers = (
+            ("dht", guard("dht", self.read_dht, (None, None))),
+            ("water_level", guard("ultrasonic", self.read_ultrasonic)),
+            ("ldr", self.read_ldr),
+        )
 
         # --- OLED ---
         self.display = OledDisplay()
@@ -73,17 +112,19 @@ class SensorModule:
     # ------------------------------
 
     def read_ldr(self):
-        self.light = self.ldr_sensor.read_u16()
+        self.light = self.ldr_sampler.read()
         self.light = round(self.light/65535*100,1)
         return self.light
     
     def read_ph(self):
-        # Read raw ADC value
-        raw = self.ph_sensor.read_u16()
-        voltage = (raw / self.ADC_RESOLUTION) * self.VREF
-        
-        # Convert voltage to pH using calibration
-        ph_value = 7.0 + (voltage - self.voltage_at_pH7) * self.slope
+        # Read filtered raw ADC value
+        raw = self.ph_sampler.read()
+        return self.ph_from_raw(raw)
+
+    def ph_from_raw(self, raw):
+        # Convert to pH using calibration, integer math until the end
+        ph_value = self.calibration.ph_curve.ph1000(raw) / 1000
+        voltage = millivolts(raw, self.calibration.vref) / 1000
         return ph_value, voltage
 
     def read_dht(self):
@@ -97,116 +138,121 @@ class SensorModule:
             return None, None
 
     def read_ds18b20(self):
+        """Pipelined read: collect the conversion started on the previous
+        call once it is done and start the next one straight away, so the
+        750 ms conversion overlaps the rest of the sample cycle.
+        Returns the most recent completed temperature (see water_temp_age)."""
         try:
-            self.ds_sensor.convert_temp()
-            time.sleep_ms(750)
-            for rom in self.roms:
-                temp = self.ds_sensor.read_temp(rom)
-                if temp is not None:
-                    self.water_temp = temp
-                    return temp
+            if self.ds_started is None and self.water_temp_at is None:
+                # first read: nothing to hand back yet, wait for one conversion
+                self.ds_sensor.convert_temp()
+                self.ds_started = utime.ticks_ms()
+                time.sleep_ms(DS18_CONVERSION_MS)
+
+            now = utime.ticks_ms()
+            if self.ds_started is not None and utime.ticks_diff(now, self.ds_started) >= DS18_CONVERSION_MS:
+                self.ds_started = None
+                for rom in self.roms:
+                    temp = self.ds_sensor.read_temp(rom)
+                    if temp is not None:
+                        self.water_temp = temp
+                        self.water_temp_at = now
+                        break
+
+            if self.ds_started is None:
+                self.ds_sensor.convert_temp()
+                self.ds_started = now
         except Exception as e:
             print("DS18B20 error:", e)
-        return None
+            self.ds_started = None
+            return None
+        if self.water_temp_at is None:
+            return None
+        return self.water_temp
+
+    def water_temp_age(self):
+        """Milliseconds since the water temperature was last collected"""
+        if self.water_temp_at is None:
+            return None
+        return utime.ticks_diff(utime.ticks_ms(), self.water_temp_at)
 
     def read_tds(self):
         try:
-            raw = self.tds_adc.read_u16()
-            voltage = (raw / 65535) * self.VREF
-
-            comp_coeff = 1.0 + 0.02 * (self.water_temp - 25.0)
-            comp_voltage = voltage / comp_coeff
-
-            tds = (
-                133.42 * comp_voltage**3
-                - 255.86 * comp_voltage**2
-                + 857.39 * comp_voltage
-            ) * self.K_VALUE
-
-            return round(tds, 2), round(voltage, 2)
+            raw = self.tds_sampler.read()
+            return self.tds_from_raw(raw)
         except Exception as e:
             print("TDS read error:", e)
             return None, None
 
+    def tds_from_raw(self, raw):
+        # temperature compensated table lookup, K applied (see conversions.py)
+        tds = self.calibration.tds_table.ppm10(raw, self.water_temp) / 10
+        voltage = millivolts(raw, self.calibration.vref) / 1000
+        return round(tds, 2), round(voltage, 2)
+
     def read_ultrasonic(self):
+        """Median of IRQ timed pings, None without an echo or past 4 m"""
         try:
-            self.trigger.low()
-            utime.sleep_us(2)
-            self.trigger.high()
-            utime.sleep_us(5)
-            self.trigger.low()
-
-            while self.echo.value() == 0:
-                signaloff = utime.ticks_us()
-            while self.echo.value() == 1:
-                signalon = utime.ticks_us()
-
-            timepassed = signalon - signaloff
-            distance = (timepassed * 0.0343) / 2
+            distance = self.calibration.distance(self.ranger.measure())
+            if distance is None or distance == OUT_OF_RANGE:
+                return None
             return round(distance, 2)
         except Exception as e:
             print("Ultrasonic read error:", e)
             return None
 
     def read_ph_isolated(self):
-        """Read pH with multiple samples (no TDS reads happening)."""
-        samples = 10
-        total = 0
-        for _ in range(samples):
-            raw = self.ph_sensor.read_u16()
-            total += raw
-            utime.sleep_ms(20)
-
-        avg_raw = total // samples
-        voltage = (avg_raw / self.ADC_RESOLUTION) * self.VREF
-        ph_value = 7.0 + (voltage - self.voltage_at_pH7) * self.slope
-        return ph_value, voltage
+        """Read pH with a long filtered burst (no TDS reads happening)."""
+        avg_raw = self.ph_isolated.read()
+        return self.ph_from_raw(avg_raw)
 
 
     def read_tds_isolated(self):
-        """Read TDS with multiple samples after pH is finished."""
-        samples = 10
-        total = 0
-        for _ in range(samples):
-            total += self.tds_adc.read_u16()
-            utime.sleep_ms(20)
+        """Read TDS with a long filtered burst after pH is finished."""
+        avg_raw = self.tds_isolated.read()
+        return self.tds_from_raw(avg_raw)
 
-        avg_raw = total // samples
-        voltage = (avg_raw / 65535) * self.VREF
-
-        comp_coeff = 1.0 + 0.02 * (self.water_temp - 25.0)
-        comp_voltage = voltage / comp_coeff
+    # ------------------------------
+    # Quick calibration (saved to calibration.json)
+    # ------------------------------
+    def calibrate_ph(self, buffer_ph):
+        """Probe in a pH buffer solution (4, 7, 10...)"""
+        return self.calibration.calibrate_ph(buffer_ph, self.ph_isolated.read())
 
-        tds = (
-            133.42 * comp_voltage**3
-            - 255.86 * comp_voltage**2
-            + 857.39 * comp_voltage
-        ) * self.K_VALUE
+    def calibrate_tds(self, standard_ppm):
+        """Probe in a TDS standard solution, water temp from the DS18B20"""
+        return self.calibration.calibrate_tds(self.tds_isolated.read(), standard_ppm, self.read_ds18b20())
 
-        return round(tds, 2), round(voltage, 2)
+    def calibrate_water_level(self, actual_cm):
+        """Known distance between the sensor and the water surface"""
+        return self.calibration.calibrate_ultrasonic(self.ranger.measure(), actual_cm)
     # ------------------------------
     # Unified data collector
     # ------------------------------
     def read_all_sensors(self):
-        tds, voltage = self.read_tds()
-        ambient_temp, humidity = self.read_dht()
-        water_temp = self.read_ds18b20()
-        distance = self.read_ultrasonic()
-        ldr = self.read_ldr()
-        utime.sleep_ms(1000)
-        ph, v = self.read_ph()
-
+        # water temp first so TDS compensation uses the value collected now
+        water_temp = self.health["ds18b20"].read(self.read_ds18b20)
+        results = self.analog.run(self.fillers)
+        tds, voltage = results["tds"]
+        ph, v = results["ph"]
+        ambient_temp, humidity = results["dht"]
+        distance = results["water_level"]
+        ldr = results["ldr"]
+
+        # failed sensors stay None, marked invalid, instead of crashing round()
         readings = {
-            "ambient_temp": round(ambient_temp,1),
+            "ambient_temp": _round(ambient_temp,1),
             "humidity": humidity,
-            "water_temp": round(water_temp,1),
-            "tds": round(tds,1),
+            "water_temp": _round(water_temp,1),
+            "water_temp_age": self.water_temp_age(),
+            "tds": _round(tds,1),
             "tds_voltage": voltage,
             "ldr": ldr,
-            "water_level": round(distance,1),
-            "ph":round(ph,1),
-            "ph_v":round(v)
+            "water_level": _round(distance,1),
+            "ph":_round(ph,1),
+            "ph_v":_round(v)
         }
+        readings["valid"] = validity(readings)
 
         self.display_data(readings)
         return readings
@@ -0,0 +1,35 @@
+"""
+sim
+Host stand-ins for the MicroPython modules the firmware imports (CPython)
+
+The firmware's hardware boundary is the set of MicroPython modules it
+imports (machine, network, onewire, ds18x20, dht, ssd1306, urequests,
+usocket, ussl, deflate, utime/time, ujson, uasyncio). install() puts
+drop-in versions of them, driven by one seeded world.World, ahead of
+everything else, so main.py and the sensor modules run unchanged on a
+workstation:
+
+    import sim
+    sim.install()
+    import world
+    world.reset(seed=1, faults={"dht": world.Fault(rate=0.1)})
+
+See sim/run.py for a whole-firmware run.
+"""
+
+import os, sys
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(SIM_DIR)
+
+
+def install():
+    """Make the stand-ins importable under their MicroPython names"""
+    for path in (ROOT_DIR, SIM_DIR):
+        if path in sys.path:
+            sys.path.remove(path)
+        sys.path.insert(0, path)
+    import utime
+    # MicroPython's time is utime; CPython's time is a builtin module, so
+    # it has to be replaced in sys.modules rather than shadowed on the path
+    sys.modules["time"] = utime
@@ -0,0 +1,44 @@
+"""
+deflate.py
+MicroPython deflate module on CPython's zlib (CPython)
+
+Only what the firmware uses: DeflateIO compressing into a stream. Like
+MicroPython's compressor, output uses fixed Huffman codes only (no
+dynamic trees), so ratios match the board rather than desktop zlib.
+"""
+
+import zlib
+
+AUTO = 0
+RAW = 1
+ZLIB = 2
+GZIP = 3
+
+
+class DeflateIO:
+    def __init__(self, stream, format=AUTO, wbits=0, close=False):
+        wbits = max(wbits or 8, 9)      # zlib's smallest compression window
+        if format == RAW:
+            wbits = -wbits
+        elif format == GZIP:
+            wbits += 16
+        self.stream = stream
+        self.close_stream = close
+        self.z = zlib.compressobj(9, zlib.DEFLATED, wbits, 1, zlib.Z_FIXED)
+
+    def write(self, data):
+        out = self.z.compress(bytes(data))
+        if out:
+            self.stream.write(out)
+        return len(data)
+
+    def read(self, n=-1):
+        raise OSError("decompression is not simulated")
+
+    def close(self):
+        if self.z is None:
+            return
+        self.stream.write(self.z.flush())
+        self.z = None
+        if self.close_stream:
+            self.stream.close()
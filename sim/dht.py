@@ -0,0 +1,41 @@
+"""
+dht.py
+Simulated DHT11 / DHT22 (CPython)
+"""
+
+import world
+
+ETIMEDOUT = 110
+
+
+class DHTBase:
+    decimals = 0
+
+    def __init__(self, pin):
+        self.pin = pin
+        self.t = None
+        self.h = None
+
+    def measure(self):
+        W = world.WORLD
+        W.latency("dht")
+        if W.fault("dht"):
+            raise OSError(ETIMEDOUT)
+        self.t = round(W.value("ambient_temp"), self.decimals)
+        self.h = round(min(max(W.value("humidity"), 0.0), 100.0), self.decimals)
+        if not self.decimals:
+            self.t, self.h = int(self.t), int(self.h)
+
+    def temperature(self):
+        return self.t
+
+    def humidity(self):
+        return self.h
+
+
+class DHT11(DHTBase):
+    pass
+
+
+class DHT22(DHTBase):
+    decimals = 1
@@ -0,0 +1,35 @@
+"""
+ds18x20.py
+Simulated DS18B20 (CPython)
+
+Reading the scratchpad before the 750 ms conversion has finished returns
+the 85 °C power-on value, as the real part does.
+"""
+
+import world
+
+CONVERSION_US = 750000
+POWER_ON_TEMP = 85.0
+ROM = bytearray(b"\x28\xff\x64\x1e\x0f\x4a\x21\x9c")
+
+
+class DS18X20:
+    def __init__(self, onewire):
+        self.ow = onewire
+        self.converting_since = None
+
+    def scan(self):
+        return [ROM] if self.ow.reset() else []
+
+    def convert_temp(self):
+        self.ow.reset(True)
+        self.converting_since = world.WORLD.clock_us
+
+    def read_temp(self, rom):
+        W = world.WORLD
+        self.ow.reset(True)
+        W.latency("ds18b20_read")
+        if self.converting_since is None or W.clock_us - self.converting_since < CONVERSION_US:
+            return POWER_ON_TEMP
+        # 12 bit resolution: 1/16 °C
+        return round(W.value("water_temp") * 16) / 16
@@ -0,0 +1,188 @@
+"""
+machine.py
+Simulated Pin, ADC, I2C and idle() for host runs (CPython)
+
+ADC pins return the raw u16 the real probe would give for the world
+signal (through the same calibration the firmware uses, plus ADC noise).
+Pulling the ultrasonic trigger low schedules the echo edges on the world
+clock and they reach the echo pin's IRQ handler with the right ticks.
+"""
+
+import world
+from conversions import tds_formula, ADC_MAX
+from calibration import DEFAULTS
+
+SOUND_CM_PER_US = 0.0343
+MAX_ECHO_CM = 400
+
+_pins = {}          # pin id → last Pin created for it
+
+
+def idle():
+    """Wait for an interrupt; edges due meanwhile fire at their own ticks"""
+    world.WORLD.advance_us(50)
+
+
+def freq():
+    return 125000000
+
+
+def unique_id():
+    return b"\xe6\x61\x41\x04\x03\x2e\x5b\x2a"
+
+
+def reset():
+    raise SystemExit("machine.reset()")
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    OPEN_DRAIN = 2
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = 4
+    IRQ_RISING = 8
+
+    def __init__(self, id, mode=-1, pull=-1, value=None):
+        self.id = id
+        self.mode = mode
+        self._value = 0 if value is None else int(bool(value))
+        self.handler = None
+        self.trigger = 0
+        _pins[id] = self
+
+    def init(self, mode=-1, pull=-1, value=None):
+        self.mode = mode
+        if value is not None:
+            self.value(value)
+
+    def value(self, v=None):
+        if v is None:
+            return self._value
+        old = self._value
+        self._value = int(bool(v))
+        if world.WORLD.pins.get(self.id) == "trigger" and old and not self._value:
+            _echo_after_trigger()
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+    high = on
+    low = off
+
+    def __call__(self, v=None):
+        return self.value(v)
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING, hard=False):
+        self.handler = handler
+        self.trigger = trigger
+
+    def drive(self, v):
+        """Level change from the outside world: fires the IRQ handler"""
+        v = int(bool(v))
+        if v == self._value:
+            return
+        self._value = v
+        edge = Pin.IRQ_RISING if v else Pin.IRQ_FALLING
+        if self.handler is not None and self.trigger & edge:
+            self.handler(self)
+
+
+def _pin_for(role):
+    for pin_id, name in world.WORLD.pins.items():
+        if name == role:
+            return _pins.get(pin_id)
+    return None
+
+
+def _echo_after_trigger():
+    W = world.WORLD
+    echo = _pin_for("echo")
+    if echo is None or W.fault("ultrasonic"):
+        return                      # no echo line activity at all
+    distance = W.value("water_level")
+    if 0 < distance <= MAX_ECHO_CM:
+        width = 2 * distance / SOUND_CM_PER_US
+    else:
+        width = W.latency_us["echo_timeout"]
+    rise = W.latency_us["echo_rise"]
+    W.schedule(rise, lambda: echo.drive(1))
+    W.schedule(rise + width, lambda: echo.drive(0))
+
+
+# ------------------------------
+# ADC: physical value → raw u16
+# ------------------------------
+def _tds_voltage(ppm, water_temp, k_value):
+    lo, hi = 0.0, world.WORLD.vref
+    for _ in range(40):
+        mid = (lo + hi) / 2
+        if tds_formula(mid, 25.0, k_value) < ppm:
+            lo = mid
+        else:
+            hi = mid
+    return lo * (1.0 + 0.02 * (water_temp - 25.0))
+
+
+def _ph_voltage(ph):
+    (ph_lo, v_lo), (ph_hi, v_hi) = DEFAULTS["ph"]["points"][:2]
+    return v_lo + (ph - ph_lo) * (v_hi - v_lo) / (ph_hi - ph_lo)
+
+
+class ADC:
+    CORE_TEMP = 4
+
+    def __init__(self, pin, *args, **kwargs):
+        pin_id = pin.id if isinstance(pin, Pin) else pin
+        if isinstance(pin_id, int) and pin_id < 4:
+            pin_id += 26            # ADC channel number
+        self.id = pin_id
+        self.sampled = (None, 0.0)  # (clock ms, voltage) of the signal
+
+    def voltage(self):
+        """Probe voltage; the signal is re-sampled once per millisecond so a
+        burst of reads sees one value plus ADC noise"""
+        W = world.WORLD
+        now_ms = W.clock_us // 1000
+        if self.sampled[0] != now_ms:
+            self.sampled = (now_ms, self.probe_voltage())
+        return self.sampled[1]
+
+    def probe_voltage(self):
+        W = world.WORLD
+        channel = W.pins.get(self.id)
+        if channel == "tds":
+            return _tds_voltage(max(W.value("tds"), 0.0), W.signals["water_temp"](W.seconds()),
+                                DEFAULTS["tds"]["k_value"])
+        if channel == "ph":
+            return _ph_voltage(W.value("ph"))
+        if channel == "ldr":
+            return W.value("ldr") / 100 * W.vref
+        return 0.0
+
+    def read_u16(self):
+        W = world.WORLD
+        W.latency("adc", jitter=0)
+        if W.fault(W.pins.get(self.id, "adc")):
+            return W.rng.choice((0, ADC_MAX))     # floating / shorted input
+        raw = self.voltage() / W.vref * ADC_MAX + W.rng.gauss(0, W.adc_noise_lsb)
+        return min(max(int(raw), 0), ADC_MAX)
+
+
+class SoftI2C:
+    def __init__(self, scl=None, sda=None, freq=400000, timeout=50000):
+        self.scl = scl
+        self.sda = sda
+
+    def scan(self):
+        return [0x3C]
+
+    def writeto(self, addr, buf, stop=True):
+        return len(buf)
+
+
+I2C = SoftI2C
@@ -0,0 +1,70 @@
+"""
+network.py
+Simulated WLAN station (CPython)
+
+connect() succeeds after the modelled association time when the world
+accepts the ssid; a "wifi" fault window drops the link while it lasts.
+"""
+
+import world
+
+STA_IF = 0
+AP_IF = 1
+
+STAT_IDLE = 0
+STAT_CONNECTING = 1
+STAT_WRONG_PASSWORD = -3
+STAT_NO_AP_FOUND = -2
+STAT_CONNECT_FAIL = -1
+STAT_GOT_IP = 3
+
+
+class WLAN:
+    def __init__(self, interface=STA_IF):
+        self.interface = interface
+        self._active = False
+        self.ssid = None
+        self.connect_at = None      # clock_us association completes
+
+    def active(self, is_active=None):
+        if is_active is None:
+            return self._active
+        self._active = bool(is_active)
+        if not self._active:
+            self.disconnect()
+
+    def connect(self, ssid=None, key=None):
+        W = world.WORLD
+        self.ssid = ssid
+        if W.wifi_ssid is None or ssid == W.wifi_ssid:
+            self.connect_at = W.clock_us + W.latency_us["wifi_connect"]
+        else:
+            self.connect_at = None
+
+    def disconnect(self):
+        self.connect_at = None
+        world.WORLD.wifi_connected = False
+
+    def isconnected(self):
+        W = world.WORLD
+        up = (self._active and self.connect_at is not None
+              and W.clock_us >= self.connect_at and not W.fault("wifi"))
+        if not up and W.wifi_connected:
+            self.connect_at = None  # link lost: needs a new connect()
+        W.wifi_connected = up
+        return up
+
+    def status(self, param=None):
+        if self.isconnected():
+            return STAT_GOT_IP
+        return STAT_CONNECTING if self.connect_at is not None else STAT_IDLE
+
+    def ifconfig(self, config=None):
+        if self.isconnected():
+            return ("192.168.43.77", "255.255.255.0", "192.168.43.1", "192.168.43.1")
+        return ("0.0.0.0", "0.0.0.0", "0.0.0.0", "0.0.0.0")
+
+    def config(self, *args, **kwargs):
+        if args == ("mac",):
+            return b"\x28\xcd\xc1\x00\x00\x01"
+        return None
@@ -0,0 +1,24 @@
+"""
+onewire.py
+Simulated 1-Wire bus (CPython); the DS18B20 model lives in ds18x20.py
+"""
+
+import world
+
+
+class OneWireError(Exception):
+    pass
+
+
+class OneWire:
+    def __init__(self, pin):
+        self.pin = pin
+
+    def reset(self, required=False):
+        """Presence pulse; a faulted bus (ds18b20 fault) has none"""
+        W = world.WORLD
+        W.latency("onewire")
+        present = not W.fault("ds18b20")
+        if required and not present:
+            raise OneWireError
+        return present
@@ -0,0 +1,97 @@
+"""
+server.py
+In-process stand-in for the cloud API (CPython)
+
+Answers /hello, /iot/register and /readings the way the firmware expects
+and keeps every accepted reading (columnar pages are expanded with
+codec.decode_columnar) so runs can be checked afterwards.
+
+Request bodies with a Content-Encoding the server accepts are inflated
+before parsing (anything that does not inflate back to JSON is a 400, an
+encoding it does not accept a 415), and both sizes are recorded.
+"""
+
+import json
+import zlib
+import codec
+
+# Content-Encoding → zlib wbits that inflate it
+INFLATE_WBITS = {"gzip": 16 + 15, "deflate": 15}
+
+
+class SimServer:
+    def __init__(self, encoding="rows", keep=True, idle_timeout=5.0,
+                 content_encodings=("gzip", "deflate")):
+        self.encoding = encoding    # answered to registration when offered
+        self.content_encodings = content_encodings  # accepted request compression
+        self.keep = keep            # False: /readings bodies dropped unread (heap benchmarks)
+        self.idle_timeout = idle_timeout    # keep-alive seconds (Node's default)
+        self.connections = 0        # accepted TCP connections (sim usocket)
+        self.node = None
+        self.readings = []
+        self.received = 0
+        self.requests = []          # (method, path, status, body bytes, inflated bytes)
+        self.reject = set()         # paths answered with 400
+
+    def handle(self, method, url, headers, body):
+        path = "/" + url.split("://", 1)[-1].split("/", 1)[-1]
+        headers = {name.lower(): value for name, value in headers.items()}
+        content_encoding = headers.get("content-encoding", "identity").lower()
+        inflated = body
+        if content_encoding != "identity":
+            if content_encoding not in self.content_encodings:
+                status, content = 415, '{"error": "unsupported content encoding"}'
+                self.requests.append((method, path, status, len(body), len(body)))
+                return status, content
+            try:
+                inflated = zlib.decompress(body, INFLATE_WBITS[content_encoding])
+            except zlib.error:
+                inflated = None
+        if inflated is None:
+            status, content = 400, '{"error": "body does not inflate"}'
+        else:
+            status, content = self.route(method, path, inflated)
+        self.requests.append((method, path, status, len(body), len(inflated or b"")))
+        return status, content
+
+    def skipped(self, method, url, headers, size):
+        """A /readings POST whose body was dropped unread (keep False)"""
+        path = "/" + url.split("://", 1)[-1].split("/", 1)[-1]
+        self.requests.append((method, path, 201, size, size))
+        return 201, '{"stored": 0}'
+
+    def route(self, method, path, body):
+        if path in self.reject:
+            return 400, '{"error": "rejected"}'
+        if path == "/hello":
+            return 200, "hello"
+        if path == "/iot/register" and method == "POST":
+            return self.register(json.loads(body))
+        if path == "/readings" and method == "POST":
+            return self.store(json.loads(body))
+        return 404, '{"error": "not found"}'
+
+    def register(self, payload):
+        node = {"_id": "node0001", "name": payload.get("name"), "status": payload.get("status")}
+        node["sensors"] = [{"_id": "sensor%04d" % i, "name": s["name"], "iot": node["_id"]}
+                           for i, s in enumerate(payload.get("sensors", []))]
+        node["actuators"] = [{"_id": "actuator%04d" % i, "name": a["name"], "iot": node["_id"]}
+                             for i, a in enumerate(payload.get("actuators", []))]
+        if self.encoding in payload.get("encodings", []):
+            node["encoding"] = self.encoding
+        for content_encoding in payload.get("content_encodings", []):
+            if content_encoding in self.content_encodings:
+                node["content_encoding"] = content_encoding
+                break
+        self.node = node
+        return 201, json.dumps(node)
+
+    def store(self, body):
+        if "columns" in body:
+            rows = codec.decode_columnar(body)
+        else:
+            rows = body.get("sensors", []) + body.get("suppressed", [])
+        self.received += len(rows)
+        if self.keep:
+            self.readings.extend(rows)
+        return 201, json.dumps({"stored": len(rows)})
@@ -0,0 +1,35 @@
+"""
+ssd1306.py
+Simulated SSD1306 OLED: keeps the text of the last frame (CPython)
+"""
+
+import world
+
+
+class SSD1306_I2C:
+    def __init__(self, width, height, i2c, addr=0x3C, external_vcc=False):
+        self.width = width
+        self.height = height
+        self.i2c = i2c
+        self.lines = []
+
+    def fill(self, color):
+        self.lines = []
+
+    def text(self, string, x, y, color=1):
+        self.lines.append(string)
+
+    def show(self):
+        W = world.WORLD
+        W.latency("i2c_frame")
+        W.display = list(self.lines)
+        W.frames += 1
+
+    def poweroff(self):
+        pass
+
+    def poweron(self):
+        pass
+
+    def contrast(self, contrast):
+        pass
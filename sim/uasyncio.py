@@ -0,0 +1,324 @@
+"""
+uasyncio.py
+uasyncio subset on the simulated clock (CPython)
+
+A small single-threaded scheduler: tasks wait on timers, events or other
+tasks and the clock jumps straight to the next timer when every task is
+waiting, so hours of firmware time run in seconds and always in the same
+order. Covers what the firmware uses: run, create_task, gather, sleep,
+sleep_ms, wait_for, wait_for_ms, Event, CancelledError, TimeoutError and
+open_connection (streams over sim usocket; the modelled network time is
+slept, so other tasks run while a request is on the air).
+
+run() stops early once the clock passes world.WORLD.stop_at_us (when set).
+"""
+
+import heapq
+import world
+
+TimeoutError = TimeoutError
+
+
+class CancelledError(BaseException):
+    pass
+
+
+class _Wait:
+    """Awaitable handing a request to the scheduler"""
+
+    def __init__(self, op, arg):
+        self.op = op
+        self.arg = arg
+
+    def __await__(self):
+        return (yield (self.op, self.arg))
+
+
+class Task:
+    def __init__(self, coro):
+        self.coro = coro
+        self.done = False
+        self.result = None
+        self.exception = None
+        self.waiters = []           # (task, token) woken when this one ends
+        self.token = 0              # bumped on every wake, stale wakes are ignored
+
+    def cancel(self):
+        if self.done:
+            return False
+        _loop().throw(self, CancelledError())
+        return True
+
+    def __await__(self):
+        if not self.done:
+            yield ("join", self)
+        if self.exception is not None:
+            raise self.exception
+        return self.result
+
+
+class Event:
+    def __init__(self):
+        self.state = False
+        self.waiters = []
+
+    def is_set(self):
+        return self.state
+
+    def set(self):
+        self.state = True
+        for task, token in self.waiters:
+            _loop().wake(task, token, True)
+        self.waiters = []
+
+    def clear(self):
+        self.state = False
+
+    async def wait(self):
+        if not self.state:
+            await _Wait("event", self)
+        return True
+
+
+class Loop:
+    def __init__(self):
+        self.ready = []             # (task, value, exception)
+        self.timers = []            # (at_us, seq, task, token, value)
+        self.seq = 0
+        self.current = None
+        self.tasks = []
+
+    def spawn(self, coro):
+        task = Task(coro)
+        self.tasks.append(task)
+        self.ready.append((task, None, None))
+        return task
+
+    def close(self):
+        """Drop the tasks still waiting when a run is stopped"""
+        for task in self.tasks:
+            if not task.done:
+                try:
+                    task.coro.close()
+                except RuntimeError:
+                    pass
+        self.tasks = []
+
+    def wake(self, task, token, value=None):
+        if task.token == token and not task.done:
+            task.token += 1
+            self.ready.append((task, value, None))
+
+    def throw(self, task, exception):
+        task.token += 1
+        self.ready.append((task, None, exception))
+
+    def timer(self, delay_us, task, value=None):
+        self.seq += 1
+        heapq.heappush(self.timers, (world.WORLD.clock_us + max(int(delay_us), 0), self.seq,
+                                     task, task.token, value))
+
+    def finish(self, task, result=None, exception=None):
+        task.done = True
+        task.result = result
+        task.exception = exception
+        for waiter, token in task.waiters:
+            self.wake(waiter, token, True)
+        task.waiters = []
+
+    def step(self, task, value, exception):
+        if task.done:
+            return
+        self.current = task
+        try:
+            if exception is not None:
+                request = task.coro.throw(exception)
+            else:
+                request = task.coro.send(value)
+        except StopIteration as e:
+            self.finish(task, e.value)
+            return
+        except BaseException as e:
+            self.finish(task, exception=e)
+            return
+        finally:
+            self.current = None
+        op, arg = request
+        if op == "sleep":
+            self.timer(arg, task)
+        elif op == "event":
+            arg.waiters.append((task, task.token))
+        elif op == "join":
+            arg.waiters.append((task, task.token))
+        elif op == "join_until":
+            other, delay_us = arg
+            other.waiters.append((task, task.token))
+            self.timer(delay_us, task, False)
+        else:
+            raise RuntimeError(f"unknown request {op}")
+
+    def run_until(self, main):
+        W = world.WORLD
+        while not main.done:
+            if self.ready:
+                task, value, exception = self.ready.pop(0)
+                self.step(task, value, exception)
+                continue
+            if not self.timers:
+                raise RuntimeError("all tasks are waiting and no timer is pending")
+            at, _, task, token, value = heapq.heappop(self.timers)
+            if W.stop_at_us is not None and at > W.stop_at_us:
+                W.advance_to(W.stop_at_us)
+                return False
+            W.advance_to(at)
+            self.wake(task, token, value)
+        return True
+
+
+_current_loop = None
+
+
+def _loop():
+    if _current_loop is None:
+        raise RuntimeError("no running event loop")
+    return _current_loop
+
+
+def get_event_loop():
+    return _loop()
+
+
+def create_task(coro):
+    return _loop().spawn(coro)
+
+
+async def sleep_ms(ms):
+    await _Wait("sleep", int(ms * 1000))
+
+
+async def sleep(seconds):
+    await _Wait("sleep", int(seconds * 1000000))
+
+
+async def gather(*aws, return_exceptions=False):
+    tasks = [aw if isinstance(aw, Task) else create_task(aw) for aw in aws]
+    results = []
+    for task in tasks:
+        try:
+            results.append(await task)
+        except Exception as e:
+            if not return_exceptions:
+                raise
+            results.append(e)
+    return results
+
+
+async def wait_for(aw, timeout):
+    task = aw if isinstance(aw, Task) else create_task(aw)
+    if timeout is None:
+        return await task
+    if not task.done:
+        try:
+            await _Wait("join_until", (task, int(timeout * 1000000)))
+        except CancelledError:
+            task.cancel()
+            raise
+    if not task.done:
+        task.cancel()
+        raise TimeoutError
+    return await task
+
+
+async def wait_for_ms(aw, timeout):
+    return await wait_for(aw, None if timeout is None else timeout / 1000)
+
+
+class Stream:
+    """Reader and writer over a deferred sim usocket: every call sleeps
+    off the time the socket says it took, then returns or raises"""
+
+    def __init__(self, s):
+        self.s = s
+        self.out_buf = b""
+
+    async def io(self, fn, *args):
+        try:
+            result, error = fn(*args), None
+        except OSError as e:
+            result, error = None, e
+        owed, self.s.owed_us = self.s.owed_us, 0
+        if owed:
+            await _Wait("sleep", owed)
+        if error is not None:
+            raise error
+        return result
+
+    def receive(self, fn, *args):
+        data = fn(*args)
+        if data is None:
+            self.s.wait_timeout()   # nothing will ever arrive: stalled
+        return data
+
+    async def read(self, n=-1):
+        return await self.io(self.receive, self.s.read, n)
+
+    async def readline(self):
+        return await self.io(self.receive, self.s.readline)
+
+    async def readexactly(self, n):
+        buf = b""
+        while len(buf) < n:
+            data = await self.read(n - len(buf))
+            if not data:
+                raise EOFError
+            buf += data
+        return buf
+
+    def write(self, buf):
+        self.out_buf += bytes(buf)
+
+    async def drain(self):
+        buf, self.out_buf = self.out_buf, b""
+        if buf:
+            await self.io(self.s.write, buf)
+
+    def close(self):
+        pass
+
+    async def wait_closed(self):
+        self.s.close()
+
+
+async def open_connection(host, port, ssl=None):
+    import usocket, ussl
+    s = usocket.socket()
+    s.deferred = True
+    s.blocking = False
+    s.timeout = None
+    stream = Stream(s)
+
+    def connect():
+        s.connect(usocket.getaddrinfo(host, port)[0][-1])
+        if ssl:
+            ussl.wrap_socket(s, server_hostname=host)
+    await stream.io(connect)
+    return stream, stream
+
+
+def run(coro):
+    """Run coro to completion (or until world.WORLD.stop_at_us)"""
+    global _current_loop
+    loop = Loop()
+    _current_loop = loop
+    try:
+        main = loop.spawn(coro)
+        if loop.run_until(main):
+            return main.result if main.exception is None else _raise(main.exception)
+        return None
+    finally:
+        loop.close()
+        _current_loop = None
+
+
+def _raise(exception):
+    raise exception
@@ -0,0 +1,3 @@
+"""ujson.py: MicroPython json on CPython's json (same separators)"""
+
+from json import *
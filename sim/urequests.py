@@ -0,0 +1,98 @@
+"""
+urequests.py
+Simulated HTTP client (CPython)
+
+Requests go to world.WORLD.server instead of a socket and cost a new
+connection (plus a TLS handshake for https), the modelled round trip and
+the transfer time, as urequests opens a socket per request. No wifi, an "internet" fault or a
+missing server raise OSError like the real client; a "server" fault
+answers 503. Generator bodies are consumed chunk by chunk, as urequests
+does with chunked transfer encoding.
+"""
+
+import ujson
+import world
+
+ECONNABORTED = 103
+EHOSTUNREACH = 113
+ETIMEDOUT = 110
+
+
+class Response:
+    def __init__(self, status_code, content=b"", headers=None):
+        self.status_code = status_code
+        self.reason = b""
+        self.content = content
+        self.headers = headers or {}
+
+    @property
+    def text(self):
+        return self.content.decode()
+
+    def json(self):
+        return ujson.loads(self.content)
+
+    def close(self):
+        pass
+
+
+def body_bytes(data):
+    if data is None:
+        return b""
+    if isinstance(data, str):
+        return data.encode()
+    if isinstance(data, (bytes, bytearray)):
+        return bytes(data)
+    chunks = []
+    for chunk in data:
+        chunks.append(chunk.encode() if isinstance(chunk, str) else bytes(chunk))
+    return b"".join(chunks)
+
+
+def request(method, url, data=None, json=None, headers=None, stream=None, auth=None, timeout=None, parse_headers=True):
+    W = world.WORLD
+    if json is not None:
+        data = ujson.dumps(json)
+    body = body_bytes(data)
+    if not W.wifi_connected:
+        raise OSError(EHOSTUNREACH)
+    if W.server is None or W.fault("internet"):
+        W.advance_us(int((timeout or 10) * 1000000))
+        raise OSError(ETIMEDOUT)
+    W.latency("tcp_connect")
+    if url.startswith("https:"):
+        W.latency("tls_handshake")
+    if hasattr(W.server, "connections"):
+        W.server.connections += 1
+    W.latency("http")
+    W.advance_us(W.latency_us["http_byte"] * len(body))
+    if W.fault("server"):
+        return Response(503, b"Service Unavailable")
+    status, content = W.server.handle(method, url, headers or {}, body)
+    if isinstance(content, str):
+        content = content.encode()
+    return Response(status, content)
+
+
+def head(url, **kw):
+    return request("HEAD", url, **kw)
+
+
+def get(url, **kw):
+    return request("GET", url, **kw)
+
+
+def post(url, **kw):
+    return request("POST", url, **kw)
+
+
+def put(url, **kw):
+    return request("PUT", url, **kw)
+
+
+def patch(url, **kw):
+    return request("PATCH", url, **kw)
+
+
+def delete(url, **kw):
+    return request("DELETE", url, **kw)
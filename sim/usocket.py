@@ -0,0 +1,309 @@
+"""
+usocket.py
+Simulated TCP socket to the in-process server (CPython)
+
+Connecting costs the modelled TCP round trip and reaches world.WORLD.server
+whatever the address. Bytes written are parsed as HTTP/1.1 requests; each
+complete request is answered by server.handle() after the modelled round
+trip, and the response is queued for reading, so a connection can carry
+any number of keep-alive requests.
+
+With a server that does not keep readings (heap benchmarks) /readings
+bodies are dropped as they arrive, only their size is passed on, so the
+whole request body is never held on this side of the socket.
+
+The server side closes a connection once it was idle for
+server.idle_timeout seconds (reads then see EOF). No wifi, an "internet"
+fault or a missing server fail like lwIP does: OSError with an errno,
+after the socket timeout where the real stack would wait (STALL_SECONDS
+for sockets without one, as under uasyncio).
+
+A blocking socket spends the modelled time on the world clock as it goes.
+A deferred one (uasyncio streams) only adds it up in owed_us, for the
+stream to sleep it off so other tasks run meanwhile.
+"""
+
+import world
+
+AF_INET = 2
+SOCK_STREAM = 1
+IPPROTO_TCP = 6
+
+EAGAIN = 11
+ECONNABORTED = 103
+ECONNRESET = 104
+ENOTCONN = 107
+ETIMEDOUT = 110
+EHOSTUNREACH = 113
+
+DEFAULT_TIMEOUT = 10
+STALL_SECONDS = 120     # lwIP gives up retransmitting after about this long
+REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found",
+           413: "Payload Too Large", 415: "Unsupported Media Type", 503: "Service Unavailable"}
+
+
+def getaddrinfo(host, port, af=0, type=0, proto=0, flags=0):
+    if not world.WORLD.wifi_connected:
+        raise OSError(EHOSTUNREACH)     # no DNS without a link
+    return [(AF_INET, SOCK_STREAM, IPPROTO_TCP, "", ("10.0.0.1", port))]
+
+
+def parse_head(buf):
+    """(method, path, headers, body offset) of the request at the start of
+    buf, or None while its head is still incomplete"""
+    end = buf.find(b"\r\n\r\n")
+    if end < 0:
+        return None
+    lines = bytes(buf[:end]).decode().split("\r\n")
+    method, path = lines[0].split(" ")[:2]
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    return method, path, headers, end + 4
+
+
+def parse_request(buf):
+    """(method, path, headers, body, consumed) for the first complete
+    request in buf, or None while it is still incomplete"""
+    head = parse_head(buf)
+    if head is None:
+        return None
+    method, path, headers, start = head
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        if not buf.endswith(b"0\r\n\r\n"):
+            return None
+        body = bytearray()
+        pos = start
+        while True:
+            eol = buf.find(b"\r\n", pos)
+            if eol < 0:
+                return None
+            size = int(bytes(buf[pos:eol]).split(b";")[0], 16)
+            pos = eol + 2
+            if not size:
+                if buf[pos:pos + 2] != b"\r\n":
+                    return None
+                return method, path, headers, bytes(body), pos + 2
+            if len(buf) < pos + size + 2:
+                return None
+            body.extend(buf[pos:pos + size])
+            pos += size + 2
+    length = int(headers.get("content-length", 0))
+    if len(buf) < start + length:
+        return None
+    return method, path, headers, bytes(buf[start:start + length]), start + length
+
+
+class SkippedBody:
+    """Body of a request the server does not keep: its framing is followed
+    as bytes arrive and only the size is counted"""
+
+    def __init__(self, method, path, headers):
+        self.method = method
+        self.path = path
+        self.headers = headers
+        self.chunked = headers.get("transfer-encoding", "").lower() == "chunked"
+        self.state = "size" if self.chunked else "data"
+        self.left = 0 if self.chunked else int(headers.get("content-length", 0))
+        self.size = 0
+
+    def feed(self, buf):
+        """Consume body bytes from the front of buf; True once complete"""
+        while True:
+            if self.state == "data":
+                n = min(self.left, len(buf))
+                del buf[:n]
+                self.size += n
+                self.left -= n
+                if self.left:
+                    return False
+                if not self.chunked:
+                    return True
+                self.state = "crlf"
+            eol = buf.find(b"\r\n")
+            if eol < 0:
+                return False
+            line = bytes(buf[:eol])
+            del buf[:eol + 2]
+            if self.state == "end":
+                return True
+            if self.state == "crlf":
+                self.state = "size"
+                continue
+            self.left = int(line.split(b";")[0], 16)
+            self.state = "data" if self.left else "end"
+
+
+def response_bytes(status, content, keep_alive=True, headers=None):
+    if isinstance(content, str):
+        content = content.encode()
+    head = ["HTTP/1.1 %d %s" % (status, REASONS.get(status, "")),
+            "Content-Type: application/json",
+            "Content-Length: %d" % len(content),
+            "Connection: %s" % ("keep-alive" if keep_alive else "close")]
+    for name, value in (headers or {}).items():
+        head.append("%s: %s" % (name, value))
+    return ("\r\n".join(head) + "\r\n\r\n").encode() + content
+
+
+class socket:
+    def __init__(self, af=AF_INET, type=SOCK_STREAM, proto=IPPROTO_TCP):
+        self.timeout = DEFAULT_TIMEOUT
+        self.blocking = True
+        self.connected = False
+        self.peer_closed = False
+        self.closed = False
+        self.tls = False
+        self.request = bytearray()      # written, not yet a complete request
+        self.skipping = None            # SkippedBody of the request being written
+        self.response = bytearray()     # answered, not yet read
+        self.active_us = 0              # last traffic, for the idle timeout
+        self.deferred = False           # True: time goes to owed_us
+        self.owed_us = 0
+
+    # --- link ---
+    def settimeout(self, seconds):
+        self.timeout = seconds
+        self.blocking = seconds is None or seconds > 0
+
+    def setblocking(self, flag):
+        self.blocking = bool(flag)
+
+    def spend(self, us):
+        if self.deferred:
+            self.owed_us += us
+        else:
+            world.WORLD.advance_us(us)
+
+    def now_us(self):
+        return world.WORLD.clock_us + self.owed_us
+
+    def wait_timeout(self, errno=ETIMEDOUT):
+        self.spend(int((self.timeout or STALL_SECONDS) * 1000000))
+        raise OSError(errno)
+
+    def check_link(self):
+        W = world.WORLD
+        if not W.wifi_connected:
+            raise OSError(ECONNABORTED)
+        if W.server is None or W.fault("internet"):
+            self.wait_timeout()
+
+    def expire(self):
+        """Server side idle timeout"""
+        W = world.WORLD
+        idle = getattr(W.server, "idle_timeout", None)
+        if (self.connected and not self.peer_closed and not self.response and idle is not None
+                and self.now_us() - self.active_us >= idle * 1000000):
+            self.peer_closed = True
+
+    def connect(self, addr):
+        W = world.WORLD
+        if not W.wifi_connected:
+            raise OSError(EHOSTUNREACH)
+        self.check_link()
+        self.spend(W.duration("tcp_connect"))
+        self.connected = True
+        self.active_us = self.now_us()
+        if hasattr(W.server, "connections"):
+            W.server.connections += 1
+
+    def close(self):
+        self.closed = True
+        self.connected = False
+
+    # --- writing: requests ---
+    def write(self, data):
+        if self.closed or not self.connected:
+            raise OSError(ENOTCONN)
+        self.expire()
+        if self.peer_closed:
+            return len(data)            # the FIN is only noticed on read
+        self.check_link()
+        W = world.WORLD
+        self.spend(W.latency_us["http_byte"] * len(data))
+        self.active_us = self.now_us()
+        self.request.extend(data)
+        while self.request:
+            if self.skipping is not None:
+                if not self.skipping.feed(self.request):
+                    break
+                skipped, self.skipping = self.skipping, None
+                self.answer(skipped.method, skipped.path, skipped.headers, None, skipped.size)
+                continue
+            if self.skip_body():
+                continue
+            parsed = parse_request(self.request)
+            if parsed is None:
+                break
+            method, path, headers, body, used = parsed
+            del self.request[:used]
+            self.answer(method, path, headers, body)
+        return len(data)
+
+    def skip_body(self):
+        """Start dropping the body of a /readings POST the server will not keep"""
+        if getattr(world.WORLD.server, "keep", True):
+            return False
+        head = parse_head(self.request)
+        if head is None:
+            return False
+        method, path, headers, start = head
+        if method != "POST" or not path.endswith("/readings"):
+            return False
+        del self.request[:start]
+        self.skipping = SkippedBody(method, path, headers)
+        return True
+
+    send = write
+    sendall = write
+
+    def answer(self, method, path, headers, body, size=None):
+        W = world.WORLD
+        self.spend(W.duration("http"))
+        self.active_us = self.now_us()
+        if W.fault("server"):
+            self.response.extend(response_bytes(503, b"Service Unavailable"))
+            return
+        if body is None:
+            answer = W.server.skipped(method, path, headers, size)
+        else:
+            answer = W.server.handle(method, path, headers, body)
+        status, content = answer[:2]
+        extra = answer[2] if len(answer) > 2 else None
+        keep_alive = headers.get("connection", "").lower() != "close"
+        self.response.extend(response_bytes(status, content, keep_alive, extra))
+        if not keep_alive:
+            self.peer_closed = True
+
+    # --- reading: responses ---
+    def read(self, n=-1):
+        if self.closed:
+            raise OSError(ENOTCONN)
+        self.expire()
+        if not self.response:
+            if self.peer_closed:
+                return b""
+            if not self.blocking:
+                return None
+            self.wait_timeout()
+        if n is None or n < 0:
+            n = len(self.response)
+        data = bytes(self.response[:n])
+        del self.response[:n]
+        return data
+
+    def recv(self, n):
+        data = self.read(n)
+        if data is None:
+            raise OSError(EAGAIN)
+        return data
+
+    def readline(self):
+        if self.closed:
+            raise OSError(ENOTCONN)
+        end = self.response.find(b"\n")
+        if end < 0:
+            return self.read()
+        return self.read(end + 1)
@@ -0,0 +1,19 @@
+"""
+ussl.py
+Simulated TLS on top of sim usocket (CPython)
+
+wrap_socket() costs the modelled handshake (key exchange and certificate
+check on the RP2040 plus the extra round trips) and hands back the same
+socket: bytes are not encrypted, only the time it takes is.
+"""
+
+import world
+
+
+def wrap_socket(sock, server_side=False, key=None, cert=None, cert_reqs=0, cadata=None,
+                server_hostname=None, do_handshake=True):
+    sock.check_link()
+    sock.spend(world.WORLD.duration("tls_handshake"))
+    sock.tls = True
+    sock.active_us = sock.now_us()
+    return sock
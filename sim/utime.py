@@ -0,0 +1,66 @@
+"""
+utime.py
+MicroPython time API on the simulated clock (CPython)
+
+Sleeping moves the virtual clock instead of blocking, and ticks wrap at
+2**30 like on the RP2040, so ticks_diff mistakes show up on the host too.
+sim.install() also registers this module as "time"; anything not defined
+here falls through to the real time module.
+"""
+
+import time as _time
+import world
+
+TICKS_PERIOD = 1 << 30
+_HALF = TICKS_PERIOD // 2
+
+
+def ticks_us():
+    return world.WORLD.clock_us % TICKS_PERIOD
+
+
+def ticks_ms():
+    return (world.WORLD.clock_us // 1000) % TICKS_PERIOD
+
+
+def ticks_cpu():
+    return ticks_us()
+
+
+def ticks_diff(end, start):
+    return ((end - start + _HALF) % TICKS_PERIOD) - _HALF
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) % TICKS_PERIOD
+
+
+def sleep_us(us):
+    world.WORLD.advance_us(int(us))
+
+
+def sleep_ms(ms):
+    world.WORLD.advance_us(int(ms * 1000))
+
+
+def sleep(seconds):
+    world.WORLD.advance_us(int(seconds * 1000000))
+
+
+def time():
+    return world.EPOCH + world.WORLD.clock_us // 1000000
+
+
+def time_ns():
+    return (world.EPOCH * 1000000 + world.WORLD.clock_us) * 1000
+
+
+def gmtime(secs=None):
+    return _time.gmtime(time() if secs is None else secs)[:8]
+
+
+localtime = gmtime
+
+
+def __getattr__(name):
+    return getattr(_time, name)
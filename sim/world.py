@@ -0,0 +1,199 @@
+"""
+world.py
+Simulated environment behind the sim drivers (CPython)
+
+One World holds the virtual clock (microseconds, only moved by sleeps,
+modelled latencies and the asyncio stand-in), the physical signals the
+sensors see, per-driver latencies and injected faults. Every random draw
+comes from one seeded generator, so a run is repeatable bit for bit.
+
+Drivers look up world.WORLD on every call; reset() swaps in a new one.
+"""
+
+import heapq, math, random
+
+EPOCH = 1767225600      # time.time() at virtual clock 0 (2026-01-01 UTC)
+
+
+# ------------------------------
+# Waveforms: t (seconds) → value
+# ------------------------------
+def constant(value):
+    return lambda t: value
+
+
+def sine(mean, amplitude=0.0, period_s=86400, phase_s=0):
+    return lambda t: mean + amplitude * math.sin(2 * math.pi * (t + phase_s) / period_s)
+
+
+def ramp(start, per_hour):
+    return lambda t: start + per_hour * t / 3600
+
+
+def steps(points):
+    """[(from_second, value), ...] held until the next point"""
+    points = sorted(points)
+
+    def wave(t):
+        value = points[0][1]
+        for start, v in points:
+            if t < start:
+                break
+            value = v
+        return value
+    return wave
+
+
+DEFAULT_SIGNALS = {
+    "ambient_temp": sine(27.0, 4.0),            # °C, daily cycle
+    "humidity": sine(65.0, 10.0, phase_s=43200),  # %
+    "water_temp": sine(22.0, 1.5),              # °C
+    "tds": sine(650.0, 40.0, period_s=6 * 3600),  # ppm
+    "ph": sine(6.2, 0.3, period_s=12 * 3600),
+    "ldr": sine(50.0, 45.0),                    # % of full scale
+    "water_level": ramp(20.0, 0.2),             # cm from sensor to surface
+}
+
+DEFAULT_NOISE = {
+    "ambient_temp": 0.2,
+    "humidity": 1.0,
+    "water_temp": 0.05,
+    "tds": 3.0,
+    "ph": 0.01,
+    "ldr": 0.5,
+    "water_level": 0.2,
+}
+
+DEFAULT_LATENCY_US = {
+    "adc": 20,                  # one read_u16 incl. interpreter overhead
+    "dht": 22000,               # DHT11 start signal + 40 bit frame
+    "onewire": 3000,            # reset + ROM select + command
+    "ds18b20_read": 12000,      # scratchpad read
+    "echo_rise": 450,           # HC-SR04 burst before the echo line rises
+    "echo_timeout": 38000,      # echo held high when nothing comes back
+    "i2c_frame": 25000,         # SSD1306 full frame over SoftI2C
+    "wifi_connect": 2500000,
+    "tcp_connect": 90000,       # SYN/SYN-ACK round trip
+    "tls_handshake": 1800000,   # mbedTLS key exchange + certificate check
+    "http": 180000,             # request round trip incl. server time
+    "http_byte": 8,             # per body byte (~1 Mbit/s effective)
+    "flash_write": 1200,        # LittleFS program + metadata commit per write call
+    "flash_byte": 3,            # per byte written (256 B page program ~0.7 ms)
+}
+
+# physical pin → sensor, as wired in sensors_actuator / async_sensors_actuator
+DEFAULT_PINS = {
+    26: "tds",
+    27: "ph",
+    28: "ldr",
+    17: "dht",
+    15: "ds18b20",
+    8: "trigger",
+    9: "echo",
+}
+
+
+class Fault:
+    """Active inside any [start, end) window (seconds) or with probability
+    rate on each check"""
+
+    def __init__(self, windows=(), rate=0.0):
+        self.windows = list(windows)
+        self.rate = rate
+
+    def active(self, t, rng):
+        for start, end in self.windows:
+            if start <= t < end:
+                return True
+        return bool(self.rate) and rng.random() < self.rate
+
+
+class World:
+    def __init__(self, seed=0):
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.clock_us = 0
+        self.events = []            # (at_us, seq, fn), see schedule
+        self.seq = 0
+        self.signals = dict(DEFAULT_SIGNALS)
+        self.noise = dict(DEFAULT_NOISE)
+        self.adc_noise_lsb = 48
+        self.latency_us = dict(DEFAULT_LATENCY_US)
+        self.faults = {}            # name → Fault
+        self.pins = dict(DEFAULT_PINS)
+        self.vref = 3.3
+        self.wifi_ssid = None       # None accepts any network
+        self.wifi_connected = False
+        self.server = None          # sim.server.SimServer or anything with handle()
+        self.stop_at_us = None      # uasyncio.run() returns once the clock gets here
+        self.display = []           # last lines shown on the OLED
+        self.frames = 0
+
+    def configure(self, signals=None, noise=None, latency_us=None, faults=None, **kwargs):
+        for target, values in ((self.signals, signals), (self.noise, noise),
+                               (self.latency_us, latency_us), (self.faults, faults)):
+            if values:
+                target.update(values)
+        for key, value in kwargs.items():
+            if not hasattr(self, key):
+                raise AttributeError(f"unknown world setting: {key}")
+            setattr(self, key, value)
+        return self
+
+    # --- clock ---
+    def seconds(self):
+        return self.clock_us / 1e6
+
+    def schedule(self, delay_us, fn):
+        """Run fn when the clock reaches now + delay_us (IRQ sources)"""
+        self.seq += 1
+        heapq.heappush(self.events, (self.clock_us + int(delay_us), self.seq, fn))
+
+    def next_event_us(self):
+        return self.events[0][0] if self.events else None
+
+    def advance_to(self, at_us):
+        while self.events and self.events[0][0] <= at_us:
+            when, _, fn = heapq.heappop(self.events)
+            self.clock_us = max(self.clock_us, when)
+            fn()
+        self.clock_us = max(self.clock_us, int(at_us))
+
+    def advance_us(self, us):
+        self.advance_to(self.clock_us + us)
+
+    def duration(self, name, jitter=0.1):
+        """Modelled duration of an operation, ± jitter"""
+        us = self.latency_us[name]
+        if jitter:
+            us = int(us * (1 + self.rng.uniform(-jitter, jitter)))
+        return us
+
+    def latency(self, name, jitter=0.1):
+        """Modelled duration of an operation, spent right away"""
+        us = self.duration(name, jitter)
+        self.advance_us(us)
+        return us
+
+    # --- signals and faults ---
+    def value(self, name):
+        value = self.signals[name](self.seconds())
+        noise = self.noise.get(name)
+        if noise:
+            value += self.rng.gauss(0, noise)
+        return value
+
+    def fault(self, name):
+        fault = self.faults.get(name)
+        return fault is not None and fault.active(self.seconds(), self.rng)
+
+
+WORLD = World()
+
+
+def reset(seed=0, **kwargs):
+    """Fresh world (clock at zero) for the next run"""
+    global WORLD
+    random.seed(seed)       # draws made by the firmware itself (retry jitter)
+    WORLD = World(seed).configure(**kwargs)
+    return WORLD
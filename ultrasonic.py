@@ -0,0 +1,110 @@
+"""
+ultrasonic.py
+Interrupt driven HC-SR04 ranging with a hard deadline (MicroPython)
+
+The echo pin timestamps both edges from a hard IRQ, so waiting for an echo
+is just checking a flag until the deadline; nothing spins on echo.value().
+A measurement takes the median of a few pings:
+ - no rising edge before the deadline → sensor fault, ping ignored
+ - echo still high at the deadline, or longer than MAX_RANGE_CM → out of range
+measure() returns None when every ping faulted and OUT_OF_RANGE when only
+out of range pings came back.
+"""
+
+from machine import Pin
+import machine, utime
+import uasyncio as asyncio
+
+SOUND_CM_PER_US = 0.0343
+MAX_RANGE_CM = 400              # HC-SR04 datasheet range
+ECHO_WINDOW_US = 30000          # > round trip for MAX_RANGE_CM (~23.3 ms)
+PING_GAP_MS = 60                # let echoes of the last ping die down
+OUT_OF_RANGE = -1.0
+
+_IDLE, _WAITING, _HIGH, _DONE = 0, 1, 2, 3
+
+
+class EchoRanger:
+    def __init__(self, trigger, echo, pings=3, window_us=ECHO_WINDOW_US):
+        self.trigger = trigger
+        self.echo = echo
+        self.pings = pings
+        self.window_us = window_us
+        self.state = _IDLE
+        self.rise = 0
+        self.fall = 0
+        self.sent = 0
+        self.echo.irq(handler=self._edge, trigger=Pin.IRQ_RISING | Pin.IRQ_FALLING, hard=True)
+
+    def _edge(self, pin):
+        t = utime.ticks_us()
+        if self.state == _WAITING and pin.value():
+            self.rise = t
+            self.state = _HIGH
+        elif self.state == _HIGH and not pin.value():
+            self.fall = t
+            self.state = _DONE
+
+    def _send(self):
+        self.state = _WAITING
+        self.trigger.low()
+        utime.sleep_us(2)
+        self.sent = utime.ticks_us()
+        self.trigger.high()
+        utime.sleep_us(10)
+        self.trigger.low()
+
+    def _expired(self):
+        return utime.ticks_diff(utime.ticks_us(), self.sent) > self.window_us
+
+    def _result(self):
+        """Distance of the last ping in cm, OUT_OF_RANGE or None (no echo)"""
+        state = self.state
+        self.state = _IDLE
+        if state == _DONE:
+            distance = utime.ticks_diff(self.fall, self.rise) * SOUND_CM_PER_US / 2
+            if distance > MAX_RANGE_CM:
+                return OUT_OF_RANGE
+            return distance
+        if state == _HIGH:
+            return OUT_OF_RANGE
+        return None
+
+    @staticmethod
+    def _median(results):
+        distances = sorted(d for d in results if d is not None and d != OUT_OF_RANGE)
+        if distances:
+            return distances[len(distances) // 2]
+        if OUT_OF_RANGE in results:
+            return OUT_OF_RANGE
+        return None
+
+    def ping(self):
+        """One ping; blocks at most one echo window"""
+        self._send()
+        while self.state != _DONE and not self._expired():
+            machine.idle()
+        return self._result()
+
+    def measure(self):
+        results = []
+        for i in range(self.pings):
+            if i:
+                utime.sleep_ms(PING_GAP_MS)
+            results.append(self.ping())
+        return self._median(results)
+
+    async def ping_async(self):
+        self._send()
+        while self.state != _DONE and not self._expired():
+            await asyncio.sleep_ms(1)
+        return self._result()
+
+    async def measure_async(self):
+        """Median of pings; yields to the event loop while waiting for echoes"""
+        results = []
+        for i in range(self.pings):
+            if i:
+                await asyncio.sleep_ms(PING_GAP_MS)
+            results.append(await self.ping_async())
+        return self._median(results)
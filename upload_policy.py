@@ -0,0 +1,137 @@
+"""
+upload_policy.py
+Page sizing and retry backoff for uploads (MicroPython)
+
+Every request feeds moving averages of the link: the round trip (from
+requests on an already open connection), throughput and bytes per reading
+(from the /readings pages) and how often requests fail.
+
+page_size() picks how many readings fit in TARGET_PAGE_MS on that link:
+few round trips on a good link, small pages on a slow one, and smaller
+still when requests fail often, so a failure resends less. Until the
+throughput is measured the page starts at DEFAULT_PAGE, halves with every
+failure down to MIN_PAGE and doubles back with every success, so a link
+too slow for the default page still gets pages through.
+
+failed() returns how long to wait before the next try: BASE_BACKOFF_MS
+doubled per consecutive failure up to MAX_BACKOFF_MS, with "equal jitter"
+(half fixed, half random) so a node never retries right away and nodes
+that lost the server together do not come back in lockstep. There is no
+retry limit; a success resets the backoff.
+"""
+
+import random
+import utime
+
+ALPHA = 0.25            # weight of a new sample in the moving averages
+TARGET_PAGE_MS = 3000   # time on air aimed for per POST
+DEFAULT_PAGE = 70       # readings per page until the link is measured
+MIN_PAGE = 10
+MAX_PAGE = 350
+BASE_BACKOFF_MS = 5000
+MAX_BACKOFF_MS = 15 * 60 * 1000
+
+
+def ewma(average, sample, alpha=ALPHA):
+    return sample if average is None else average + alpha * (sample - average)
+
+
+class UploadPolicy:
+    def __init__(self, target_ms=TARGET_PAGE_MS, default_page=DEFAULT_PAGE, min_page=MIN_PAGE,
+                 max_page=MAX_PAGE, base_backoff_ms=BASE_BACKOFF_MS, max_backoff_ms=MAX_BACKOFF_MS):
+        self.target_ms = target_ms
+        self.default_page = default_page
+        self.min_page = min_page
+        self.max_page = max_page
+        self.base_backoff_ms = base_backoff_ms
+        self.max_backoff_ms = max_backoff_ms
+        self.rtt_ms = None
+        self.bytes_per_s = None
+        self.bytes_per_reading = None
+        self.failure_rate = 0.0
+        self.unmeasured_page = default_page     # page size while bytes_per_s is None
+        self.failures = 0       # consecutive
+        self.retry_at = None    # ticks_ms the current backoff ends
+
+    def round_trip(self, elapsed_ms):
+        """A small request took elapsed_ms, not counting the handshake of a
+        connection it opened"""
+        self.rtt_ms = ewma(self.rtt_ms, elapsed_ms)
+
+    def sent(self, nbytes, readings, elapsed_ms):
+        """A page of readings went through: nbytes on the wire in elapsed_ms,
+        not counting the handshake of a connection it opened (None when
+        not measured)"""
+        if elapsed_ms is not None:
+            transfer_ms = max(elapsed_ms - (self.rtt_ms or 0), 1)
+            self.bytes_per_s = ewma(self.bytes_per_s, nbytes * 1000 / transfer_ms)
+        if readings:
+            self.bytes_per_reading = ewma(self.bytes_per_reading, nbytes / readings)
+        self.failure_rate = ewma(self.failure_rate, 0)
+        self.unmeasured_page = min(self.unmeasured_page * 2, self.default_page)
+        self.failures = 0
+        self.retry_at = None
+
+    def failed(self):
+        """A request failed; returns the backoff before the next try (ms)"""
+        self.failure_rate = ewma(self.failure_rate, 1)
+        self.unmeasured_page = max(self.unmeasured_page // 2, self.min_page)
+        self.failures += 1
+        ceiling = min(self.base_backoff_ms << min(self.failures - 1, 10), self.max_backoff_ms)
+        delay = ceiling // 2 + int(random.random() * (ceiling // 2))
+        self.retry_at = utime.ticks_add(utime.ticks_ms(), delay)
+        return delay
+
+    def wait_ms(self):
+        """What is left of the current backoff"""
+        if self.retry_at is None:
+            return 0
+        return max(0, utime.ticks_diff(self.retry_at, utime.ticks_ms()))
+
+    def page_size(self):
+        if self.bytes_per_s is None or not self.bytes_per_reading:
+            return self.unmeasured_page
+        budget_ms = max(self.target_ms - (self.rtt_ms or 0), 0)
+        readings = budget_ms * self.bytes_per_s / 1000 / self.bytes_per_reading
+        readings *= 1 - self.failure_rate
+        return int(min(max(readings, self.min_page), self.max_page))
+
+    def stats(self):
+        return {
+            "page": self.page_size(),
+            "rtt_ms": None if self.rtt_ms is None else int(self.rtt_ms),
+            "bytes_per_s": None if self.bytes_per_s is None else int(self.bytes_per_s),
+            "failure_rate": round(self.failure_rate, 2),
+            "failures": self.failures,
+        }
+
+
+if __name__ == "__main__":
+    # a link too slow for the default page: every page times out on a new
+    # connection, so nothing is measured, but the pages shrink anyway
+    policy = UploadPolicy()
+    sizes = []
+    for _ in range(4):
+        sizes.append(policy.page_size())
+        policy.failed()
+    assert sizes == [DEFAULT_PAGE, DEFAULT_PAGE // 2, DEFAULT_PAGE // 4, MIN_PAGE]
+    assert policy.page_size() == MIN_PAGE
+    policy.sent(2000, MIN_PAGE, None)
+    assert policy.page_size() == 2 * MIN_PAGE and policy.bytes_per_s is None
+
+    policy = UploadPolicy()
+    assert policy.page_size() == DEFAULT_PAGE
+    policy.round_trip(200)
+    policy.sent(20000, 150, 1200)       # 20 KB in 1 s after the round trip
+    fast = policy.page_size()
+    assert fast == MAX_PAGE             # 56 KB fit in the target, capped
+    for _ in range(4):
+        policy.sent(20000, 150, 20200)  # 20 KB in 20 s: a slow link
+    assert policy.page_size() < fast
+    delays = [policy.failed() for _ in range(12)]
+    assert all(BASE_BACKOFF_MS // 2 <= d <= MAX_BACKOFF_MS for d in delays)
+    assert delays[-1] >= MAX_BACKOFF_MS // 2
+    assert policy.page_size() == MIN_PAGE
+    policy.sent(20000, 150, None)
+    assert policy.failures == 0 and policy.wait_ms() == 0
+    print("upload_policy ok", policy.stats())
@@ -0,0 +1,247 @@
+"""
+uploader.py
+Streams the journal backlog to /readings in fixed-size pages (MicroPython)
+
+Readings are decoded one journal record at a time and serialized in small
+chunks while the request body is being written, so peak memory depends on
+the page chunk size and not on how big the backlog has grown.
+
+Pages are encoded as rows (one object per reading, the original shape,
+with the deadband suppression counters in a "suppressed" array of their
+own) or, when registration negotiated it, as columns (codec.Columns: one
+object per sensor and page).
+
+Each page remembers the journal position just after its last reading;
+committing it after a 2xx moves the journal read cursor, so a failed
+upload resumes from the last acknowledged reading instead of resending
+(or losing) the whole backlog.
+"""
+
+import ujson
+import codec
+from journal import KIND_JSON, KIND_READINGS, KIND_ROLLUP, KIND_WINDOW, FRAME_SIZE
+
+PAGE_SIZE = 70          # readings per POST (one 10 minute batch of 7 sensors)
+CHUNK_BYTES = 512       # body bytes handed to the socket per write
+COLUMN_RECORDS = 12     # journal records merged into a columnar page's columns at a time
+
+ENCODING_ROWS = "rows"
+ENCODING_COLUMNAR = "columnar"
+ENCODINGS = [ENCODING_ROWS, ENCODING_COLUMNAR]
+
+
+def decode_record(kind, payload, sensors, delay_count):
+    if kind == KIND_READINGS:
+        return codec.iter_json(payload, sensors, delay_count)
+    if kind == KIND_ROLLUP:
+        return codec.iter_rollup_json(payload, sensors, delay_count)
+    if kind == KIND_WINDOW:
+        return codec.iter_window_json(payload, sensors, delay_count)
+    if kind != KIND_JSON:
+        # not a kind this firmware writes (a flipped kind byte, which the
+        # frame CRC does not cover): nothing to send, rather than a page
+        # that fails for good
+        return iter(())
+    batch = ujson.loads(payload)
+    entries = batch.get("sensors", [])
+    for entry in entries:
+        entry["delay_count"] = entry.get("delay_count", 0) + delay_count
+    return iter(entries)
+
+
+class Backlog:
+    """Reading cursor over the journal.
+
+    position is (record offset, entries of that record consumed, whole
+    records consumed) just after the last entry handed out. Only the
+    records there were when the Backlog was created are read, so
+    delay_count never counts a record flushed during the upload. Once the
+    journal evicted from its head (an append into a full ring) the
+    position is stale: reading stops and commit() refuses it."""
+
+    def __init__(self, journal, sensors):
+        self.journal = journal
+        self.sensors = sensors
+        self.position = (journal.read_off, journal.head_skip, 0)
+        self.pending = len(journal)
+        self.end = journal.write_off
+        self.released = 0
+        self.evictions = journal.evictions
+
+    def stale(self):
+        return self.journal.evictions != self.evictions
+
+    def entries(self):
+        """Yield /readings entries from the journal, oldest first"""
+        # head_skip belongs to the head record, not to one found past an
+        # unreadable span
+        head, skip = self.journal.read_off, self.journal.head_skip
+        for i, (offset, kind, payload) in enumerate(self.journal.records(self.end)):
+            if self.stale():
+                return
+            # records (cache windows) appended after this one = uploads this
+            # reading has missed
+            entries = decode_record(kind, payload, self.sensors, self.pending - i - 1)
+            end = offset + FRAME_SIZE + len(payload)
+            n = 0
+            entry = next(entries, None)
+            while entry is not None:
+                following = next(entries, None)
+                n += 1
+                if not (offset == head and n <= skip):
+                    if following is None:
+                        self.position = (end, 0, i + 1)
+                    else:
+                        self.position = (offset, n, i)
+                    yield entry
+                entry = following
+
+    def batches(self):
+        """Yield (kind, payload, delay_count, skip) per journal record,
+        skip being how many of its readings were already acknowledged"""
+        head, skip = self.journal.read_off, self.journal.head_skip
+        for i, (offset, kind, payload) in enumerate(self.journal.records(self.end)):
+            if self.stale():
+                return
+            self.position = (offset + FRAME_SIZE + len(payload), 0, i + 1)
+            yield kind, payload, self.pending - i - 1, skip if offset == head else 0
+
+    def commit(self, cursor):
+        """Acknowledge everything up to a page cursor; False, leaving the
+        journal as it is, when an eviction made the cursor stale"""
+        if self.stale():
+            return False
+        offset, skip, records = cursor
+        self.journal.advance(offset, skip, records - self.released)
+        self.released = records
+        # advance() may reset a drained journal, which is no eviction
+        self.evictions = self.journal.evictions
+        return True
+
+
+class Page:
+    """One POST worth of readings, serialized lazily by body()"""
+    head = b'{"sensors":['
+
+    def __init__(self, first, backlog, items, size):
+        self.first = first
+        self.items = items
+        self.size = size
+        self.count = 0
+        self.bytes = 0      # body bytes handed out so far
+        self.next = None    # first item of the following page, once known
+        self.suppressed = bytearray()   # serialized suppression counters, sent after the readings
+        self.backlog = backlog
+        self.cursor = backlog.position
+
+    def commit(self):
+        """Server accepted the page: drop its readings from the journal.
+        False when the journal evicted meanwhile (see Backlog.commit)"""
+        return self.backlog.commit(self.cursor)
+
+    def objects(self):
+        """JSON objects of the page's readings, one item at a time; its
+        suppression counters are kept for the "suppressed" array, a
+        "sensors" entry always has a value"""
+        item = self.first
+        while item is not None:
+            if "suppressed" in item:
+                # as JSON right away: far less heap than a dict per counter
+                if self.suppressed:
+                    self.suppressed.extend(b",")
+                self.suppressed.extend(ujson.dumps(item).encode())
+            else:
+                yield ujson.dumps(item)
+            self.count += 1
+            self.cursor = self.backlog.position
+            item = next(self.items, None)
+            if self.count >= self.size:
+                self.next = item
+                break
+
+    def body(self):
+        buf = bytearray(self.head)
+        written = 0
+        for obj in self.objects():
+            if written:
+                buf.extend(b",")
+            buf.extend(obj.encode())
+            written += 1
+            if len(buf) >= CHUNK_BYTES:
+                self.bytes += len(buf)
+                yield bytes(buf)
+                buf = bytearray()
+        buf.extend(b'],"actuators":[]')
+        if self.suppressed:
+            buf.extend(b',"suppressed":[')
+            for start in range(0, len(self.suppressed), CHUNK_BYTES):
+                buf.extend(self.suppressed[start:start + CHUNK_BYTES])
+                if len(buf) >= CHUNK_BYTES:
+                    self.bytes += len(buf)
+                    yield bytes(buf)
+                    buf = bytearray()
+            buf.extend(b"]")
+        buf.extend(b"}")
+        self.bytes += len(buf)
+        yield bytes(buf)
+
+
+class ColumnarPage(Page):
+    """Whole journal records per page, merged into one column per sensor
+    for every COLUMN_RECORDS of them: their samples are held (as scaled
+    ints) until the columns are written, so a page's heap is that of a
+    few records however many readings it carries"""
+    head = b'{"encoding":"columnar","columns":['
+
+    def add(self, columns, batch):
+        """One journal record into the page's columns; readings added"""
+        kind, payload, delay_count, skip = batch
+        if kind == KIND_READINGS:
+            return columns.add_readings(payload, delay_count, skip)[0]
+        if kind == KIND_ROLLUP:
+            return columns.add_rollups(payload, delay_count, skip)[0]
+        if kind == KIND_WINDOW:
+            return columns.add_window(payload, delay_count, skip)[0]
+        # cached before timestamps were kept: one single-value column each
+        entries = list(decode_record(kind, payload, self.backlog.sensors, delay_count))[skip:]
+        for entry in entries:
+            raw = codec.scale_value(float(entry["value"]))
+            columns.add_column(codec.make_column(entry["sensor"], entry.get("name"), [None], [raw],
+                                                 entry["delay_count"]))
+        return len(entries)
+
+    def objects(self):
+        columns = codec.Columns(self.backlog.sensors)
+        records = 0
+        item = self.first
+        while item is not None:
+            self.count += self.add(columns, item)
+            records += 1
+            self.cursor = self.backlog.position
+            item = next(self.items, None)
+            if self.count >= self.size:
+                self.next = item
+                break
+            if records >= COLUMN_RECORDS:
+                for column in columns.columns():
+                    yield ujson.dumps(column)
+                columns = codec.Columns(self.backlog.sensors)
+                records = 0
+        for column in columns.columns():
+            yield ujson.dumps(column)
+
+
+def pages(backlog, size=PAGE_SIZE, encoding=ENCODING_ROWS):
+    """Split the backlog into Pages; a page must be fully sent before the
+    next one is taken. size is readings per page, or a function called
+    for each page (sizes adapted to the link as the upload goes)"""
+    page_size = size if callable(size) else lambda: size
+    if encoding == ENCODING_COLUMNAR:
+        page_class, items = ColumnarPage, backlog.batches()
+    else:
+        page_class, items = Page, backlog.entries()
+    item = next(items, None)
+    while item is not None:
+        page = page_class(item, backlog, items, page_size())
+        yield page
+        item = page.next